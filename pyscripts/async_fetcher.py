@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from qqmusic_optimized import QQMusicAPI
+from kugou_fixed import KugouAPI
+from netease_fetcher import fetch_toplist as fetch_netease_toplist, playlist_payload as netease_payload
+from cpu_pool import CpuPool
+from exporters import CsvExporter, Exporter, create_exporters
+from http_cache import HttpCache
+from chart_diff import ChartTracker
+from transport import Transport
+from rate_limit import RequestScheduler
+from schema_drift import SchemaMonitor
+from song_identity import SongIdentityIndex
+from telemetry import get_telemetry
+
+# --- 默认榜单配置 ---
+QQ_TOPLISTS = {
+    "飙升榜": 62,
+    "热歌榜": 26,
+    "新歌榜": 27,
+}
+KUGOU_TOPLISTS = {
+    "酷狗TOP500榜": 8888,
+    "酷狗飙升榜": 6666,
+}
+NETEASE_TOPLISTS = {
+    "飙升榜": 19723756,
+    "新歌榜": 3779629,
+    "热歌榜": 3778678,
+}
+
+PLATFORM_LABELS = {
+    'qq': 'QQ音乐',
+    'kugou': '酷狗',
+    'netease': '网易云',
+}
+
+QQ_HOST = 'u.y.qq.com'
+KUGOU_HOST = 'www.kugou.com'
+NETEASE_HOST = 'music.163.com'
+
+
+class HostLimiter:
+    """按主机限制并发请求数，避免同时向同一平台发出过多请求"""
+
+    def __init__(self, per_host_limit: int = 4):
+        """
+        Args:
+            per_host_limit: 每个主机允许的最大并发请求数
+        """
+        self.per_host_limit = per_host_limit
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def get(self, host: str) -> asyncio.Semaphore:
+        """获取指定主机的信号量，不存在时创建"""
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+
+class AsyncFetchEngine:
+    """异步抓取引擎，同时抓取QQ音乐、酷狗和网易云的所有榜单"""
+
+    def __init__(self, output_root: Optional[str] = None, per_host_limit: int = 4,
+                 cache: Optional[HttpCache] = None, tracker: Optional[ChartTracker] = None,
+                 exporters: Optional[List[Exporter]] = None,
+                 identity: Optional[SongIdentityIndex] = None,
+                 transport: Optional[Transport] = None,
+                 cpu_pool: Optional[CpuPool] = None, kugou_details: bool = False,
+                 schema_monitor: Optional[SchemaMonitor] = None):
+        """
+        Args:
+            output_root: CSV输出根目录，默认为脚本所在目录
+            per_host_limit: 每个主机允许的最大并发请求数
+            cache: 可选的磁盘HTTP缓存，内容未变化的榜单不会重写CSV
+            tracker: 可选的榜单变化追踪器，记录快照并输出与上次相比的变化
+            exporters: 导出器列表，默认只写CSV
+            identity: 可选的跨平台歌曲身份索引，为每行附加标准ID
+            transport: 三个平台共用的HTTP传输层，默认按 per_host_limit 设置连接池大小
+            cpu_pool: 可选的进程池，网易云加密和酷狗/网易云的响应解析放到其中执行
+            kugou_details: 是否为酷狗歌曲补全时长和比特率（按 Hash 缓存，只查询新上榜的歌曲）
+            schema_monitor: QQ音乐榜单响应的结构指纹与告警，默认使用进程内共享的（只在内存中记录）
+        """
+        self.output_root = output_root or os.path.dirname(os.path.abspath(__file__))
+        self.exporters = exporters if exporters is not None else [CsvExporter(self.output_root)]
+        self.limiter = HostLimiter(per_host_limit)
+        self.cache = cache
+        self.tracker = tracker
+        self.identity = identity
+        self.transport = transport or Transport(pool_maxsize=per_host_limit, scheduler=RequestScheduler())
+        self.cpu_pool = cpu_pool
+        self.qq = QQMusicAPI(cache=cache, transport=self.transport, schema_monitor=schema_monitor)
+        self.kugou = KugouAPI(cache=cache, transport=self.transport,
+                              page_parser=cpu_pool.parse_kugou if cpu_pool else None,
+                              enrich_details=kugou_details)
+
+    async def _save(self, platform: str, chart_id: int, name: str, result: Dict,
+                    period: Optional[str] = None):
+        label = PLATFORM_LABELS[platform]
+        telemetry = get_telemetry()
+        with telemetry.span('save', platform=platform, chart=chart_id, period=period):
+            if self.identity is not None:
+                # 结果可能来自 HttpCache.memoize 的共享缓存，在副本上附加标准ID
+                songs = [dict(song) if isinstance(song, dict) else song for song in result['songs']]
+                with telemetry.stage('normalize'):
+                    result = dict(result, songs=self.identity.annotate(platform, songs))
+            for exporter in self.exporters:
+                with telemetry.stage('write', exporter=exporter.name):
+                    path = await asyncio.to_thread(exporter.export, platform, chart_id, name, result, period)
+                if path is None:
+                    print(f"[{label}] {name} 内容未变化，跳过 {exporter.name} 导出")
+                else:
+                    print(f"[{label}] 成功将 {len(result['songs'])} 首歌曲导出到 {path}")
+            if self.tracker is not None and not result.get('unchanged'):
+                with telemetry.stage('write', exporter='snapshot'):
+                    diff = await asyncio.to_thread(self.tracker.record, platform, chart_id, result['songs'], period)
+                print(f"[{label}] {result.get('title', chart_id)} 与上次相比: {diff.summary()}")
+
+    async def fetch_chart(self, platform: str, name: str, chart_id: int,
+                          period: Optional[str] = None,
+                          encrypted_data: Optional[Dict[str, str]] = None,
+                          accept: Optional[Callable[[Dict], bool]] = None) -> Optional[Dict]:
+        """
+        抓取并保存单个榜单
+
+        Args:
+            platform: 'qq' / 'kugou' / 'netease'
+            name: 榜单名称
+            chart_id: 榜单ID
+            period: 榜单周期；QQ音乐会按该周期请求历史榜单，其它平台只用于标记保存的快照
+            encrypted_data: 网易云预先加密好的请求体（run_all 批量加密时传入）
+            accept: 可选的检查函数，返回False时不保存该结果（调度服务用来判断新一期是否已经发布）
+
+        Returns:
+            客户端返回的结果字典，失败或未通过 accept 时返回None
+        """
+        with get_telemetry().span('fetch_chart', platform=platform, chart=chart_id, chart_name=name) as span:
+            result = await self._fetch_chart(platform, name, chart_id, period, encrypted_data, accept)
+            span.set(songs=len(result['songs']) if result else 0)
+            return result
+
+    async def _fetch_chart(self, platform: str, name: str, chart_id: int, period: Optional[str],
+                           encrypted_data: Optional[Dict[str, str]],
+                           accept: Optional[Callable[[Dict], bool]] = None) -> Optional[Dict]:
+        label = PLATFORM_LABELS[platform]
+        if platform == 'qq':
+            async with self.limiter.get(QQ_HOST):
+                result = await self.qq.get_toplist_async(chart_id, period=period)
+            period = period or self.qq.get_toplist_period(chart_id)
+        elif platform == 'kugou':
+            async with self.limiter.get(KUGOU_HOST):
+                result = await self.kugou.get_toplist_async(chart_id)
+        else:
+            if encrypted_data is None and self.cpu_pool is not None:
+                encrypted_data = (await self.cpu_pool.encrypt_many_async([netease_payload(chart_id)]))[0]
+            parser = self.cpu_pool.parse_netease if self.cpu_pool else None
+            async with self.limiter.get(NETEASE_HOST):
+                result = await asyncio.to_thread(fetch_netease_toplist, chart_id, self.cache, self.transport,
+                                                 encrypted_data, parser)
+        if not result or not result['songs']:
+            print(f"[{label}] 获取 {name} 失败")
+            return None
+        if accept is not None and not accept(result):
+            print(f"[{label}] {name} 第 {period} 期尚未更新，不保存")
+            return None
+        await self._save(platform, chart_id, name, result, period)
+        return result
+
+    async def fetch_qq(self, name: str, topid: int) -> bool:
+        """抓取单个QQ音乐榜单并保存为CSV"""
+        return await self.fetch_chart('qq', name, topid) is not None
+
+    async def fetch_qq_batch(self, charts: Dict[str, int], limit: int = 300) -> Dict[str, bool]:
+        """用一次批量请求抓取多个QQ音乐榜单并分别保存为CSV"""
+        with get_telemetry().span('fetch_qq_batch', platform='qq', charts=len(charts)):
+            async with self.limiter.get(QQ_HOST):
+                results = await self.qq.get_toplists_async(list(charts.values()), limit)
+
+        summary = {}
+        for name, topid in charts.items():
+            result = results.get(topid)
+            if not result or not result['songs']:
+                print(f"[QQ音乐] 获取 {name} 失败")
+                summary[f"qq/{name}"] = False
+                continue
+            await self._save('qq', topid, name, result, self.qq.get_toplist_period(topid))
+            summary[f"qq/{name}"] = True
+        return summary
+
+    async def fetch_kugou(self, name: str, rank_id: int) -> bool:
+        """抓取单个酷狗榜单并保存为CSV"""
+        return await self.fetch_chart('kugou', name, rank_id) is not None
+
+    async def fetch_netease(self, name: str, chart_id: int, encrypted_data: Optional[Dict[str, str]] = None) -> bool:
+        """抓取单个网易云榜单并保存为CSV"""
+        return await self.fetch_chart('netease', name, chart_id, encrypted_data=encrypted_data) is not None
+
+    async def run_all(self,
+                      qq_charts: Optional[Dict[str, int]] = None,
+                      kugou_charts: Optional[Dict[str, int]] = None,
+                      netease_charts: Optional[Dict[str, int]] = None) -> Dict[str, bool]:
+        """
+        同时抓取所有配置的榜单
+
+        Args:
+            qq_charts: QQ音乐榜单 {名称: ID}，默认 QQ_TOPLISTS
+            kugou_charts: 酷狗榜单 {名称: ID}，默认 KUGOU_TOPLISTS
+            netease_charts: 网易云榜单 {名称: ID}，默认 NETEASE_TOPLISTS
+
+        Returns:
+            {"平台/榜单名": 是否成功} 的字典
+        """
+        qq_charts = QQ_TOPLISTS if qq_charts is None else qq_charts
+        kugou_charts = KUGOU_TOPLISTS if kugou_charts is None else kugou_charts
+        netease_charts = NETEASE_TOPLISTS if netease_charts is None else netease_charts
+
+        jobs = {}
+        # QQ音乐榜单合并为一次批量请求
+        if qq_charts:
+            jobs["qq"] = self.fetch_qq_batch(qq_charts)
+        for name, rank_id in kugou_charts.items():
+            jobs[f"kugou/{name}"] = self.fetch_kugou(name, rank_id)
+        # 启用进程池时网易云的请求体一次性批量加密
+        encrypted = [None] * len(netease_charts)
+        if self.cpu_pool is not None and netease_charts:
+            encrypted = await self.cpu_pool.encrypt_many_async([netease_payload(chart_id)
+                                                                for chart_id in netease_charts.values()])
+        for (name, chart_id), encrypted_data in zip(netease_charts.items(), encrypted):
+            jobs[f"netease/{name}"] = self.fetch_netease(name, chart_id, encrypted_data)
+
+        results = await asyncio.gather(*jobs.values(), return_exceptions=True)
+        summary = {}
+        for key, result in zip(jobs.keys(), results):
+            if isinstance(result, Exception):
+                print(f"抓取 {key} 时出现意外错误: {result}")
+                if key == "qq":
+                    summary.update({f"qq/{name}": False for name in qq_charts})
+                else:
+                    summary[key] = False
+            elif key == "qq":
+                summary.update(result)
+            else:
+                summary[key] = result
+        if self.identity is not None:
+            await asyncio.to_thread(self.identity.save)
+        return summary
+
+    def close(self):
+        self.qq.close()
+        self.kugou.close()
+        self.transport.close()
+        if self.cpu_pool is not None:
+            self.cpu_pool.close()
+        for exporter in self.exporters:
+            exporter.close()
+
+
+def build_engine(per_host_limit: int = 4, export_formats: Optional[List[str]] = None,
+                 cpu_workers: int = 0, kugou_details: bool = False, song_ids: bool = False,
+                 schema_state: Optional[str] = None) -> AsyncFetchEngine:
+    """
+    创建带缓存、变化追踪、标准ID和导出器的抓取引擎，需在事件循环中调用
+
+    Args:
+        per_host_limit: 每个主机允许的最大并发请求数
+        export_formats: 导出格式列表，例如 ['csv', 'parquet', 'sqlite']，默认只写CSV
+        cpu_workers: 加密和解析使用的工作进程数，0 表示在抓取线程中直接执行
+        kugou_details: 是否为酷狗歌曲补全时长和比特率
+        song_ids: CSV 是否为QQ音乐和网易云追加歌曲ID列
+        schema_state: 保存响应结构指纹的文件，默认不保存（只发现本次运行内的结构变化）
+    """
+    # 阻塞请求在线程中执行，线程数需覆盖所有主机的并发上限（外加写文件的线程）
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=per_host_limit * 3 + 2))
+    output_root = os.path.dirname(os.path.abspath(__file__))
+    exporters = create_exporters(export_formats or ['csv'], output_root, song_ids=song_ids)
+    return AsyncFetchEngine(output_root=output_root, per_host_limit=per_host_limit, cache=HttpCache(),
+                            tracker=ChartTracker(), exporters=exporters, identity=SongIdentityIndex(),
+                            cpu_pool=CpuPool(cpu_workers) if cpu_workers else None,
+                            kugou_details=kugou_details,
+                            schema_monitor=SchemaMonitor(schema_state) if schema_state else None)
+
+
+async def run_once(per_host_limit: int = 4, export_formats: Optional[List[str]] = None,
+                   full_catalog: bool = False, cpu_workers: int = 0,
+                   telemetry_dir: Optional[str] = None, kugou_details: bool = False,
+                   song_ids: bool = False, schema_state: Optional[str] = None) -> Dict[str, bool]:
+    """
+    抓取一次所有平台的全部榜单
+
+    Args:
+        per_host_limit: 每个主机允许的最大并发请求数
+        export_formats: 导出格式列表，例如 ['csv', 'parquet', 'sqlite']，默认只写CSV
+        full_catalog: 抓取榜单目录 (chart_catalog.py) 中发现的全部榜单，而不是默认榜单
+        cpu_workers: 加密和解析使用的工作进程数，0 表示不使用进程池
+        telemetry_dir: 设置后把各阶段指标 (metrics.prom) 和 span (spans.jsonl) 写入该目录
+        kugou_details: 是否为酷狗歌曲补全时长和比特率
+        song_ids: CSV 是否为QQ音乐和网易云追加歌曲ID列
+        schema_state: 保存响应结构指纹的文件，默认不保存
+    """
+    engine = build_engine(per_host_limit, export_formats, cpu_workers, kugou_details, song_ids, schema_state)
+    try:
+        charts = {}
+        if full_catalog:
+            from chart_catalog import ChartCatalog
+            catalog = ChartCatalog(transport=engine.transport)
+            for platform in ('qq', 'kugou', 'netease'):
+                charts[f"{platform}_charts"] = await asyncio.to_thread(catalog.toplists, platform)
+        summary = await engine.run_all(**charts)
+        engine.transport.print_stats()
+        if telemetry_dir:
+            write_telemetry(telemetry_dir)
+        return summary
+    finally:
+        engine.close()
+
+
+def write_telemetry(output_dir: str):
+    """打印各阶段耗时汇总，并写出 Prometheus 指标文本和 span"""
+    telemetry = get_telemetry()
+    for stage, entry in sorted(telemetry.stage_summary().items(), key=lambda item: -item[1]['sum']):
+        print(f"阶段 {stage:<10} {entry['count']:>6} 次  合计 {entry['sum']:8.3f} 秒  "
+              f"平均 {entry['sum'] / entry['count'] * 1000:8.2f} 毫秒")
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'metrics.prom'), 'w', encoding='utf-8') as f:
+        f.write(telemetry.prometheus_text())
+    count = telemetry.export_spans(os.path.join(output_dir, 'spans.jsonl'))
+    print(f"指标和 {count} 个 span 已写入 {output_dir}")
+
+
+def main():
+    """
+    主函数，并发抓取所有平台的榜单。命令行参数为导出格式，例如: python async_fetcher.py csv sqlite
+    加上 --all 时抓取榜单目录中的全部榜单，--cpu-workers=N 时用N个进程执行加密和解析，
+    --telemetry=目录 时写出各阶段指标和 span，--kugou-details 时为酷狗歌曲补全时长和比特率，
+    --song-ids 时在QQ音乐和网易云的CSV末尾追加歌曲ID列（原有CSV没有这一列），
+    --schema-state=文件 时把响应结构指纹保存到该文件，跨运行发现接口改版
+    """
+    args = sys.argv[1:]
+    cpu_workers = 0
+    telemetry_dir = None
+    schema_state = None
+    for arg in args:
+        if arg.startswith('--cpu-workers='):
+            cpu_workers = int(arg.split('=', 1)[1])
+        elif arg.startswith('--telemetry='):
+            telemetry_dir = arg.split('=', 1)[1]
+        elif arg.startswith('--schema-state='):
+            schema_state = arg.split('=', 1)[1]
+    export_formats = [arg for arg in args if not arg.startswith('--')] or ['csv']
+    start = time.perf_counter()
+    summary = asyncio.run(run_once(export_formats=export_formats, full_catalog='--all' in args,
+                                   cpu_workers=cpu_workers, telemetry_dir=telemetry_dir,
+                                   kugou_details='--kugou-details' in args, song_ids='--song-ids' in args,
+                                   schema_state=schema_state))
+    elapsed = time.perf_counter() - start
+
+    ok = sum(1 for success in summary.values() if success)
+    print("\n" + "="*50)
+    print(f"全部完成：成功 {ok}/{len(summary)} 个榜单，总耗时 {elapsed:.2f} 秒")
+    for key, success in summary.items():
+        print(f"  {'✓' if success else '✗'} {key}")
+
+
+if __name__ == "__main__":
+    main()
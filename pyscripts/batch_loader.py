@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+专辑/歌单元数据的批量加载层（dataloader 模式）
+
+多个榜单、多个线程同时请求专辑信息时，BatchLoader 在一个很短的时间窗口内收集全部ID，
+去重后交给批量函数一次取回，再把结果分发给各个调用方：
+
+- 同一ID在一个周期内只请求一次：已完成的结果和正在进行的请求都会被复用，clear() 开始新周期
+- 窗口内收集到 max_batch_size 个ID时立即发出，不再等待窗口结束
+- 批量函数可以是真正的批量接口（QQ音乐 musicu.fcg 一次请求放多个模块调用），
+  也可以是 parallel() 包装的单ID接口（酷狗），在线程池中并发请求
+- 获取失败的ID不会被记住，下次调用会重新请求
+
+用法:
+    loader = kugou_album_loader(KugouAPI())
+    albums = loader.load_many(song.album_id for song in toplist['songs'])
+
+python batch_loader.py 抓取默认的QQ音乐和酷狗榜单，并批量加载榜单中出现的全部专辑
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from telemetry import get_telemetry
+
+# ID列表 -> {ID: 结果}，缺失或为None的ID视为获取失败
+BatchFn = Callable[[List[Hashable]], Dict[Hashable, Any]]
+
+
+def parallel(fetch_one: Callable[[Hashable], Any], max_workers: int = 8) -> BatchFn:
+    """把单ID的获取函数包装为批量函数：同一批中的ID在线程池中并发请求"""
+    def fetch_many(keys: List[Hashable]) -> Dict[Hashable, Any]:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(keys))) as executor:
+            return dict(zip(keys, executor.map(fetch_one, keys)))
+    return fetch_many
+
+
+class BatchLoader:
+    """按时间窗口合并并发请求的批量加载器，线程安全"""
+
+    def __init__(self, batch_fn: BatchFn, window: float = 0.005, max_batch_size: int = 50,
+                 max_workers: int = 4, name: str = 'loader'):
+        """
+        Args:
+            batch_fn: 批量获取函数 (ID列表) -> {ID: 结果}
+            window: 收集ID的时间窗口（秒），第一个未命中的请求到达时开始计时
+            max_batch_size: 每批最多的ID数，窗口内攒满即立即发出
+            max_workers: 同时执行的批次数
+            name: 名称，用于日志和追踪
+        """
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.name = name
+        self._lock = threading.Lock()
+        # 本周期内请求过的ID -> Future（进行中或已完成）
+        self._memo: Dict[Hashable, Future] = {}
+        self._pending: Dict[Hashable, Future] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._stats = {'requested': 0, 'coalesced': 0, 'batches': 0, 'fetched': 0, 'failed': 0}
+
+    def _enqueue(self, key: Hashable) -> Future:
+        batch = None
+        with self._lock:
+            self._stats['requested'] += 1
+            future = self._memo.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                return future
+            future = self._memo[key] = Future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch_size:
+                batch = self._take_pending()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._executor.submit(self._run_batch, batch)
+        return future
+
+    def _take_pending(self) -> Dict[Hashable, Future]:
+        batch, self._pending = self._pending, {}
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            batch = self._take_pending()
+        if batch:
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: Dict[Hashable, Future]):
+        keys = list(batch)
+        results: Optional[Dict[Hashable, Any]] = None
+        try:
+            with get_telemetry().span('batch_load', loader=self.name, keys=len(keys)):
+                results = self.batch_fn(keys)
+        except Exception as e:
+            print(f"[{self.name}] 批量获取 {len(keys)} 个ID时出错: {e}")
+        results = results or {}
+        failed = 0
+        with self._lock:
+            self._stats['batches'] += 1
+            for key, future in batch.items():
+                if results.get(key) is None:
+                    failed += 1
+                    # 失败的ID不留在本周期的结果里，下次调用重新请求
+                    if self._memo.get(key) is future:
+                        del self._memo[key]
+            self._stats['fetched'] += len(keys) - failed
+            self._stats['failed'] += failed
+        for key, future in batch.items():
+            future.set_result(results.get(key))
+
+    def load(self, key: Hashable, timeout: Optional[float] = None) -> Any:
+        """获取单个ID的结果，失败时返回None"""
+        return self._enqueue(key).result(timeout)
+
+    def load_many(self, keys: Iterable[Hashable], timeout: Optional[float] = None) -> Dict[Hashable, Any]:
+        """
+        获取多个ID的结果
+
+        Returns:
+            {ID: 结果}，忽略空ID，失败的ID对应None
+        """
+        futures = {key: self._enqueue(key) for key in dict.fromkeys(keys) if key}
+        return {key: future.result(timeout) for key, future in futures.items()}
+
+    async def load_async(self, key: Hashable) -> Any:
+        """load 的异步版本，等待期间不占用线程"""
+        return await asyncio.wrap_future(self._enqueue(key))
+
+    def prime(self, key: Hashable, value: Any):
+        """预先放入已知结果（例如从其它接口顺带得到的专辑信息）"""
+        future = Future()
+        future.set_result(value)
+        with self._lock:
+            self._memo.setdefault(key, future)
+
+    def clear(self):
+        """开始新的周期：之后的请求重新获取（正在进行的批次不受影响）"""
+        with self._lock:
+            self._memo = {key: future for key, future in self._memo.items() if not future.done()}
+
+    def stats(self) -> Dict[str, int]:
+        """请求次数、被合并的请求数、批次数、成功/失败的ID数"""
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        """发出尚在窗口中的请求并等待全部批次完成"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            batch = self._take_pending()
+        if batch:
+            self._executor.submit(self._run_batch, batch)
+        self._executor.shutdown(wait=True)
+
+
+def kugou_album_loader(api, max_workers: int = 8, **kwargs) -> BatchLoader:
+    """酷狗专辑信息：接口一次只能查一个专辑，同一批在线程池中并发请求"""
+    return BatchLoader(parallel(api.get_album_info, max_workers), name='kugou_album', **kwargs)
+
+
+def kugou_playlist_loader(api, max_workers: int = 8, **kwargs) -> BatchLoader:
+    """酷狗歌单信息，同上"""
+    return BatchLoader(parallel(api.get_playlist_info, max_workers), name='kugou_playlist', **kwargs)
+
+
+def qq_album_loader(api, max_batch_size: int = 20, **kwargs) -> BatchLoader:
+    """QQ音乐专辑信息：每批合并为一次 musicu.fcg 请求"""
+    return BatchLoader(api.get_album_infos, max_batch_size=max_batch_size, name='qq_album', **kwargs)
+
+
+def main():
+    from async_fetcher import KUGOU_TOPLISTS, QQ_TOPLISTS
+    from kugou_fixed import KugouAPI
+    from qqmusic_optimized import QQMusicAPI
+
+    qq, kugou = QQMusicAPI(), KugouAPI()
+    loaders = {'qq': qq_album_loader(qq), 'kugou': kugou_album_loader(kugou)}
+    charts = {'qq': (qq.get_toplist, QQ_TOPLISTS), 'kugou': (kugou.get_toplist, KUGOU_TOPLISTS)}
+    try:
+        # 各榜单在自己的线程中加载专辑，重复出现的专辑由加载器合并
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            def load_chart(platform, name, chart_id):
+                toplist = charts[platform][0](chart_id)
+                if not toplist:
+                    return platform, name, {}
+                return platform, name, loaders[platform].load_many(song.album_id for song in toplist['songs'])
+
+            jobs = [executor.submit(load_chart, platform, name, chart_id)
+                    for platform, (_, toplists) in charts.items() for name, chart_id in toplists.items()]
+            for job in jobs:
+                platform, name, albums = job.result()
+                ok = sum(1 for album in albums.values() if album)
+                print(f"[{platform}] {name}: {len(albums)} 张专辑，成功 {ok}")
+        for platform, loader in loaders.items():
+            print(f"[{platform}] 加载统计: {loader.stats()}")
+    finally:
+        for loader in loaders.values():
+            loader.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+CPU 卸载基准：对比在抓取线程中直接加密/解析与交给 CpuPool 进程池执行
+
+每个"歌单"包含一次 weapi 加密、一次网易云歌单响应解析（fixtures/netease_playlist_3778678.json）
+和一次酷狗排行榜页面解析（fixtures/kugou_rank_8888.html），不发出网络请求。
+与 AsyncFetchEngine 一样，每个歌单在 asyncio.to_thread 中处理；同时运行一个每 5 毫秒唤醒一次的心跳协程，
+记录事件循环的最大延迟，即 CPU 计算对网络 I/O 的阻塞程度。
+
+用法: python bench_cpu_pool.py [歌单数] [进程数...]  例如: python bench_cpu_pool.py 400 1 2 4
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from cpu_pool import CpuPool
+from kugou_fixed import parse_toplist_page
+from netease_fetcher import parse_playlist_content, playlist_payload, weapi_encrypt
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+KUGOU_URL = 'https://www.kugou.com/yy/rank/home/1-8888.html'
+THREADS = 8
+HEARTBEAT = 0.005
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return f.read()
+
+
+async def heartbeat(stop: asyncio.Event, lags: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + HEARTBEAT
+        await asyncio.sleep(HEARTBEAT)
+        lags.append(loop.time() - expected)
+
+
+async def run(count: int, netease: bytes, kugou: bytes, pool: Optional[CpuPool]):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=THREADS))
+    parse_netease: Callable = pool.parse_netease if pool else parse_playlist_content
+    parse_kugou: Callable = pool.parse_kugou if pool else parse_toplist_page
+
+    def process(encrypted):
+        encrypted = encrypted or weapi_encrypt(playlist_payload(3778678))
+        return len(parse_netease(netease)['songs']) + len(parse_kugou(kugou, KUGOU_URL)['songs'])
+
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(heartbeat(stop, lags))
+    start = time.perf_counter()
+    encrypted = [None] * count
+    if pool is not None:
+        encrypted = await pool.encrypt_many_async([playlist_payload(3778678) for _ in range(count)])
+    songs = await asyncio.gather(*(asyncio.to_thread(process, data) for data in encrypted))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return elapsed, sum(songs), max(lags), sorted(lags)[int(len(lags) * 0.95)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    worker_counts = [int(arg) for arg in sys.argv[2:]] or sorted({1, 2, os.cpu_count() or 1})
+    netease = load_fixture('netease_playlist_3778678.json')
+    kugou = load_fixture('kugou_rank_8888.html')
+    print(f"{count} 个歌单，CPU 核心数 {os.cpu_count()}，抓取线程 {THREADS}\n")
+    print(f"{'模式':<14}{'耗时(秒)':>10}{'歌单/秒':>10}{'循环最大延迟(ms)':>18}{'p95延迟(ms)':>14}")
+
+    def report(name, elapsed, lag_max, lag_p95):
+        print(f"{name:<14}{elapsed:>10.2f}{count / elapsed:>10.1f}{lag_max * 1000:>18.1f}{lag_p95 * 1000:>14.1f}")
+
+    elapsed, expected, lag_max, lag_p95 = asyncio.run(run(count, netease, kugou, None))
+    report("线程内执行", elapsed, lag_max, lag_p95)
+    for workers in worker_counts:
+        pool = CpuPool(workers)
+        try:
+            # 先预热，进程启动时间不计入
+            pool.encrypt_many([playlist_payload(0)] * workers)
+            elapsed, songs, lag_max, lag_p95 = asyncio.run(run(count, netease, kugou, pool))
+        finally:
+            pool.close()
+        assert songs == expected
+        report(f"进程池 x{workers}", elapsed, lag_max, lag_p95)
+
+
+if __name__ == '__main__':
+    main()
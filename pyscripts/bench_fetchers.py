@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+三个平台抓取链路的离线基准测试
+
+本地 stub 服务器回放 fixtures/ 中录制的响应（musicu.fcg JSON、酷狗排行榜HTML、weapi 歌单JSON），
+客户端的请求通过改写URL的适配器转到 stub，客户端代码本身不做任何修改。测量：
+  - 解析耗时（每个榜单、每首歌）
+  - 每首歌的内存分配（tracemalloc 峰值与解析结果常驻大小）
+  - 不同并发下的端到端榜单延迟 (p50/p95) 和吞吐量
+
+结果以JSON写入 bench_results/<时间>_<提交>.json，可与之前的结果对比，用于发现性能回退。
+
+用法: python bench_fetchers.py [用于对比的旧结果文件]
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import fast_json
+from kugou_fixed import KugouAPI
+from netease_fetcher import _parse_playlist, fetch_toplist
+from qqmusic_optimized import QQMusicAPI
+from transport import PooledAdapter, Transport
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BASE_DIR, 'fixtures')
+RESULTS_DIR = os.path.join(BASE_DIR, 'bench_results')
+
+FIXTURES = {
+    'qq': 'qq_toplist_26.json',
+    'kugou': 'kugou_rank_8888.html',
+    'netease': 'netease_playlist_3778678.json',
+}
+# 被重定向到 stub 服务器的主机
+STUB_HOSTS = ('u.y.qq.com', 'www.kugou.com', 'music.163.com')
+
+# stub 服务器每个响应前的固定延迟（秒），模拟网络往返，使并发的效果可重复测量
+STUB_LATENCY = 0.02
+PARSE_ITERATIONS = 200
+CONCURRENCY_LEVELS = (1, 4, 8, 16)
+REQUESTS_PER_WORKER = 6
+
+
+def load_fixture(platform_name: str) -> bytes:
+    with open(os.path.join(FIXTURE_DIR, FIXTURES[platform_name]), 'rb') as f:
+        return f.read()
+
+
+def musicu_response(module: bytes, keys) -> bytes:
+    """把录制的单个模块结果拼成 musicu.fcg 的批量响应，每个模块键一份"""
+    parts = [b'"code":0'] + [f'"{key}":'.encode('utf-8') + module for key in keys]
+    return b'{' + b','.join(parts) + b'}'
+
+
+def parse_input(platform_name: str) -> bytes:
+    """解析基准的输入，与客户端收到的响应字节相同（QQ音乐的模块 fixture 包装为 musicu.fcg 响应）"""
+    content = load_fixture(platform_name)
+    if platform_name == 'qq':
+        return musicu_response(content, ['detail'])
+    return content
+
+
+# --- stub 服务器 ---
+
+class StubHandler(BaseHTTPRequestHandler):
+    """按路径回放录制的响应；musicu.fcg 按请求中的模块键拼出对应的批量响应"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, body: bytes, content_type: str):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _musicu(self, encoded: str):
+        request_data = json.loads(encoded)
+        keys = [key for key in request_data if key != 'comm']
+        self._reply(musicu_response(self.server.fixtures['qq'], keys), 'application/json')
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/cgi-bin/musicu.fcg':
+            self._musicu(parse_qs(url.query)['data'][0])
+        elif url.path.startswith('/yy/rank/home/'):
+            self._reply(self.server.fixtures['kugou'], 'text/html; charset=utf-8')
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        path = urlsplit(self.path).path
+        if path == '/cgi-bin/musicu.fcg':
+            self._musicu(body.decode('utf-8'))
+        elif path.startswith('/weapi/'):
+            self._reply(self.server.fixtures['netease'], 'application/json')
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # 酷狗流式解析读完数组后会提前关闭连接，属于预期行为
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class StubServer:
+    """在后台线程中运行的本地 stub 服务器"""
+
+    def __init__(self, latency: float = STUB_LATENCY):
+        self.httpd = _StubHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.httpd.latency = latency
+        self.httpd.fixtures = {name: load_fixture(name) for name in FIXTURES}
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        return False
+
+
+class StubAdapter(PooledAdapter):
+    """把发往真实平台的请求改写到 stub 服务器，连接池行为与正式的适配器相同"""
+
+    def __init__(self, base_url: str, **kwargs):
+        self.base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = self.base_url + url.path + (f"?{url.query}" if url.query else '')
+        return super().send(request, **kwargs)
+
+
+def make_stub_transport(base_url: str, pool_maxsize: int) -> Transport:
+    """创建请求全部指向 stub 服务器的 Transport（不启用限速，测量的是客户端本身的开销）"""
+    transport = Transport(pool_maxsize=pool_maxsize, dns_cache_ttl=None)
+    adapter = StubAdapter(base_url, pool_connections=1, pool_maxsize=pool_maxsize)
+    for host in STUB_HOSTS:
+        transport.session.mount(f"https://{host}", adapter)
+    return transport
+
+
+# --- 解析耗时与内存分配 ---
+
+def make_parsers(transport: Transport) -> Dict[str, Callable[[bytes], Optional[Dict[str, Any]]]]:
+    """各平台从原始响应字节到歌曲列表的解析函数，与客户端内部的路径一致"""
+    qq = QQMusicAPI(transport=transport)
+    kugou = KugouAPI(transport=transport)
+    return {
+        'qq': lambda content: qq._parse_toplist(fast_json.decode_qq_detail(content)['detail']),
+        'kugou': lambda content: kugou._parse_page(content, FIXTURES['kugou']),
+        'netease': lambda content: _parse_playlist(fast_json.decode_netease_playlist(content)),
+    }
+
+
+def bench_parse(parse: Callable[[bytes], Optional[Dict[str, Any]]], content: bytes,
+                iterations: int = PARSE_ITERATIONS) -> Dict[str, Any]:
+    """
+    测量一个平台的解析耗时和内存分配
+
+    Returns:
+        {'songs', 'bytes', 'median_ms', 'min_ms', 'us_per_song', 'peak_bytes_per_song', 'retained_bytes_per_song'}
+    """
+    result = parse(content)  # 预热
+    songs = len(result['songs'])
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        parse(content)
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+
+    del result
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = parse(content)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'songs': songs,
+        'bytes': len(content),
+        'median_ms': round(median * 1000, 4),
+        'min_ms': round(min(timings) * 1000, 4),
+        'us_per_song': round(median * 1e6 / songs, 3),
+        'peak_bytes_per_song': round((peak - before) / songs, 1),
+        'retained_bytes_per_song': round((retained - before) / songs, 1),
+    }
+
+
+# --- 端到端延迟与吞吐 ---
+
+def make_fetchers(transport: Transport) -> Dict[str, Callable[[], Optional[Dict[str, Any]]]]:
+    qq = QQMusicAPI(transport=transport)
+    kugou = KugouAPI(transport=transport)
+    return {
+        'qq': lambda: qq.get_toplist(26, limit=100),
+        'kugou': lambda: kugou.get_toplist_stream(8888),
+        'netease': lambda: fetch_toplist(3778678, transport=transport),
+    }
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def bench_e2e(fetch: Callable[[], Optional[Dict[str, Any]]], concurrency: int,
+              requests_per_worker: int = REQUESTS_PER_WORKER) -> Dict[str, Any]:
+    """
+    以给定并发反复抓取同一个榜单
+
+    Returns:
+        {'concurrency', 'requests', 'errors', 'p50_ms', 'p95_ms', 'mean_ms', 'charts_per_s', 'songs_per_s'}
+    """
+    latencies: List[float] = []
+    song_counts: List[int] = []
+    lock = threading.Lock()
+
+    def one():
+        start = time.perf_counter()
+        result = fetch()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            song_counts.append(len(result['songs']) if result else -1)
+
+    fetch()  # 预热，建立连接
+    total = concurrency * requests_per_worker
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(one) for _ in range(total)]:
+            future.result()
+    wall = time.perf_counter() - start
+
+    ok = [count for count in song_counts if count > 0]
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': total - len(ok),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'charts_per_s': round(len(ok) / wall, 2),
+        'songs_per_s': round(sum(ok) / wall, 1),
+    }
+
+
+# --- 结果保存与对比 ---
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(results: Dict[str, Any], results_dir: str = RESULTS_DIR) -> str:
+    os.makedirs(results_dir, exist_ok=True)
+    meta = results['meta']
+    path = os.path.join(results_dir, f"{meta['started_at'].replace(':', '').replace('-', '')}_{meta['commit']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def compare_results(old: Dict[str, Any], new: Dict[str, Any]):
+    """打印两次结果中主要指标的变化（耗时类指标变大、吞吐类指标变小即为回退）"""
+    print(f"\n对比 {old['meta']['commit']} -> {new['meta']['commit']}")
+    for name, entry in new['parse'].items():
+        before = old['parse'].get(name)
+        if before:
+            for metric in ('median_ms', 'peak_bytes_per_song'):
+                change = (entry[metric] / before[metric] - 1) if before[metric] else 0.0
+                print(f"  解析 {name:<8} {metric:<22} {before[metric]:>10} -> {entry[metric]:>10}  ({change:+.1%})")
+    for name, levels in new['e2e'].items():
+        before_levels = {level['concurrency']: level for level in old['e2e'].get(name, [])}
+        for level in levels:
+            before = before_levels.get(level['concurrency'])
+            if before:
+                change = (level['charts_per_s'] / before['charts_per_s'] - 1) if before['charts_per_s'] else 0.0
+                print(f"  端到端 {name:<8} 并发{level['concurrency']:<3} charts_per_s "
+                      f"{before['charts_per_s']:>8} -> {level['charts_per_s']:>8}  ({change:+.1%})")
+
+
+def run_benchmarks(latency: float = STUB_LATENCY, concurrency_levels=CONCURRENCY_LEVELS,
+                   parse_iterations: int = PARSE_ITERATIONS,
+                   requests_per_worker: int = REQUESTS_PER_WORKER) -> Dict[str, Any]:
+    """运行全部基准，返回可直接序列化为JSON的结果"""
+    results: Dict[str, Any] = {
+        'meta': {
+            'started_at': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'json_backend': fast_json.BACKEND,
+            'stub_latency_ms': latency * 1000,
+            'parse_iterations': parse_iterations,
+            'requests_per_worker': requests_per_worker,
+        },
+        'parse': {},
+        'e2e': {},
+    }
+
+    with StubServer(latency) as server:
+        transport = make_stub_transport(server.base_url, pool_maxsize=max(concurrency_levels))
+        try:
+            parsers = make_parsers(transport)
+            for name, parse in parsers.items():
+                entry = bench_parse(parse, parse_input(name), parse_iterations)
+                results['parse'][name] = entry
+                print(f"解析 {name:<8} {entry['songs']:>4} 首  {entry['median_ms']:>8.3f} ms/榜单  "
+                      f"{entry['us_per_song']:>7.2f} us/首  峰值 {entry['peak_bytes_per_song']:>8.0f} B/首  "
+                      f"常驻 {entry['retained_bytes_per_song']:>6.0f} B/首")
+
+            for name, fetch in make_fetchers(transport).items():
+                results['e2e'][name] = []
+                for concurrency in concurrency_levels:
+                    entry = bench_e2e(fetch, concurrency, requests_per_worker)
+                    results['e2e'][name].append(entry)
+                    print(f"端到端 {name:<8} 并发 {concurrency:>2}  p50 {entry['p50_ms']:>8.2f} ms  "
+                          f"p95 {entry['p95_ms']:>8.2f} ms  {entry['charts_per_s']:>7.1f} 榜单/秒  "
+                          f"错误 {entry['errors']}")
+        finally:
+            transport.close()
+    return results
+
+
+def main():
+    results = run_benchmarks()
+    path = save_results(results)
+    print(f"\n结果已保存: {path}")
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as f:
+            compare_results(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+标准库 json 与 fast_json 类型化解码的解析基准
+
+对 fixtures/ 中录制的三个平台响应，分别测量两条路径从响应字节到歌曲列表的耗时和内存分配：
+  - json: json.loads 解码为完整的字典树，再用字典路径逐层 .get() 解析（改动前的做法）
+  - fast: 客户端当前的路径，fast_json 按类型化结构解码（后端见 fast_json.BACKEND）
+另外测量 musicu.fcg 批量请求体的编码耗时（json.dumps 与预先编码 comm 的 _encode_musicu）。
+
+用法: python bench_json_decode.py [迭代次数]
+"""
+import json
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict
+
+import fast_json
+from bench_fetchers import FIXTURES, PARSE_ITERATIONS, bench_parse, parse_input
+from kugou_fixed import FeaturesStreamExtractor, KugouAPI, parse_toplist_page
+from netease_fetcher import _parse_playlist, parse_playlist_content
+from qqmusic_optimized import QQMusicAPI
+
+
+def parse_kugou_stdlib(content: bytes) -> Dict[str, Any]:
+    extractor = FeaturesStreamExtractor(decode=json.loads)
+    items = extractor.feed(content)
+    return {'title': extractor.title, 'songs': [KugouAPI._song_from_feature(idx, item)
+                                                 for idx, item in enumerate(items, 1)]}
+
+
+def make_paths(qq: QQMusicAPI) -> Dict[str, Dict[str, Callable[[bytes], Any]]]:
+    """平台 -> {'json': 标准库路径, 'fast': 客户端路径}"""
+    return {
+        'qq': {
+            'json': lambda content: qq._parse_toplist(json.loads(content)['detail']),
+            'fast': lambda content: qq._parse_toplist(fast_json.decode_qq_detail(content)['detail']),
+        },
+        'kugou': {
+            'json': parse_kugou_stdlib,
+            'fast': lambda content: parse_toplist_page(content, FIXTURES['kugou']),
+        },
+        'netease': {
+            'json': lambda content: _parse_playlist(json.loads(content)),
+            'fast': parse_playlist_content,
+        },
+    }
+
+
+def bench_encode(qq: QQMusicAPI, iterations: int) -> Dict[str, float]:
+    """20个榜单的批量请求体编码耗时（微秒，中位数）"""
+    data: Dict[str, Any] = {'comm': qq.COMM}
+    for topid in range(1, 21):
+        data[f"detail_{topid}"] = qq._build_detail_call(topid, 300, period='2024-06-01')
+    results = {}
+    for name, encode in (('json', json.dumps), ('fast', qq._encode_musicu)):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            encode(data)
+            timings.append(time.perf_counter() - start)
+        results[name] = round(statistics.median(timings) * 1e6, 2)
+    return results
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else PARSE_ITERATIONS
+    qq = QQMusicAPI()
+    print(f"解码后端: {fast_json.BACKEND}，每项 {iterations} 次")
+    for platform_name, paths in make_paths(qq).items():
+        content = parse_input(platform_name)
+        entries = {name: bench_parse(parse, content, iterations) for name, parse in paths.items()}
+        for name, entry in entries.items():
+            print(f"解析 {platform_name:<8} {name:<5} {entry['songs']:>4} 首  {entry['median_ms']:>8.3f} ms/榜单  "
+                  f"峰值 {entry['peak_bytes_per_song']:>8.0f} B/首")
+        before, after = entries['json'], entries['fast']
+        print(f"  -> 耗时 {after['median_ms'] / before['median_ms'] - 1:+.1%}  "
+              f"峰值分配 {after['peak_bytes_per_song'] / before['peak_bytes_per_song'] - 1:+.1%}")
+
+    encode = bench_encode(qq, iterations)
+    print(f"编码 musicu 请求体 (20个榜单)  json.dumps {encode['json']} us  _encode_musicu {encode['fast']} us")
+
+
+if __name__ == '__main__':
+    main()
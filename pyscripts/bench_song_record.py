@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+歌曲记录内存基准：对比原来的中文键字典与 SongRecord 保存 10 万条记录的内存占用
+
+数据来自 fixtures/netease_playlist_3778678.json，每个"周期"重新解码一次JSON，
+与实际抓取一样每次得到新的字符串对象，模拟在内存中保留多期榜单历史用于对比的场景。
+
+用法: python bench_song_record.py [记录数]
+"""
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from netease_fetcher import iter_tracks
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'netease_playlist_3778678.json')
+
+
+def legacy_tracks(tracks):
+    """原来的实现：每首歌一个中文键字典"""
+    for i, track in enumerate(tracks, 1):
+        artist_names = ' / '.join([ar['name'] for ar in track.get('ar', [])])
+        yield {
+            '排名': i,
+            '歌曲名': track.get('name'),
+            '歌手': artist_names,
+            '专辑': track.get('al', {}).get('name'),
+            '歌曲ID': track.get('id')
+        }
+
+
+def build(parse, raw: bytes, count: int):
+    songs = []
+    while len(songs) < count:
+        tracks = json.loads(raw)['playlist']['tracks']
+        songs.extend(parse(tracks))
+    del songs[count:]
+    return songs
+
+
+def bench(name, parse, raw: bytes, count: int):
+    start = time.perf_counter()
+    build(parse, raw, count)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    songs = build(parse, raw, count)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_record = (retained - base) / count
+    print(f"{name:<12} {count:>7} 条  常驻 {(retained - base) / 1024 / 1024:8.2f} MB  "
+          f"{per_record:7.1f} B/条  峰值 {(peak - base) / 1024 / 1024:8.2f} MB  构建 {elapsed:6.3f} 秒")
+    return songs, per_record
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with open(FIXTURE, 'rb') as f:
+        raw = f.read()
+
+    legacy, before = bench("字典", legacy_tracks, raw, count)
+    records, after = bench("SongRecord", iter_tracks, raw, count)
+
+    # 两种形式的内容必须一致
+    assert all(record.to_dict() == song for record, song in zip(records[:1000], legacy[:1000]))
+    print(f"\n每条记录节省 {before - after:.1f} 字节，内存占用为原来的 {after / before:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+weapi 加密微基准：对比旧实现（每次新密钥 + 大整数幂再取模）
+与 WeapiEncryptor（模幂 + 预生成密钥池）的每秒加密次数。
+
+用法: python bench_weapi.py [旧实现迭代次数] [新实现迭代次数]
+"""
+import json
+import sys
+import time
+
+from netease_fetcher import MODULUS, NONCE, PUBKEY, WeapiEncryptor, aes_encrypt, create_secret_key
+
+PAYLOAD = {
+    "id": "3778678",
+    "offset": 0,
+    "total": True,
+    "limit": 1000,
+    "n": 1000,
+    "csrf_token": ""
+}
+
+def legacy_rsa_encrypt(text, pub_key, modulus):
+    text = text[::-1]
+    rs = int(text.hex(), 16) ** int(pub_key, 16) % int(modulus, 16)
+    return format(rs, 'x').zfill(256)
+
+def legacy_weapi_encrypt(data):
+    data_bytes = json.dumps(data).encode('utf-8')
+    secret_key = create_secret_key(16)
+    iv = b'0102030405060708'
+    params = aes_encrypt(aes_encrypt(data_bytes, NONCE, iv), secret_key, iv)
+    enc_sec_key = legacy_rsa_encrypt(secret_key, PUBKEY, MODULUS)
+    return {
+        'params': params.decode('utf-8'),
+        'encSecKey': enc_sec_key
+    }
+
+def bench(name, func, iterations):
+    func(PAYLOAD)  # 预热
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(PAYLOAD)
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed
+    print(f"{name:<36} {iterations:>7} 次  {elapsed:8.3f} 秒  {rate:12.1f} 次/秒")
+    return rate
+
+def main():
+    legacy_iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    new_iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    # 确认新旧RSA结果一致
+    key = create_secret_key(16)
+    encryptor = WeapiEncryptor()
+    assert encryptor.rsa_encrypt(key) == legacy_rsa_encrypt(key, PUBKEY, MODULUS)
+
+    before = bench("旧实现 (** 后取模, 每次新密钥)", legacy_weapi_encrypt, legacy_iterations)
+    bench("WeapiEncryptor (max_uses=1)", WeapiEncryptor(max_uses=1).encrypt, new_iterations)
+    after = bench("WeapiEncryptor (默认密钥池)", encryptor.encrypt, new_iterations)
+    print(f"\n加速比: {after / before:.0f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+QQ_WEEK_PERIOD_PATTERN = re.compile(r'(\d{4})_(\d{1,2})')
+
+
+def period_date(period: str, weekday: int = 6) -> str:
+    """
+    周期标签对应的可排序日期 'YYYY-MM-DD'
+
+    日期标签原样返回；QQ音乐周榜的 'YYYY_WW' 换算为该ISO周的第 weekday 天（周一为0，默认周日）；
+    无法识别的标签原样返回。周标签与日期标签、以及不补零的周数 ('2024_9' 与 '2024_10') 之间
+    都不能按字符串比较先后，排序和比较周期时应使用这个日期。
+    """
+    match = QQ_WEEK_PERIOD_PATTERN.fullmatch(period)
+    if match is None:
+        return period
+    try:
+        return date.fromisocalendar(int(match.group(1)), int(match.group(2)), weekday + 1).isoformat()
+    except ValueError:
+        return period
+
+
+class Cadence:
+    """
+    榜单的更新节奏：固定间隔 (step) 在固定时刻发布新一期
+
+    子类实现 release_at，给出不晚于某时刻的最近一次发布时间；period_of 把发布时间转换为周期标签。
+    """
+
+    step = timedelta(days=1)
+
+    def release_at(self, now: datetime) -> datetime:
+        raise NotImplementedError
+
+    def next_release(self, now: datetime) -> datetime:
+        """now 之后的下一次发布时间"""
+        return self.release_at(now) + self.step
+
+    def period_of(self, release: datetime) -> str:
+        return release.strftime('%Y-%m-%d')
+
+    def period_at(self, now: datetime) -> str:
+        """now 时刻应当能获取到的最新一期的周期标签"""
+        return self.period_of(self.release_at(now))
+
+    def period_date(self, period: str) -> str:
+        """周期标签对应的可排序日期，见 period_date"""
+        return period_date(period)
+
+    def missed_periods(self, last_period: Optional[str], now: datetime, limit: int) -> List[str]:
+        """
+        last_period 之后到 now 为止发布过的周期，从旧到新，最多 limit 个
+
+        Args:
+            last_period: 上次成功获取的周期，None 表示从未获取过（只返回最新一期）
+            now: 当前时间
+            limit: 最多回补的期数
+        """
+        release = self.release_at(now)
+        periods = []
+        while len(periods) < max(1, limit):
+            period = self.period_of(release)
+            if period == last_period:
+                break
+            periods.append(period)
+            if last_period is None:
+                break
+            release -= self.step
+        return list(reversed(periods))
+
+
+class DailyCadence(Cadence):
+    """每天在 hour:minute 发布"""
+
+    def __init__(self, hour: int = 10, minute: int = 0):
+        self.hour = hour
+        self.minute = minute
+
+    def release_at(self, now: datetime) -> datetime:
+        release = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        return release if release <= now else release - self.step
+
+    def __repr__(self) -> str:
+        return f"每天 {self.hour:02d}:{self.minute:02d}"
+
+
+class WeeklyCadence(Cadence):
+    """每周 weekday (周一为0) 的 hour:minute 发布"""
+
+    step = timedelta(days=7)
+
+    def __init__(self, weekday: int, hour: int = 10, minute: int = 0, week_label: bool = False):
+        """
+        Args:
+            weekday: 发布日，周一为0
+            hour: 发布时刻（时）
+            minute: 发布时刻（分）
+            week_label: 周期标签使用 'YYYY_WW'（QQ音乐周榜的格式），否则使用发布日期
+        """
+        self.weekday = weekday
+        self.hour = hour
+        self.minute = minute
+        self.week_label = week_label
+
+    def release_at(self, now: datetime) -> datetime:
+        release = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        release -= timedelta(days=(now.weekday() - self.weekday) % 7)
+        return release if release <= now else release - self.step
+
+    def period_of(self, release: datetime) -> str:
+        if self.week_label:
+            year, week, _ = release.isocalendar()
+            return f"{year}_{week}"
+        return super().period_of(release)
+
+    def period_date(self, period: str) -> str:
+        """周标签换算为该周的发布日"""
+        return period_date(period, self.weekday)
+
+    def __repr__(self) -> str:
+        return f"每周{'一二三四五六日'[self.weekday]} {self.hour:02d}:{self.minute:02d}"
+
+
+# 各榜单的更新节奏 {(平台, 榜单ID): Cadence}，发布时刻为经验值，实际以平台为准
+CHART_CADENCES: Dict[Tuple[str, int], Cadence] = {
+    ('qq', 62): DailyCadence(10),                    # 飙升榜，每天更新
+    ('qq', 27): DailyCadence(10),                    # 新歌榜，每天更新
+    ('qq', 26): WeeklyCadence(3, 10, week_label=True),  # 热歌榜，每周四更新
+    ('kugou', 8888): DailyCadence(10),               # 酷狗TOP500
+    ('kugou', 6666): DailyCadence(10),               # 酷狗飙升榜
+    ('netease', 19723756): DailyCadence(10),         # 飙升榜，每天更新
+    ('netease', 3779629): DailyCadence(10),          # 新歌榜，每天更新
+    ('netease', 3778678): WeeklyCadence(3, 10),      # 热歌榜，每周四更新
+}
+DEFAULT_CADENCE = DailyCadence(10)
+
+# 榜单目录 (chart_catalog.py) 中推断出的节奏，优先级低于 CHART_CADENCES
+DISCOVERED_CADENCES: Dict[Tuple[str, int], Cadence] = {}
+
+
+def cadence_for(platform: str, chart_id: int) -> Cadence:
+    """榜单的更新节奏：优先使用配置，其次使用榜单目录推断的节奏，都没有时按每天更新处理"""
+    key = (platform, chart_id)
+    return CHART_CADENCES.get(key) or DISCOVERED_CADENCES.get(key, DEFAULT_CADENCE)
+
+
+def period_date_of(platform: str, chart_id, period: str) -> str:
+    """某个榜单的周期标签对应的可排序日期，周榜按该榜单的发布日换算"""
+    try:
+        chart_id = int(chart_id)
+    except (TypeError, ValueError):
+        pass
+    return cadence_for(platform, chart_id).period_date(period)
+
+
+WEEKDAY_NAMES = '一二三四五六日'
+WEEKLY_FREQUENCY_PATTERN = re.compile(r'每周([一二三四五六日天])')
+
+
+def cadence_from_frequency(frequency: str) -> Optional[Cadence]:
+    """
+    由平台给出的更新频率文字推断节奏，例如网易云的 '每天更新'、'每周四更新'
+
+    Returns:
+        无法识别时返回None
+    """
+    if not frequency:
+        return None
+    match = WEEKLY_FREQUENCY_PATTERN.search(frequency)
+    if match:
+        return WeeklyCadence(WEEKDAY_NAMES.index(match.group(1).replace('天', '日')), 10)
+    if '每天' in frequency or '每日' in frequency or '刚刚' in frequency:
+        return DailyCadence(10)
+    return None
+
+
+def cadence_from_qq_period(period: Optional[str], update_time: Optional[str] = None) -> Optional[Cadence]:
+    """
+    由QQ音乐榜单目录中的周期推断节奏：'YYYY_WW' 为周榜（发布日取 update_time 的星期），'YYYY-MM-DD' 为日榜
+
+    Returns:
+        无法识别时返回None
+    """
+    if not period:
+        return None
+    if QQ_WEEK_PERIOD_PATTERN.fullmatch(period):
+        weekday = 3
+        if update_time:
+            try:
+                weekday = datetime.strptime(update_time[:10], '%Y-%m-%d').weekday()
+            except ValueError:
+                pass
+        return WeeklyCadence(weekday, 10, week_label=True)
+    return DailyCadence(10)
+
+
+def register_cadence(platform: str, chart_id: int, cadence: Cadence):
+    """登记从榜单目录推断出的节奏；CHART_CADENCES 中已配置的榜单仍以配置为准"""
+    DISCOVERED_CADENCES[(platform, chart_id)] = cadence
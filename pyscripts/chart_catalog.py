@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+各平台榜单目录：自动发现所有可用的排行榜及其元数据和更新节奏，代替手工维护的榜单ID表
+
+- QQ音乐: musicu.fcg 的 ToplistInfoServer.GetAll（分组、最新周期、更新时间）
+- 酷狗: 排行榜首页 rank.html 侧栏中的榜单链接
+- 网易云: weapi/toplist（更新频率文字，例如 '每周四更新'）
+
+目录缓存在 chart_catalog.json，每个平台单独记录获取时间，只刷新超过 TTL 的平台；
+某个平台获取失败时保留上次的目录，从未获取成功时退回 async_fetcher 中的默认榜单。
+推断出的节奏登记到 chart_cadence，QQ音乐的周期参数和调度服务都会使用。
+
+用法: python chart_catalog.py [--refresh]  （打印全部榜单，--refresh 忽略TTL强制刷新）
+"""
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from chart_cadence import Cadence, cadence_for, cadence_from_frequency, cadence_from_qq_period, register_cadence
+from transport import Transport
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CATALOG_PATH = os.path.join(BASE_DIR, 'chart_catalog.json')
+PLATFORMS = ('qq', 'kugou', 'netease')
+
+Discoverer = Callable[[], Optional[List[Dict[str, Any]]]]
+
+
+class ChartInfo(NamedTuple):
+    """榜单目录中的一项"""
+    platform: str
+    chart_id: int
+    name: str
+    group: str = ''
+    frequency: str = ''
+    period: Optional[str] = None
+    update_time: Optional[str] = None
+    intro: str = ''
+
+    @property
+    def key(self) -> str:
+        return f"{self.platform}/{self.chart_id}"
+
+    def infer_cadence(self) -> Optional[Cadence]:
+        """由平台给出的周期或更新频率推断节奏，无法推断时返回None"""
+        if self.platform == 'qq':
+            return cadence_from_qq_period(self.period, self.update_time)
+        return cadence_from_frequency(self.frequency)
+
+    @property
+    def cadence(self) -> Cadence:
+        return cadence_for(self.platform, self.chart_id)
+
+
+def default_discoverers(transport: Optional[Transport] = None) -> Dict[str, Discoverer]:
+    """各平台的目录获取函数"""
+    from kugou_fixed import KugouAPI
+    from netease_fetcher import fetch_toplist_catalog
+    from qqmusic_optimized import QQMusicAPI
+
+    return {
+        'qq': lambda: QQMusicAPI(transport=transport).get_all_toplists(),
+        'kugou': lambda: KugouAPI(transport=transport).get_rank_list(),
+        'netease': lambda: fetch_toplist_catalog(transport),
+    }
+
+
+def default_toplists(platform: str) -> Dict[str, int]:
+    """async_fetcher 中手工维护的默认榜单"""
+    from async_fetcher import KUGOU_TOPLISTS, NETEASE_TOPLISTS, QQ_TOPLISTS
+
+    return {'qq': QQ_TOPLISTS, 'kugou': KUGOU_TOPLISTS, 'netease': NETEASE_TOPLISTS}[platform]
+
+
+class ChartCatalog:
+    """带磁盘缓存的榜单目录"""
+
+    def __init__(self, path: str = DEFAULT_CATALOG_PATH, ttl: float = 24 * 3600,
+                 discoverers: Optional[Dict[str, Discoverer]] = None,
+                 transport: Optional[Transport] = None,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            path: 目录缓存文件
+            ttl: 每个平台目录的有效期（秒），过期后下次使用时重新获取
+            discoverers: {平台: 获取函数}，默认使用三个平台的客户端
+            transport: 默认获取函数使用的HTTP传输层
+            clock: 当前时间戳，测试时可替换
+        """
+        self.path = path
+        self.ttl = ttl
+        self.discoverers = discoverers if discoverers is not None else default_discoverers(transport)
+        self.clock = clock
+        self._platforms: Dict[str, Dict[str, Any]] = self._load()
+        self._register_cadences()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取榜单目录失败，将重新获取: {e}")
+            return {}
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._platforms, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _register_cadences(self):
+        for chart in self._all_charts():
+            cadence = chart.infer_cadence()
+            if cadence is not None:
+                register_cadence(chart.platform, chart.chart_id, cadence)
+
+    def _all_charts(self) -> Iterable[ChartInfo]:
+        for platform, entry in self._platforms.items():
+            for chart in entry.get('charts', []):
+                yield ChartInfo(platform=platform, **chart)
+
+    def is_stale(self, platform: str) -> bool:
+        entry = self._platforms.get(platform)
+        return entry is None or self.clock() - entry.get('fetched_at', 0) >= self.ttl
+
+    def refresh(self, platforms: Optional[Iterable[str]] = None, force: bool = False) -> Dict[str, bool]:
+        """
+        重新获取过期平台的目录，未过期的平台不发请求
+
+        Args:
+            platforms: 要刷新的平台，默认全部
+            force: 忽略TTL强制刷新
+
+        Returns:
+            {平台: 是否获取成功}，只包含实际请求了的平台
+        """
+        refreshed = {}
+        for platform in platforms or PLATFORMS:
+            if not force and not self.is_stale(platform):
+                continue
+            discover = self.discoverers.get(platform)
+            charts = discover() if discover else None
+            refreshed[platform] = bool(charts)
+            if not charts:
+                print(f"[榜单目录] 获取 {platform} 目录失败，继续使用上次的目录")
+                continue
+            old_ids = {chart['chart_id'] for chart in self._platforms.get(platform, {}).get('charts', [])}
+            new_ids = {chart['chart_id'] for chart in charts}
+            if old_ids and old_ids != new_ids:
+                print(f"[榜单目录] {platform}: 新增 {len(new_ids - old_ids)} 个，下线 {len(old_ids - new_ids)} 个榜单")
+            self._platforms[platform] = {'fetched_at': self.clock(), 'charts': charts}
+        if any(refreshed.values()):
+            self._save()
+            self._register_cadences()
+        return refreshed
+
+    def charts(self, platform: Optional[str] = None) -> List[ChartInfo]:
+        """全部榜单（先刷新过期的平台），platform 为空时返回所有平台"""
+        platforms = [platform] if platform else list(PLATFORMS)
+        self.refresh(platforms)
+        return [chart for chart in self._all_charts() if chart.platform in platforms]
+
+    def toplists(self, platform: str) -> Dict[str, int]:
+        """
+        {榜单名: ID}，可直接传给 AsyncFetchEngine.run_all；目录不可用时返回默认榜单
+
+        同一平台内重名的榜单在名称后附加ID，保证输出文件不互相覆盖。
+        """
+        charts = self.charts(platform)
+        if not charts:
+            return dict(default_toplists(platform))
+        toplists = {}
+        for chart in charts:
+            name = chart.name if chart.name not in toplists else f"{chart.name}_{chart.chart_id}"
+            toplists[name] = chart.chart_id
+        return toplists
+
+    def jobs(self) -> List:
+        """全部榜单的调度任务 (chart_scheduler.ChartJob)"""
+        from chart_scheduler import ChartJob
+
+        return [ChartJob(platform, name, chart_id, cadence_for(platform, chart_id))
+                for platform in PLATFORMS
+                for name, chart_id in self.toplists(platform).items()]
+
+
+def main():
+    """打印全部榜单，命令行参数 --refresh 忽略TTL强制刷新"""
+    catalog = ChartCatalog()
+    if '--refresh' in sys.argv[1:]:
+        catalog.refresh(force=True)
+    for platform in PLATFORMS:
+        charts = catalog.charts(platform)
+        print(f"\n[{platform}] 共 {len(charts)} 个榜单")
+        for chart in charts:
+            group = f"[{chart.group}] " if chart.group else ''
+            print(f"  {chart.chart_id:>10}  {group}{chart.name}  {chart.cadence}  {chart.period or ''}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from chart_cadence import period_date_of
+from song_record import SongRecord
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')
+
+# 各平台用来识别同一首歌的字段
+SONG_KEY_FIELDS = {
+    'qq': '歌曲ID',
+    'kugou': 'Hash',
+    'netease': '歌曲ID',
+}
+
+
+def song_key(song: Dict[str, Any], platform: str) -> str:
+    """取歌曲在平台内的唯一ID，缺失时退回到 歌曲名+歌手"""
+    key = song.get(SONG_KEY_FIELDS.get(platform, '歌曲ID'))
+    if key:
+        return str(key)
+    return f"{song.get('歌曲名', '')}\t{song.get('歌手', '')}"
+
+
+class ChartDiff:
+    """两次抓取之间的榜单变化"""
+
+    def __init__(self, platform: str, chart_id: Any, period: str, previous_period: Optional[str]):
+        self.platform = platform
+        self.chart_id = chart_id
+        self.period = period
+        self.previous_period = previous_period
+        # (歌曲ID, 新排名, 歌曲名)
+        self.entries: List[Tuple[str, int, str]] = []
+        # (歌曲ID, 旧排名, 歌曲名)
+        self.exits: List[Tuple[str, int, str]] = []
+        # (歌曲ID, 旧排名, 新排名)
+        self.moves: List[Tuple[str, int, int]] = []
+        self.unchanged = 0
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.entries or self.exits or self.moves)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """紧凑的变更记录，只包含变化部分"""
+        return {
+            'platform': self.platform,
+            'chart_id': self.chart_id,
+            'period': self.period,
+            'previous_period': self.previous_period,
+            'entries': self.entries,
+            'exits': self.exits,
+            'moves': self.moves,
+            'unchanged': self.unchanged,
+        }
+
+    def summary(self) -> str:
+        return (f"新进 {len(self.entries)}，跌出 {len(self.exits)}，"
+                f"排名变化 {len(self.moves)}，不变 {self.unchanged}")
+
+
+def diff_songs(previous: List[Dict[str, Any]], current: List[Dict[str, Any]], platform: str,
+               chart_id: Any = None, period: str = '', previous_period: Optional[str] = None) -> ChartDiff:
+    """
+    比较同一榜单前后两次的歌曲列表，线性时间
+
+    Args:
+        previous: 上一次的歌曲列表（可为空列表）
+        current: 本次的歌曲列表
+        platform: 'qq' / 'kugou' / 'netease'
+    """
+    diff = ChartDiff(platform, chart_id, period, previous_period)
+    old_ranks = {song_key(song, platform): (song.get('排名'), song.get('歌曲名', '')) for song in previous}
+
+    seen = set()
+    for song in current:
+        key = song_key(song, platform)
+        seen.add(key)
+        rank = song.get('排名')
+        old = old_ranks.get(key)
+        if old is None:
+            diff.entries.append((key, rank, song.get('歌曲名', '')))
+        elif old[0] != rank:
+            diff.moves.append((key, old[0], rank))
+        else:
+            diff.unchanged += 1
+
+    for key, (rank, name) in old_ranks.items():
+        if key not in seen:
+            diff.exits.append((key, rank, name))
+    return diff
+
+
+class SnapshotStore:
+    """
+    按 (平台, 榜单ID, 周期) 保存榜单快照
+
+    目录结构: <root>/<平台>/<榜单ID>/<周期>.json，只保存 歌曲ID/排名/歌曲名/歌手
+    """
+
+    def __init__(self, root: str = DEFAULT_SNAPSHOT_DIR):
+        self.root = root
+
+    def _chart_dir(self, platform: str, chart_id: Any) -> str:
+        return os.path.join(self.root, platform, str(chart_id))
+
+    def save(self, platform: str, chart_id: Any, period: str, songs: List[Dict[str, Any]]):
+        chart_dir = self._chart_dir(platform, chart_id)
+        os.makedirs(chart_dir, exist_ok=True)
+        rows = [[song_key(song, platform), song.get('排名'), song.get('歌曲名', ''), song.get('歌手', '')]
+                for song in songs]
+        path = os.path.join(chart_dir, f"{period}.json")
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def load(self, platform: str, chart_id: Any, period: str) -> Optional[List[Dict[str, Any]]]:
+        path = os.path.join(self._chart_dir(platform, chart_id), f"{period}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        key_field = SONG_KEY_FIELDS.get(platform, '歌曲ID')
+        return [SongRecord(rank=row[1], title=row[2], artist=row[3], album=None, song_id=row[0], id_field=key_field)
+                for row in rows]
+
+    def periods(self, platform: str, chart_id: Any) -> List[str]:
+        """该榜单已保存的所有周期，按时间升序（周标签按发布日排序，见 chart_cadence.period_date）"""
+        try:
+            names = os.listdir(self._chart_dir(platform, chart_id))
+        except OSError:
+            return []
+        return sorted((name[:-5] for name in names if name.endswith('.json')),
+                      key=lambda period: period_date_of(platform, chart_id, period))
+
+    def latest_before(self, platform: str, chart_id: Any, period: str) -> Optional[str]:
+        """早于（或等于）给定周期的最近一次快照周期"""
+        date = period_date_of(platform, chart_id, period)
+        candidates = [p for p in self.periods(platform, chart_id) if period_date_of(platform, chart_id, p) <= date]
+        return candidates[-1] if candidates else None
+
+
+class ChartTracker:
+    """保存每次抓取的快照，并把与上一次快照的差异追加到变更日志 (JSON Lines)"""
+
+    def __init__(self, store: Optional[SnapshotStore] = None, changelog_path: Optional[str] = None):
+        self.store = store or SnapshotStore()
+        self.changelog_path = changelog_path or os.path.join(self.store.root, 'changes.jsonl')
+        self._lock = threading.Lock()
+
+    def record(self, platform: str, chart_id: Any, songs: List[Dict[str, Any]],
+               period: Optional[str] = None) -> ChartDiff:
+        """
+        记录一次抓取结果并返回与上一次快照的差异
+
+        同一周期内多次抓取会与该周期已保存的快照比较，然后覆盖它。
+
+        Args:
+            platform: 'qq' / 'kugou' / 'netease'
+            chart_id: 榜单ID
+            songs: 本次抓取的歌曲列表
+            period: 榜单周期，默认当天日期
+        """
+        period = period or datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            previous_period = self.store.latest_before(platform, chart_id, period)
+            previous = self.store.load(platform, chart_id, previous_period) if previous_period else []
+            diff = diff_songs(previous or [], songs, platform, chart_id, period, previous_period)
+            self.store.save(platform, chart_id, period, songs)
+            if diff.has_changes:
+                record = dict(diff.to_dict(), time=int(time.time()))
+                os.makedirs(os.path.dirname(self.changelog_path) or '.', exist_ok=True)
+                with open(self.changelog_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        return diff
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+常驻的榜单调度服务：按每个榜单真实的更新节奏抓取，而不是每隔几分钟全部轮询一遍
+
+- 每个榜单一个协程，全部运行在同一个事件循环上，共用一个 AsyncFetchEngine（同一个连接池、缓存和限速器）
+- 只在榜单预计发布新一期之后才请求（节奏见 chart_cadence.py），
+  每个榜单在发布时刻后再错开一个稳定的偏移（0 ~ spread 秒），避免所有榜单同时请求
+- 新一期还没出现时（QQ音乐返回空、其它平台的内容与上一期保存的快照相同）按 retry_delays 退避重试，
+  全部用完后等下一期
+- 每个榜单最后成功获取的周期保存在 scheduler_state.json；重启后QQ音乐会按周期参数回补停机期间错过的榜单，
+  其它平台没有历史榜单接口，只能获取最新一期
+
+用法: python chart_scheduler.py [--all] [--metrics-port=N] [--schema-state=文件] [导出格式...]  例如: python chart_scheduler.py csv sqlite
+"""
+import asyncio
+import json
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from chart_cadence import Cadence, cadence_for
+from chart_diff import SnapshotStore, diff_songs
+from telemetry import start_metrics_server
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STATE_PATH = os.path.join(BASE_DIR, 'scheduler_state.json')
+
+# 新一期未出现时的重试间隔（秒）
+RETRY_DELAYS = (300, 600, 1200, 2400, 3600)
+
+# 支持按周期请求历史榜单的平台
+BACKFILL_PLATFORMS = {'qq'}
+
+
+class ChartJob(NamedTuple):
+    """一个需要定期抓取的榜单"""
+    platform: str
+    name: str
+    chart_id: int
+    cadence: Cadence
+
+    @property
+    def key(self) -> str:
+        return f"{self.platform}/{self.chart_id}"
+
+
+def default_jobs() -> List[ChartJob]:
+    """async_fetcher 中配置的全部默认榜单"""
+    from async_fetcher import KUGOU_TOPLISTS, NETEASE_TOPLISTS, QQ_TOPLISTS
+
+    jobs = []
+    for platform, charts in (('qq', QQ_TOPLISTS), ('kugou', KUGOU_TOPLISTS), ('netease', NETEASE_TOPLISTS)):
+        for name, chart_id in charts.items():
+            jobs.append(ChartJob(platform, name, chart_id, cadence_for(platform, chart_id)))
+    return jobs
+
+
+class ChartScheduler:
+    """按榜单更新节奏调度抓取的常驻服务"""
+
+    def __init__(self, engine, jobs: Sequence[ChartJob],
+                 state_path: str = DEFAULT_STATE_PATH,
+                 snapshots: Optional[SnapshotStore] = None,
+                 spread: float = 600,
+                 retry_delays: Sequence[float] = RETRY_DELAYS,
+                 max_backfill: int = 7,
+                 clock: Callable[[], datetime] = datetime.now,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        """
+        Args:
+            engine: 抓取引擎，需提供 fetch_chart(platform, name, chart_id, period, accept=...)（见 AsyncFetchEngine）
+            jobs: 要调度的榜单
+            state_path: 保存每个榜单最后成功周期的JSON文件
+            snapshots: 引擎保存榜单快照的位置（engine.tracker.store），用来判断不支持按周期请求的平台
+                是否已发布新一期，默认 SnapshotStore()
+            spread: 发布时刻后错开请求的最大偏移（秒）
+            retry_delays: 新一期未出现时依次等待的秒数
+            max_backfill: 停机恢复后最多回补的期数
+            clock: 当前时间，测试时可替换
+            sleep: 异步等待函数，测试时可替换
+        """
+        self.engine = engine
+        self.jobs = list(jobs)
+        self.state_path = state_path
+        self.snapshots = snapshots if snapshots is not None else SnapshotStore()
+        self.spread = spread
+        self.retry_delays = tuple(retry_delays)
+        self.max_backfill = max_backfill
+        self.clock = clock
+        self.sleep = sleep
+        self.state: Dict[str, str] = self._load_state()
+        self._stats = {'polls': 0, 'new_periods': 0, 'retries': 0, 'given_up': 0}
+
+    def _load_state(self) -> Dict[str, str]:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取调度状态失败，将从最新一期开始: {e}")
+            return {}
+
+    def _save_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def offset_of(self, job: ChartJob) -> timedelta:
+        """榜单在发布时刻后的固定偏移，由榜单键哈希得到，重启后保持不变"""
+        if self.spread <= 0:
+            return timedelta(0)
+        return timedelta(seconds=zlib.crc32(job.key.encode('utf-8')) % int(self.spread))
+
+    def due_periods(self, job: ChartJob, now: datetime) -> List[str]:
+        """now 时刻该榜单需要抓取的周期，从旧到新；已是最新时返回空列表"""
+        shifted = now - self.offset_of(job)
+        last = self.state.get(job.key)
+        if last == job.cadence.period_at(shifted):
+            return []
+        limit = self.max_backfill if job.platform in BACKFILL_PLATFORMS else 1
+        return job.cadence.missed_periods(last, shifted, limit)
+
+    def next_wakeup(self, job: ChartJob, now: datetime) -> datetime:
+        """下一次发布时刻加上该榜单的偏移"""
+        offset = self.offset_of(job)
+        return job.cadence.next_release(now - offset) + offset
+
+    def _is_new(self, job: ChartJob, result: Dict[str, Any]) -> bool:
+        """
+        不支持按周期请求的平台只能获取当前榜单：与上次成功获取的那一期保存的快照相同，说明新一期还没发布
+
+        不使用结果中的 unchanged 标记：它只表示与HTTP缓存中的上一次响应相同，重启后缓存里
+        可能已经是这一期的内容。没有上一期快照（第一次抓取）时视为新一期。
+        """
+        last = self.state.get(job.key)
+        previous_period = self.snapshots.latest_before(job.platform, job.chart_id, last) if last else None
+        if previous_period is None:
+            return True
+        previous = self.snapshots.load(job.platform, job.chart_id, previous_period)
+        return previous is None or diff_songs(previous, result['songs'], job.platform).has_changes
+
+    async def _fetch(self, job: ChartJob, period: str) -> bool:
+        """抓取一次，获取到新一期时返回True"""
+        self._stats['polls'] += 1
+        if job.platform in BACKFILL_PLATFORMS:
+            result = await self.engine.fetch_chart(job.platform, job.name, job.chart_id, period)
+        else:
+            result = await self.engine.fetch_chart(job.platform, job.name, job.chart_id, period,
+                                                   accept=lambda result: self._is_new(job, result))
+        return result is not None
+
+    async def poll(self, job: ChartJob, period: str) -> bool:
+        """
+        获取某一期榜单，未出现时按 retry_delays 退避重试
+
+        Returns:
+            是否成功获取
+        """
+        for attempt in range(len(self.retry_delays) + 1):
+            if attempt:
+                self._stats['retries'] += 1
+                await self.sleep(self.retry_delays[attempt - 1])
+            if await self._fetch(job, period):
+                self._stats['new_periods'] += 1
+                self.state[job.key] = period
+                self._save_state()
+                return True
+        self._stats['given_up'] += 1
+        print(f"[调度] {job.name} ({job.key}) 第 {period} 期在 {len(self.retry_delays)} 次重试后仍未获取到，等待下一期")
+        return False
+
+    async def run_job(self, job: ChartJob, until: Optional[datetime] = None):
+        """单个榜单的调度循环，until 为空时一直运行"""
+        while until is None or self.clock() < until:
+            for period in self.due_periods(job, self.clock()):
+                if not await self.poll(job, period):
+                    break
+            delay = (self.next_wakeup(job, self.clock()) - self.clock()).total_seconds()
+            if until is not None:
+                delay = min(delay, (until - self.clock()).total_seconds())
+            await self.sleep(max(0.0, delay))
+
+    async def run(self, until: Optional[datetime] = None):
+        """所有榜单并发调度"""
+        for job in self.jobs:
+            wakeup = self.next_wakeup(job, self.clock())
+            print(f"[调度] {job.name} ({job.key}) {job.cadence}，下次请求 {wakeup:%Y-%m-%d %H:%M:%S}")
+        await asyncio.gather(*(self.run_job(job, until) for job in self.jobs))
+
+    def stats(self) -> Dict[str, int]:
+        """请求次数、获取到的新周期数、重试次数、放弃次数"""
+        return dict(self._stats)
+
+
+async def run_forever(export_formats: Optional[List[str]] = None, per_host_limit: int = 4,
+                      full_catalog: bool = False, metrics_port: Optional[int] = None,
+                      schema_state: Optional[str] = None):
+    from async_fetcher import build_engine
+
+    if metrics_port:
+        start_metrics_server(metrics_port)
+        print(f"[调度] Prometheus 指标: http://0.0.0.0:{metrics_port}/metrics")
+    engine = build_engine(per_host_limit, export_formats, schema_state=schema_state)
+    if full_catalog:
+        from chart_catalog import ChartCatalog
+        jobs = await asyncio.to_thread(ChartCatalog(transport=engine.transport).jobs)
+    else:
+        jobs = default_jobs()
+    scheduler = ChartScheduler(engine, jobs, snapshots=engine.tracker.store)
+    try:
+        await scheduler.run()
+    finally:
+        print(f"[调度] 统计: {scheduler.stats()}")
+        engine.transport.print_stats()
+        engine.close()
+
+
+def main():
+    """
+    启动调度服务。命令行参数为导出格式，例如: python chart_scheduler.py csv sqlite
+    加上 --all 时调度榜单目录中的全部榜单，--metrics-port=N 时在该端口提供 /metrics，
+    --schema-state=文件 时把响应结构指纹保存到该文件
+    """
+    args = sys.argv[1:]
+    metrics_port = None
+    schema_state = None
+    for arg in args:
+        if arg.startswith('--metrics-port='):
+            metrics_port = int(arg.split('=', 1)[1])
+        elif arg.startswith('--schema-state='):
+            schema_state = arg.split('=', 1)[1]
+    export_formats = [arg for arg in args if not arg.startswith('--')] or ['csv']
+    try:
+        asyncio.run(run_forever(export_formats, full_catalog='--all' in args, metrics_port=metrics_port,
+                                schema_state=schema_state))
+    except KeyboardInterrupt:
+        print("调度服务已停止")
+
+
+if __name__ == '__main__':
+    main()
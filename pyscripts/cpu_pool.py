@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+CPU 密集阶段的进程池执行层
+
+网易云 weapi 的两次AES加密、歌单响应和酷狗 global.features 的 JSON 解析都是纯 CPU 计算，
+在线程中执行时持有 GIL，会拖慢同一进程里的网络请求和事件循环。
+CpuPool 把这些阶段放到独立进程中执行，网络请求仍在事件循环/线程中进行：
+
+- 加密按 batch_size 条打包成一次进程间调用，分摊序列化和通信开销
+- 解析直接传输响应字节，返回 SongRecord 列表（SongRecord 支持 pickle）
+- 进程数可配置，默认为 CPU 核心数
+
+同步方法（parse_kugou/parse_netease/encrypt_many）可在线程中调用，阻塞的只是调用线程；
+事件循环中使用 encrypt_many_async。
+"""
+import asyncio
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from kugou_fixed import parse_toplist_page
+from netease_fetcher import parse_playlist_content, weapi_encrypt
+from telemetry import get_telemetry
+
+
+# --- 在工作进程中执行的函数（须为模块级函数才能被 pickle） ---
+
+def _init_worker():
+    # Ctrl+C 由主进程处理，工作进程忽略，避免每个进程各打印一份 KeyboardInterrupt
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _encrypt_batch(payloads: Sequence[Dict[str, Any]]) -> List[Dict[str, str]]:
+    # 每个工作进程使用自己的默认 WeapiEncryptor，RSA 结果在进程内复用
+    return [weapi_encrypt(payload) for payload in payloads]
+
+
+def _parse_kugou(content: bytes, url: str) -> Optional[Dict[str, Any]]:
+    return parse_toplist_page(content, url)
+
+
+def _parse_netease(content: bytes) -> Optional[Dict[str, Any]]:
+    return parse_playlist_content(content)
+
+
+class CpuPool:
+    """把加密和大页面解析放到进程池中执行"""
+
+    def __init__(self, max_workers: Optional[int] = None, batch_size: int = 32):
+        """
+        Args:
+            max_workers: 工作进程数，默认为 CPU 核心数
+            batch_size: 每次进程间调用打包的加密请求数
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+
+    def _chunks(self, payloads: Sequence[Dict[str, Any]]) -> List[Sequence[Dict[str, Any]]]:
+        # 请求数不足以填满所有进程时缩小批次，让每个进程都分到工作
+        size = max(1, min(self.batch_size, -(-len(payloads) // self.max_workers)))
+        return [payloads[i:i + size] for i in range(0, len(payloads), size)]
+
+    def encrypt_many(self, payloads: Sequence[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """批量 weapi 加密，结果与 payloads 一一对应"""
+        results = []
+        for batch in self._executor.map(_encrypt_batch, self._chunks(payloads)):
+            results.extend(batch)
+        return results
+
+    async def encrypt_many_async(self, payloads: Sequence[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """encrypt_many 的异步版本，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        batches = await asyncio.gather(*(loop.run_in_executor(self._executor, _encrypt_batch, chunk)
+                                         for chunk in self._chunks(payloads)))
+        return [result for batch in batches for result in batch]
+
+    def parse_kugou(self, content: bytes, url: str) -> Optional[Dict[str, Any]]:
+        """在工作进程中解析酷狗排行榜页面，可作为 KugouAPI 的 page_parser"""
+        with get_telemetry().stage('parse', executor='process'):
+            return self._executor.submit(_parse_kugou, content, url).result()
+
+    def parse_netease(self, content: bytes) -> Optional[Dict[str, Any]]:
+        """在工作进程中解析网易云歌单响应，可作为 fetch_toplist 的 parser"""
+        with get_telemetry().stage('parse', executor='process'):
+            return self._executor.submit(_parse_netease, content).result()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
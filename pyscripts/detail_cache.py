@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class DetailCache:
+    """
+    按歌曲ID持久化的歌曲详情缓存：歌曲ID -> 详情元组
+
+    歌曲详情（歌名、歌手、时长、比特率等）基本不变，查询过一次就写入磁盘，
+    榜单小幅变化后再次抓取只需查询新上榜的歌曲。网易云补全未内联的歌曲、
+    酷狗补全时长/比特率都使用它。设置 max_entries 时按最近最少使用淘汰，长期运行的进程占用有上限。
+    """
+
+    def __init__(self, path: Optional[str], key_type: Callable[[str], Hashable] = str,
+                 max_entries: Optional[int] = None):
+        """
+        Args:
+            path: 缓存文件路径，None 表示只在内存中使用
+            key_type: 从 JSON 的字符串键还原歌曲ID的函数，例如网易云的 track id 为 int
+            max_entries: 最多缓存的条目数，None 表示不限制
+        """
+        self.path = path
+        self.key_type = key_type
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # 按最近使用排序，最久未使用的在前（写盘时保持这个顺序）
+        self._details: 'OrderedDict[Hashable, Tuple[Any, ...]]' = OrderedDict()
+        self._dirty = False
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        self._details.update((self.key_type(key), tuple(detail)) for key, detail in data.items())
+        self._evict()
+
+    def _evict(self):
+        """在持有锁（或初始化）时调用"""
+        if self.max_entries is None:
+            return
+        while len(self._details) > self.max_entries:
+            self._details.popitem(last=False)
+            self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._details)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._details
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, ...]]:
+        with self._lock:
+            detail = self._details.get(key)
+            if detail is not None:
+                self._details.move_to_end(key)
+            return detail
+
+    def missing(self, keys: Iterable[Hashable]) -> List[Hashable]:
+        """keys 中尚未缓存的ID，去重并保持原顺序；已缓存的ID记为最近使用"""
+        seen = set()
+        result = []
+        with self._lock:
+            for key in keys:
+                if key in seen:
+                    continue
+                seen.add(key)
+                if key in self._details:
+                    self._details.move_to_end(key)
+                else:
+                    result.append(key)
+        return result
+
+    def update(self, details: Dict[Hashable, Tuple[Any, ...]]):
+        """记录 {歌曲ID: 详情元组}，只有新增或变化的条目才标记为需要保存"""
+        with self._lock:
+            for key, detail in details.items():
+                if self._details.get(key) != detail:
+                    self._details[key] = detail
+                    self._dirty = True
+                self._details.move_to_end(key)
+            self._evict()
+
+    def save(self):
+        """把缓存写回磁盘"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {str(key): list(detail) for key, detail in self._details.items()}
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(self.path + '.tmp', self.path)
+            self._dirty = False
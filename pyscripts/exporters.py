@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from chart_cadence import period_date_of
+from chart_diff import song_key
+from history_store import DEFAULT_DB_PATH, HistoryStore
+from song_identity import CANONICAL_ID_FIELD
+from song_record import BITRATE_FIELD, SONG_ID_FIELD
+
+# 各平台CSV的列和输出目录，与原有脚本保持一致
+CSV_HEADERS = {
+    'qq': ['排名', '歌曲名', '歌手', '专辑'],
+    'kugou': ['排名', '歌曲名', '歌手', '专辑', 'Hash', '时长'],
+    'netease': ['排名', '歌曲名', '歌手', '专辑'],
+}
+CSV_DIRS = {
+    'qq': 'qqmusic_toplists',
+    'kugou': 'kugou_toplists',
+    'netease': 'netease_toplists',
+}
+
+# 原有CSV中没有歌曲ID列的平台，CsvExporter(song_ids=True) 时在末尾追加该列
+OPTIONAL_ID_HEADERS = {
+    'qq': SONG_ID_FIELD,
+    'netease': SONG_ID_FIELD,
+}
+
+DEFAULT_DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets', 'toplists')
+
+
+def write_songs_csv(filename, songs, headers):
+    """
+    将歌曲列表写入CSV文件（utf-8-sig 编码，Excel 可直接打开）。
+
+    Args:
+        filename: 输出文件路径
+        songs: 歌曲字典列表
+        headers: CSV列名，多余的字段会被忽略
+    """
+    with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=headers, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(songs)
+
+
+def is_unchanged(result, filename):
+    """榜单内容与上次抓取相同且CSV已存在时，无需重写文件"""
+    return bool(result.get('unchanged')) and os.path.exists(filename)
+
+
+class Exporter:
+    """榜单导出器基类，子类实现 export 把一次抓取结果写到目标存储"""
+
+    name = 'base'
+
+    def export(self, platform: str, chart_id: Any, chart_name: str, result: Dict[str, Any],
+               period: Optional[str] = None) -> Optional[str]:
+        """
+        导出一个榜单
+
+        Args:
+            platform: 'qq' / 'kugou' / 'netease'
+            chart_id: 榜单ID
+            chart_name: 榜单名称（用于文件名）
+            result: 客户端返回的 {'title', 'songs', ...} 字典
+            period: 榜单周期，默认当天日期
+
+        Returns:
+            写入的路径，跳过时返回None
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CsvExporter(Exporter):
+    """按平台目录写 utf-8-sig CSV，每个榜单一个文件（原有行为）"""
+
+    name = 'csv'
+
+    def __init__(self, output_root: str, song_ids: bool = False):
+        """
+        Args:
+            output_root: 输出根目录，各平台写到其下的 CSV_DIRS 目录
+            song_ids: 是否为QQ音乐和网易云追加歌曲ID列（会改变原有CSV的列，默认关闭）
+        """
+        self.output_root = output_root
+        self.song_ids = song_ids
+
+    def export(self, platform, chart_id, chart_name, result, period=None):
+        output_dir = os.path.join(self.output_root, CSV_DIRS[platform])
+        os.makedirs(output_dir, exist_ok=True)
+        filename = os.path.join(output_dir, f"{chart_name}.csv")
+        if is_unchanged(result, filename):
+            return None
+        headers = CSV_HEADERS[platform]
+        if self.song_ids and platform in OPTIONAL_ID_HEADERS:
+            headers = headers + [OPTIONAL_ID_HEADERS[platform]]
+        if result['songs'] and BITRATE_FIELD in result['songs'][0]:
+            headers = headers + [BITRATE_FIELD]
+        if result['songs'] and CANONICAL_ID_FIELD in result['songs'][0]:
+            headers = headers + [CANONICAL_ID_FIELD]
+        write_songs_csv(filename, result['songs'], headers)
+        return filename
+
+
+class ParquetExporter(Exporter):
+    """
+    按日期分区写 Parquet 数据集（需要 pyarrow）
+
+    目录结构: <root>/date=<周期日期>/platform=<平台>/<榜单ID>.parquet。周期日期为按榜单节奏换算的
+    'YYYY-MM-DD'（见 chart_cadence.period_date_of，QQ音乐周榜的 'YYYY_WW' 换算为发布日），
+    原始周期标签保存在 period 列。同一榜单同一周期只保留最后一次抓取。排名为整数列，歌曲名/歌手/专辑使用字典编码，
+    用 pyarrow.dataset 以 hive 分区方式打开即可一次扫描查询某首歌在各平台的排名历史。
+    """
+
+    name = 'parquet'
+
+    def __init__(self, root: str = DEFAULT_DATASET_DIR, compression: str = 'zstd'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("ParquetExporter 需要 pyarrow，请先安装: pip install pyarrow") from e
+        self._pa = pa
+        self._pq = pq
+        self.root = root
+        self.compression = compression
+        self.schema = pa.schema([
+            ('chart_id', pa.string()),
+            ('period', pa.string()),
+            ('chart_title', pa.dictionary(pa.int32(), pa.string())),
+            ('fetched_at', pa.timestamp('s')),
+            ('rank', pa.int32()),
+            ('song_id', pa.string()),
+            ('title', pa.dictionary(pa.int32(), pa.string())),
+            ('artist', pa.dictionary(pa.int32(), pa.string())),
+            ('album', pa.dictionary(pa.int32(), pa.string())),
+            ('canonical_id', pa.string()),
+        ])
+
+    def _build_table(self, platform: str, chart_id: Any, result: Dict[str, Any], period: str):
+        pa = self._pa
+        songs = result['songs']
+        now = datetime.now().replace(microsecond=0)
+        columns = {
+            'chart_id': pa.array([str(chart_id)] * len(songs), pa.string()),
+            'period': pa.array([period] * len(songs), pa.string()),
+            'chart_title': pa.array([result.get('title') or ''] * len(songs)).dictionary_encode(),
+            'fetched_at': pa.array([now] * len(songs), pa.timestamp('s')),
+            'rank': pa.array([int(song.get('排名') or 0) for song in songs], pa.int32()),
+            'song_id': pa.array([song_key(song, platform) for song in songs], pa.string()),
+            'title': pa.array([song.get('歌曲名') or '' for song in songs], pa.string()).dictionary_encode(),
+            'artist': pa.array([song.get('歌手') or '' for song in songs], pa.string()).dictionary_encode(),
+            'album': pa.array([song.get('专辑') or '' for song in songs], pa.string()).dictionary_encode(),
+            'canonical_id': pa.array([song.get(CANONICAL_ID_FIELD) for song in songs], pa.string()),
+        }
+        return pa.Table.from_pydict(columns).cast(self.schema)
+
+    def export(self, platform, chart_id, chart_name, result, period=None):
+        period = period or datetime.now().strftime('%Y-%m-%d')
+        partition_dir = os.path.join(self.root, f"date={period_date_of(platform, chart_id, period)}",
+                                     f"platform={platform}")
+        path = os.path.join(partition_dir, f"{chart_id}.parquet")
+        if result.get('unchanged') and os.path.exists(path):
+            return None
+        os.makedirs(partition_dir, exist_ok=True)
+        table = self._build_table(platform, chart_id, result, period)
+        self._pq.write_table(table, path + '.tmp', compression=self.compression, use_dictionary=True)
+        os.replace(path + '.tmp', path)
+        return path
+
+
+class HistoryExporter(Exporter):
+    """把每期榜单写入 SQLite 历史库 (HistoryStore)，不覆盖以前的周期"""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.store = HistoryStore(path)
+
+    def export(self, platform, chart_id, chart_name, result, period=None):
+        period = period or datetime.now().strftime('%Y-%m-%d')
+        if result.get('unchanged') and self.store.has_snapshot(platform, chart_id, period):
+            return None
+        self.store.save(platform, chart_id, chart_name, result['songs'], period)
+        return f"{self.store.path} ({platform}/{chart_id}/{period})"
+
+    def close(self):
+        self.store.close()
+
+
+def rank_history(song_ids: List[str], root: str = DEFAULT_DATASET_DIR, field: str = 'song_id'):
+    """
+    查询若干首歌在所有平台、所有日期的排名历史（需要 pyarrow）
+
+    Args:
+        song_ids: 歌曲ID列表（QQ 的 mid、酷狗 Hash、网易云 track id，或标准ID）
+        root: ParquetExporter 写入的数据集根目录
+        field: 按哪一列匹配，'song_id' 或 'canonical_id'（跨平台标准ID）
+
+    Returns:
+        按 周期日期/平台/榜单 排序的 pyarrow.Table（date 为可排序的周期日期，period 为原始周期标签）
+    """
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(root, format='parquet', partitioning='hive')
+    table = dataset.to_table(
+        columns=['date', 'period', 'platform', 'chart_id', 'rank', 'song_id', 'canonical_id', 'title', 'artist'],
+        filter=pc.field(field).isin([str(song_id) for song_id in song_ids]),
+    )
+    return table.sort_by([('date', 'ascending'), ('platform', 'ascending'), ('chart_id', 'ascending')])
+
+
+def create_exporters(names: List[str], output_root: str, song_ids: bool = False) -> List[Exporter]:
+    """
+    根据名称创建导出器列表
+
+    Args:
+        names: 例如 ['csv', 'parquet', 'sqlite']
+        output_root: CSV 输出根目录
+        song_ids: CSV 是否追加歌曲ID列（见 CsvExporter）
+    """
+    exporters: List[Exporter] = []
+    for name in names:
+        if name == 'csv':
+            exporters.append(CsvExporter(output_root, song_ids=song_ids))
+        elif name == 'parquet':
+            exporters.append(ParquetExporter())
+        elif name == 'sqlite':
+            exporters.append(HistoryExporter())
+        else:
+            raise ValueError(f"未知的导出格式: {name}")
+    return exporters
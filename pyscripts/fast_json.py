@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+响应JSON的快速解码
+
+三个平台最热的解析路径按类型化的响应结构直接从字节解码：
+  - QQ音乐 musicu.fcg 中的 ToplistInfoServer.GetDetail 模块 (decode_qq_detail)
+  - 网易云 weapi 歌单详情 (decode_netease_playlist)
+  - 酷狗排行榜页面 global.features 数组中的一项 (decode_kugou_feature)
+
+安装了 msgspec 时按下面的 Struct 定义解码：只为解析用到的字段分配对象，其余字段
+（QQ每首歌的 file/pay/action、网易云的 privileges、酷狗的 trans_param 等）在解码时直接跳过，
+不再先构造完整的字典树再逐层 .get()。没有 msgspec 时退回 orjson，再没有则使用标准库 json，
+得到普通字典，各平台的解析函数按 isinstance(..., dict) 走原来的字典路径。
+响应与结构定义不符（接口改版导致字段类型变化）时同样自动退回字典解码，并计入
+fetch_decode_fallback_total。QQ音乐的批量响应逐个模块解码，只有不符的模块退回字典。
+
+dumps 用于编码请求体：输出紧凑、不转义非ASCII字符的JSON，无论是否安装 orjson 结果都相同，
+HTTP缓存键不会因运行环境而变化。
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from telemetry import get_telemetry
+
+try:
+    import msgspec
+except ImportError:  # 可选依赖
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+# 当前使用的解码后端，写入基准结果便于对比
+BACKEND = 'msgspec' if msgspec is not None else 'orjson' if orjson is not None else 'json'
+
+
+def loads(content: Union[bytes, str]) -> Any:
+    """
+    通用JSON解码，解码为普通字典
+
+    Raises:
+        json.JSONDecodeError: 内容不是合法JSON（orjson 的异常是它的子类）
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def dumps(obj: Any) -> str:
+    """编码为紧凑的JSON文本，非ASCII字符不转义"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+if msgspec is not None:
+    # --- QQ音乐 musicu.fcg: ToplistInfoServer.GetDetail ---
+    # 识别结构所用的字段（songInfoList 及每首歌的 name/mid/singer/album）是必需的：
+    # 解码成功即说明是 data.songInfoList 结构（qqmusic_optimized.TYPED_DETAIL_FINGERPRINT）。
+    # 缺少这些字段或改为 data.song 等结构时该模块退回字典，由 detail_fingerprint 识别。
+    # 列表可以为空（分页越过了榜单末尾）；单曲没有专辑时专辑名和 mid 可能缺失
+
+    class QQSinger(msgspec.Struct):
+        name: str
+
+    class QQAlbum(msgspec.Struct):
+        name: str = ''
+        mid: str = ''
+
+    class QQSong(msgspec.Struct):
+        name: str
+        mid: str
+        singer: List[QQSinger]
+        album: QQAlbum
+
+    class QQDetailData(msgspec.Struct):
+        songInfoList: List[QQSong]
+        title: str = '未知排行榜'
+
+    class QQDetailModule(msgspec.Struct):
+        code: int = 0
+        # 返回错误码的模块没有 data
+        data: Optional[QQDetailData] = None
+
+    # 顶层除各 detail 模块外还有 code/ts/traceid 等标量，各模块分别解码
+    QQDetailResponse = Dict[str, msgspec.Raw]
+
+    # --- 网易云 weapi 歌单详情 ---
+
+    class NeteaseArtist(msgspec.Struct):
+        name: Optional[str] = None
+
+    class NeteaseAlbum(msgspec.Struct):
+        id: Optional[int] = None
+        name: Optional[str] = None
+
+    class NeteaseTrack(msgspec.Struct):
+        id: Optional[int] = None
+        name: Optional[str] = None
+        ar: List[NeteaseArtist] = []
+        al: NeteaseAlbum = msgspec.field(default_factory=NeteaseAlbum)
+
+    class NeteaseTrackId(msgspec.Struct):
+        id: int
+
+    class NeteasePlaylist(msgspec.Struct):
+        name: str = ''
+        tracks: List[NeteaseTrack] = []
+        trackIds: List[NeteaseTrackId] = []
+
+    class NeteasePlaylistResponse(msgspec.Struct):
+        playlist: NeteasePlaylist = msgspec.field(default_factory=NeteasePlaylist)
+
+    # --- 酷狗 global.features 数组元素 ---
+
+    class KugouFeature(msgspec.Struct):
+        Hash: str = ''
+        FileName: str = ' - '
+        timeLen: int = 0
+        album_name: str = '未知专辑'
+        album_id: Union[str, int, None] = None
+
+
+def _typed_decoder(schema: str, type_: Any) -> Callable[[Union[bytes, str]], Any]:
+    """按 type_ 解码的函数，schema 为退回计数使用的名称"""
+    decoder = msgspec.json.Decoder(type_)
+
+    def decode(content: Union[bytes, str]) -> Any:
+        try:
+            return decoder.decode(content)
+        except msgspec.ValidationError:
+            # 合法JSON但结构变了：按字典解码，交给原来的解析路径
+            get_telemetry().count('fetch_decode_fallback_total', schema=schema)
+            return loads(content)
+        except msgspec.DecodeError:
+            # 不是合法JSON：由 loads 抛出与标准库一致的 json.JSONDecodeError
+            return loads(content)
+
+    decode.__name__ = f"decode_{schema}"
+    return decode
+
+
+def _qq_detail_decoder() -> Callable[[Union[bytes, str]], Any]:
+    """
+    musicu.fcg 批量响应的解码函数：顶层解码为字典，其中的对象逐个按 QQDetailModule 解码，
+    与结构定义不符的模块单独退回字典（计入 fetch_decode_fallback_total），不影响同批的其他模块
+    """
+    decode_top = _typed_decoder('qq_detail', QQDetailResponse)
+    decode_module = msgspec.json.Decoder(QQDetailModule).decode
+
+    def decode_qq_detail(content: Union[bytes, str]) -> Any:
+        top = decode_top(content)
+        result = {}
+        for key, value in top.items():
+            if not isinstance(value, msgspec.Raw):
+                # 顶层不是对象，已整体退回字典
+                return top
+            raw = bytes(value)
+            if not raw.startswith(b'{'):
+                result[key] = msgspec.json.decode(raw)
+                continue
+            try:
+                result[key] = decode_module(raw)
+            except msgspec.ValidationError:
+                get_telemetry().count('fetch_decode_fallback_total', schema='qq_detail')
+                result[key] = loads(raw)
+        return result
+
+    return decode_qq_detail
+
+
+# 返回值为结构对象，或退回时的普通字典
+if msgspec is not None:
+    decode_qq_detail = _qq_detail_decoder()
+    decode_netease_playlist = _typed_decoder('netease_playlist', NeteasePlaylistResponse)
+    decode_kugou_feature = _typed_decoder('kugou_feature', KugouFeature)
+else:
+    decode_qq_detail = decode_netease_playlist = decode_kugou_feature = loads
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from chart_cadence import period_date_of
+from chart_diff import SONG_KEY_FIELDS, song_key
+from song_record import CANONICAL_ID_FIELD, SongRecord
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_history.db')
+
+# 各平台拼接多个歌手时使用的分隔符
+_ARTIST_SPLIT_RE = re.compile(r'\s*(?:&|/|、)\s*')
+# SQLite 单条语句允许的参数个数有限，IN (...) 查询按该大小分块
+_IN_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS charts (
+    id INTEGER PRIMARY KEY,
+    platform TEXT NOT NULL,
+    platform_chart_id TEXT NOT NULL,
+    name TEXT,
+    UNIQUE (platform, platform_chart_id)
+);
+CREATE TABLE IF NOT EXISTS artists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER PRIMARY KEY,
+    platform TEXT NOT NULL,
+    platform_song_id TEXT NOT NULL,
+    title TEXT,
+    artist_display TEXT,
+    album TEXT,
+    duration INTEGER,
+    canonical_id TEXT,
+    UNIQUE (platform, platform_song_id)
+);
+CREATE TABLE IF NOT EXISTS song_artists (
+    song_id INTEGER NOT NULL REFERENCES songs (id),
+    artist_id INTEGER NOT NULL REFERENCES artists (id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (song_id, artist_id)
+) WITHOUT ROWID;
+-- period 为平台的周期标签（'YYYY-MM-DD' 或QQ音乐周榜的 'YYYY_WW'），period_date 为可排序的日期
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    chart_id INTEGER NOT NULL REFERENCES charts (id),
+    period TEXT NOT NULL,
+    period_date TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    song_count INTEGER NOT NULL,
+    UNIQUE (chart_id, period)
+);
+-- 某期榜单（chart at date）：按主键 (snapshot_id, rank) 顺序读取即可
+CREATE TABLE IF NOT EXISTS entries (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+    rank INTEGER NOT NULL,
+    song_id INTEGER NOT NULL REFERENCES songs (id),
+    PRIMARY KEY (snapshot_id, rank)
+) WITHOUT ROWID;
+-- 歌曲排名轨迹（song rank trajectory）：覆盖索引，不需要回表
+CREATE INDEX IF NOT EXISTS idx_entries_song ON entries (song_id, snapshot_id, rank);
+-- 每首歌在每个榜单上的首次/最近出现周期和最高排名，用于查询新进榜歌曲；先后按 *_date 比较
+CREATE TABLE IF NOT EXISTS chart_songs (
+    chart_id INTEGER NOT NULL REFERENCES charts (id),
+    song_id INTEGER NOT NULL REFERENCES songs (id),
+    first_period TEXT NOT NULL,
+    first_date TEXT NOT NULL,
+    last_period TEXT NOT NULL,
+    last_date TEXT NOT NULL,
+    best_rank INTEGER NOT NULL,
+    PRIMARY KEY (chart_id, song_id)
+) WITHOUT ROWID;
+-- 本周新进榜（new entries this week）：覆盖索引
+CREATE INDEX IF NOT EXISTS idx_chart_songs_first ON chart_songs (chart_id, first_date, song_id, best_rank, first_period);
+"""
+
+# chart_songs 的合并规则：周期标签不能按字符串比较先后，首次/最近出现的周期按可排序日期选取
+# （SET 右侧引用的都是更新前的值）
+CHART_SONGS_UPSERT = (
+    "ON CONFLICT (chart_id, song_id) DO UPDATE SET "
+    "first_period = CASE WHEN excluded.first_date < first_date THEN excluded.first_period ELSE first_period END, "
+    "first_date = MIN(first_date, excluded.first_date), "
+    "last_period = CASE WHEN excluded.last_date >= last_date THEN excluded.last_period ELSE last_period END, "
+    "last_date = MAX(last_date, excluded.last_date), "
+    "best_rank = MIN(best_rank, excluded.best_rank)"
+)
+
+
+def split_artists(artists: Optional[str]) -> List[str]:
+    """把平台拼接好的歌手字符串拆成歌手名列表（保持顺序、去重）"""
+    names = (name.strip() for name in _ARTIST_SPLIT_RE.split(artists or ''))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def _chunks(items: Sequence[Any], size: int = _IN_CHUNK) -> Iterable[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class HistoryStore:
+    """
+    SQLite 榜单历史库（WAL 模式）
+
+    歌曲、歌手、榜单、快照分表保存，每次抓取在一个事务内批量写入：
+    - song_trajectory: 某首歌在各榜单、各周期的排名
+    - chart_at: 某个榜单在某个周期的完整歌曲列表
+    - new_entries: 某个榜单在某个日期之后首次上榜的歌曲
+    三类查询都有对应的覆盖索引，不需要扫描历史文件。
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        """
+        Args:
+            path: 数据库文件路径，':memory:' 表示只在内存中使用
+        """
+        self.path = path
+        # 导出器在线程池中调用，连接允许跨线程使用，由锁保证串行
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA temp_store=MEMORY')
+        self._conn.executescript(SCHEMA)
+        # 进程内的ID缓存，重复出现的歌曲和歌手不必再查询
+        self._song_ids: Dict[Tuple[str, str], int] = {}
+        self._artist_ids: Dict[str, int] = {}
+
+    # --- 写入 ---
+
+    def _chart_row_id(self, platform: str, chart_id: Any, chart_name: Optional[str]) -> int:
+        row = self._conn.execute(
+            "INSERT INTO charts (platform, platform_chart_id, name) VALUES (?, ?, ?) "
+            "ON CONFLICT (platform, platform_chart_id) DO UPDATE SET name = COALESCE(excluded.name, name) "
+            "RETURNING id",
+            (platform, str(chart_id), chart_name)).fetchone()
+        return row[0]
+
+    def _artist_row_ids(self, names: Iterable[str]) -> Dict[str, int]:
+        missing = [name for name in dict.fromkeys(names) if name not in self._artist_ids]
+        if missing:
+            self._conn.executemany("INSERT OR IGNORE INTO artists (name) VALUES (?)", ((name,) for name in missing))
+            for chunk in _chunks(missing):
+                placeholders = ','.join('?' * len(chunk))
+                for row_id, name in self._conn.execute(
+                        f"SELECT id, name FROM artists WHERE name IN ({placeholders})", chunk):
+                    self._artist_ids[name] = row_id
+        return self._artist_ids
+
+    def _song_row_ids(self, platform: str, songs: Sequence[Any]) -> List[int]:
+        rows = []
+        for song in songs:
+            rows.append((platform, song_key(song, platform), song.get('歌曲名'), song.get('歌手'),
+                         song.get('专辑'), song.get('时长'), song.get(CANONICAL_ID_FIELD)))
+        self._conn.executemany(
+            "INSERT INTO songs (platform, platform_song_id, title, artist_display, album, duration, canonical_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (platform, platform_song_id) DO UPDATE SET "
+            "title = excluded.title, artist_display = excluded.artist_display, album = excluded.album, "
+            "duration = COALESCE(excluded.duration, duration), "
+            "canonical_id = COALESCE(excluded.canonical_id, canonical_id)",
+            rows)
+
+        keys = [row[1] for row in rows]
+        new_keys = [key for key in dict.fromkeys(keys) if (platform, key) not in self._song_ids]
+        for chunk in _chunks(new_keys):
+            placeholders = ','.join('?' * len(chunk))
+            for row_id, key in self._conn.execute(
+                    f"SELECT id, platform_song_id FROM songs WHERE platform = ? AND platform_song_id IN ({placeholders})",
+                    [platform, *chunk]):
+                self._song_ids[(platform, key)] = row_id
+
+        if new_keys:
+            # 只有第一次见到的歌曲需要写歌手关联
+            new_set = set(new_keys)
+            links = [(key, split_artists(row[3])) for key, row in zip(keys, rows) if key in new_set]
+            artist_ids = self._artist_row_ids(name for _, names in links for name in names)
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO song_artists (song_id, artist_id, position) VALUES (?, ?, ?)",
+                [(self._song_ids[(platform, key)], artist_ids[name], position)
+                 for key, names in links for position, name in enumerate(names)])
+
+        return [self._song_ids[(platform, key)] for key in keys]
+
+    def save(self, platform: str, chart_id: Any, chart_name: Optional[str], songs: Sequence[Any],
+             period: Optional[str] = None) -> int:
+        """
+        在一个事务内写入一期榜单，同一榜单同一周期重复写入时覆盖
+
+        Args:
+            platform: 'qq' / 'kugou' / 'netease'
+            chart_id: 平台的榜单ID
+            chart_name: 榜单名称
+            songs: 歌曲列表（SongRecord 或原来的歌曲字典）
+            period: 榜单周期，默认当天日期
+
+        Returns:
+            快照ID
+        """
+        period = period or datetime.now().strftime('%Y-%m-%d')
+        fetched_at = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        with self._lock:
+            try:
+                with self._conn:
+                    return self._save(platform, chart_id, chart_name, songs, period, fetched_at)
+            except sqlite3.Error:
+                # 事务回滚后缓存中可能有不存在的ID
+                self._song_ids.clear()
+                self._artist_ids.clear()
+                raise
+
+    def _save(self, platform: str, chart_id: Any, chart_name: Optional[str], songs: Sequence[Any],
+              period: str, fetched_at: str) -> int:
+        chart_row_id = self._chart_row_id(platform, chart_id, chart_name)
+        date = period_date_of(platform, chart_id, period)
+        snapshot_id = self._conn.execute(
+            "INSERT INTO snapshots (chart_id, period, period_date, fetched_at, song_count) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (chart_id, period) DO UPDATE SET period_date = excluded.period_date, "
+            "fetched_at = excluded.fetched_at, song_count = excluded.song_count RETURNING id",
+            (chart_row_id, period, date, fetched_at, len(songs))).fetchone()[0]
+        self._conn.execute("DELETE FROM entries WHERE snapshot_id = ?", (snapshot_id,))
+
+        song_ids = self._song_row_ids(platform, songs)
+        entries = list(dict(((song.get('排名'), song_id) for song, song_id in zip(songs, song_ids))).items())
+        self._conn.executemany("INSERT INTO entries (snapshot_id, rank, song_id) VALUES (?, ?, ?)",
+                               [(snapshot_id, rank, song_id) for rank, song_id in entries])
+        self._conn.executemany(
+            "INSERT INTO chart_songs (chart_id, song_id, first_period, first_date, last_period, last_date, best_rank) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) " + CHART_SONGS_UPSERT,
+            [(chart_row_id, song_id, period, date, period, date, rank) for rank, song_id in entries])
+        return snapshot_id
+
+    def has_snapshot(self, platform: str, chart_id: Any, period: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM snapshots JOIN charts ON charts.id = snapshots.chart_id "
+                "WHERE charts.platform = ? AND charts.platform_chart_id = ? AND snapshots.period = ?",
+                (platform, str(chart_id), period)).fetchone()
+        return row is not None
+
+    # --- 查询 ---
+
+    def song_trajectory(self, platform: str, song_id: Any,
+                        chart_id: Optional[Any] = None) -> List[Dict[str, Any]]:
+        """
+        某首歌的排名轨迹
+
+        Args:
+            platform: 平台
+            song_id: 平台内的歌曲ID（QQ 的 mid、酷狗 Hash、网易云 track id）
+            chart_id: 只看某个榜单，默认所有榜单
+
+        Returns:
+            [{'period', 'chart_id', 'chart_name', 'rank'}]，按周期升序
+        """
+        sql = ("SELECT snapshots.period, charts.platform_chart_id, charts.name, entries.rank "
+               "FROM songs "
+               "JOIN entries ON entries.song_id = songs.id "
+               "JOIN snapshots ON snapshots.id = entries.snapshot_id "
+               "JOIN charts ON charts.id = snapshots.chart_id "
+               "WHERE songs.platform = ? AND songs.platform_song_id = ?")
+        params: List[Any] = [platform, str(song_id)]
+        if chart_id is not None:
+            sql += " AND charts.platform_chart_id = ?"
+            params.append(str(chart_id))
+        sql += " ORDER BY snapshots.period_date, charts.platform_chart_id"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{'period': period, 'chart_id': chart, 'chart_name': name, 'rank': rank}
+                for period, chart, name, rank in rows]
+
+    def chart_at(self, platform: str, chart_id: Any, period: str) -> Optional[List[SongRecord]]:
+        """某个榜单在某一期的歌曲列表，没有该期快照时返回None"""
+        id_field = SONG_KEY_FIELDS.get(platform, '歌曲ID')
+        with self._lock:
+            snapshot = self._conn.execute(
+                "SELECT snapshots.id FROM snapshots JOIN charts ON charts.id = snapshots.chart_id "
+                "WHERE charts.platform = ? AND charts.platform_chart_id = ? AND snapshots.period = ?",
+                (platform, str(chart_id), period)).fetchone()
+            if snapshot is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT entries.rank, songs.title, songs.artist_display, songs.album, songs.platform_song_id, "
+                "songs.duration, songs.canonical_id "
+                "FROM entries JOIN songs ON songs.id = entries.song_id "
+                "WHERE entries.snapshot_id = ? ORDER BY entries.rank",
+                (snapshot[0],)).fetchall()
+        return [SongRecord(rank, title, artist, album, song_id, duration, canonical_id, id_field)
+                for rank, title, artist, album, song_id, duration, canonical_id in rows]
+
+    def new_entries(self, platform: str, chart_id: Any, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        某个榜单自 since（含）以来首次上榜的歌曲
+
+        榜单第一次入库的那一期，所有歌曲都算作首次上榜。
+
+        Args:
+            since: 起始日期 'YYYY-MM-DD'，也可以是该榜单的周期标签（如QQ音乐周榜的 'YYYY_WW'），
+                默认7天前（即本周新进榜）
+
+        Returns:
+            [{'song_id', 'title', 'artist', 'first_period', 'best_rank'}]，按首次上榜周期、最高排名排序
+        """
+        if since:
+            since = period_date_of(platform, chart_id, since)
+        else:
+            since = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT songs.platform_song_id, songs.title, songs.artist_display, "
+                "chart_songs.first_period, chart_songs.best_rank "
+                "FROM charts "
+                "JOIN chart_songs ON chart_songs.chart_id = charts.id AND chart_songs.first_date >= ? "
+                "JOIN songs ON songs.id = chart_songs.song_id "
+                "WHERE charts.platform = ? AND charts.platform_chart_id = ? "
+                "ORDER BY chart_songs.first_date, chart_songs.best_rank",
+                (since, platform, str(chart_id))).fetchall()
+        return [{'song_id': song_id, 'title': title, 'artist': artist, 'first_period': first, 'best_rank': best}
+                for song_id, title, artist, first, best in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
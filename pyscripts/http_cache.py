@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+import requests
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.http_cache')
+
+
+class CachedResponse:
+    """缓存层返回的响应，附带内容是否变化的标记"""
+
+    def __init__(self, key: str, content: bytes, digest: str, encoding: Optional[str],
+                 changed: bool, from_cache: bool):
+        self.key = key
+        self.content = content
+        self.digest = digest
+        self.encoding = encoding
+        # 与上一次缓存的内容相比是否发生变化（首次请求视为变化）
+        self.changed = changed
+        # 是否完全没有访问网络（TTL 内直接命中）
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class HttpCache:
+    """
+    三个平台客户端共用的磁盘HTTP响应缓存
+
+    - TTL 内直接返回磁盘上的内容，不访问网络
+    - TTL 过期后带 If-None-Match / If-Modified-Since 发送条件请求，
+      304 或内容哈希不变时标记为未变化，调用方可跳过解析和写CSV
+    - 缓存总大小超过 max_bytes 时按最近最少使用淘汰
+    """
+
+    INDEX_FILE = 'index.json'
+    MEMO_SIZE = 64
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = 300,
+                 max_bytes: int = 50 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: 缓存目录
+            ttl: 缓存新鲜期（秒），期内不发起网络请求
+            max_bytes: 缓存内容总大小上限（字节）
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memo: OrderedDict = OrderedDict()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    # --- 索引与文件 ---
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, self.INDEX_FILE)
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self):
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path())
+
+    def _read_body(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._body_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _evict(self):
+        total = sum(entry['size'] for entry in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['last_access']):
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+            del self._index[key]
+            total -= entry['size']
+            if total <= self.max_bytes:
+                break
+
+    # --- 对外接口 ---
+
+    @staticmethod
+    def make_key(method: str, url: str, params: Optional[Dict] = None, key_data: Any = None,
+                 ignore_params: Iterable[str] = ()) -> str:
+        """
+        根据请求生成缓存键
+
+        Args:
+            method: HTTP方法
+            url: 请求URL
+            params: 查询参数
+            key_data: 额外参与计算的数据（如加密前的POST业务数据）
+            ignore_params: 不参与计算的查询参数（如防缓存的时间戳 `_`）
+        """
+        ignored = set(ignore_params)
+        material = {
+            'method': method.upper(),
+            'url': url,
+            'params': {k: v for k, v in (params or {}).items() if k not in ignored},
+            'data': key_data,
+        }
+        encoded = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+    def fetch(self, session: requests.Session, method: str, url: str, *,
+              params: Optional[Dict] = None, data: Any = None, key_data: Any = None,
+              ignore_params: Iterable[str] = (), timeout: Optional[float] = None,
+              headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        """
+        通过缓存发送请求，网络错误与HTTP错误照常抛出 requests 异常
+
+        Args:
+            session: 发送请求使用的会话
+            method: 'GET' 或 'POST'
+            url: 请求URL
+            params: 查询参数
+            data: 请求体
+            key_data: 参与缓存键计算的数据，默认使用 data
+            ignore_params: 不参与缓存键计算的查询参数
+            timeout: 请求超时时间（秒）
+            headers: 额外的请求头，会与条件请求头合并
+        """
+        key = self.make_key(method, url, params, data if key_data is None else key_data, ignore_params)
+        entry, cached_body, fresh = self._lookup(key)
+        if fresh is not None:
+            return fresh
+        response = session.request(method, url, params=params, data=data,
+                                   headers=self._conditional_headers(entry, headers), timeout=timeout)
+        revalidated = self._revalidated(key, response, entry, cached_body)
+        if revalidated is not None:
+            return revalidated
+        response.raise_for_status()
+        return self._store(key, url, response, response.content, entry)
+
+    def stream(self, session: requests.Session, url: str, *, timeout: Optional[float] = None,
+               headers: Optional[Dict[str, str]] = None) -> 'CachedStream':
+        """
+        通过缓存发送流式 GET 请求：返回的 CachedStream 边下载边产出数据块，同时把读到的内容写入缓存，
+        调用方（例如酷狗的页面流式解析）读到所需部分即可停止，不必先下载完整页面
+
+        请求在开始迭代 CachedStream.iter_content 时才发出，网络错误与HTTP错误在迭代时抛出。
+        提前停止时只缓存已读到的部分，这样的条目只供 stream 使用，fetch 会重新下载完整内容
+        """
+        return CachedStream(self, session, url, self.make_key('GET', url), timeout, headers)
+
+    def _lookup(self, key: str, partial: bool = False):
+        """返回 (索引条目, 缓存内容, TTL 内直接命中的响应)；partial 为 False 时不使用只缓存了部分内容的条目"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry and entry.get('partial') and not partial:
+                entry = None
+            cached_body = self._read_body(key) if entry else None
+            if entry and cached_body is None:
+                del self._index[key]
+                entry = None
+            now = time.time()
+            if entry and now - entry['stored_at'] < self.ttl:
+                entry['last_access'] = now
+                return entry, cached_body, CachedResponse(key, cached_body, entry['digest'], entry.get('encoding'),
+                                                          changed=False, from_cache=True)
+        return entry, cached_body, None
+
+    @staticmethod
+    def _conditional_headers(entry: Optional[Dict[str, Any]], headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        headers = dict(headers or {})
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def _revalidated(self, key: str, response: requests.Response, entry: Optional[Dict[str, Any]],
+                     cached_body: Optional[bytes]) -> Optional[CachedResponse]:
+        """304 时刷新条目并返回缓存内容，否则返回None"""
+        if response.status_code != 304 or not entry:
+            return None
+        with self._lock:
+            now = time.time()
+            entry['stored_at'] = now
+            entry['last_access'] = now
+            self._save_index()
+        return CachedResponse(key, cached_body, entry['digest'], entry.get('encoding'),
+                              changed=False, from_cache=False)
+
+    def _store(self, key: str, url: str, response: requests.Response, content: bytes,
+               entry: Optional[Dict[str, Any]], partial: bool = False) -> CachedResponse:
+        """写入新下载的内容，返回标记了是否变化的响应"""
+        digest = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            now = time.time()
+            changed = not entry or entry['digest'] != digest
+            if changed:
+                with open(self._body_path(key), 'wb') as f:
+                    f.write(content)
+            self._index[key] = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'digest': digest,
+                'encoding': response.encoding,
+                'size': len(content),
+                'stored_at': now,
+                'last_access': now,
+            }
+            if partial:
+                self._index[key]['partial'] = True
+            self._evict()
+            self._save_index()
+        return CachedResponse(key, content, digest, response.encoding, changed=changed, from_cache=False)
+
+    def memoize(self, response: CachedResponse, tag: Any, parse: Callable[[], Any]) -> Any:
+        """
+        按 (缓存键, 内容哈希, tag) 记住解析结果，内容未变化时直接复用，跳过重复解析
+
+        Args:
+            response: fetch 返回的响应
+            tag: 区分同一响应的不同解析方式
+            parse: 实际解析函数
+        """
+        memo_key = (response.key, response.digest, tag)
+        with self._lock:
+            if memo_key in self._memo:
+                self._memo.move_to_end(memo_key)
+                return self._memo[memo_key]
+        value = parse()
+        with self._lock:
+            self._memo[memo_key] = value
+            while len(self._memo) > self.MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return value
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            for key in list(self._index):
+                try:
+                    os.remove(self._body_path(key))
+                except OSError:
+                    pass
+            self._index.clear()
+            self._memo.clear()
+            self._save_index()
+
+
+class CachedStream:
+    """
+    HttpCache.stream 返回的流式响应
+
+    iter_content 产出页面数据块：缓存新鲜或服务器返回304时产出缓存的内容，否则边下载边产出，
+    迭代结束（读完或调用方提前关闭迭代器）后把读到的内容写入缓存。changed/from_cache 在迭代结束后有效
+    """
+
+    def __init__(self, cache: HttpCache, session: requests.Session, url: str, key: str,
+                 timeout: Optional[float], headers: Optional[Dict[str, str]]):
+        self.cache = cache
+        self.session = session
+        self.url = url
+        self.key = key
+        self.timeout = timeout
+        self.headers = headers
+        self.changed: Optional[bool] = None
+        self.from_cache = False
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        """
+        Raises:
+            requests.exceptions.RequestException: 网络错误或HTTP错误（出错时不写入缓存）
+        """
+        entry, cached_body, fresh = self.cache._lookup(self.key, partial=True)
+        if fresh is not None:
+            self.changed, self.from_cache = False, True
+            yield cached_body
+            return
+        headers = self.cache._conditional_headers(entry, self.headers)
+        with self.session.get(self.url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if self.cache._revalidated(self.key, response, entry, cached_body) is not None:
+                self.changed = False
+                yield cached_body
+                return
+            response.raise_for_status()
+            parts = []
+            try:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    parts.append(chunk)
+                    yield chunk
+            except GeneratorExit:
+                # 调用方已读到所需部分，缓存读到的内容
+                self.changed = self.cache._store(self.key, self.url, response, b''.join(parts), entry,
+                                                 partial=True).changed
+                raise
+            self.changed = self.cache._store(self.key, self.url, response, b''.join(parts), entry).changed
@@ -1,29 +1,255 @@
+import asyncio
+import contextvars
+import html
+import os
 import requests
 import json
 import re
-from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import fast_json
+from detail_cache import DetailCache
+from http_cache import CachedResponse, CachedStream, HttpCache
+from song_record import HASH_FIELD, SongRecord
+from telemetry import get_telemetry
+from transport import Transport, get_default_transport
+
+DEFAULT_SONG_INFO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kugou_song_info.json')
+
+
+class SongInfoCache(DetailCache):
+    """酷狗歌曲详情缓存：Hash -> (时长秒, 比特率kbps)"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_SONG_INFO_PATH):
+        super().__init__(path)
+
+
+_default_song_info_cache: Optional[SongInfoCache] = None
+
+
+def get_default_song_info_cache() -> SongInfoCache:
+    """获取进程内共享的 SongInfoCache（首次调用时从磁盘加载）"""
+    global _default_song_info_cache
+    if _default_song_info_cache is None:
+        _default_song_info_cache = SongInfoCache()
+    return _default_song_info_cache
+
+
+class FeaturesStreamExtractor:
+    """
+    从分块到达的页面字节流中增量提取 global.features 数组
+
+    先在流中定位 `global.features = [`（顺带提取 <title>），之后按括号配对
+    （跳过字符串内部的括号）逐个切出数组中的对象并解码，数组闭合后 done 置为 True，
+    调用方即可停止下载。任何时候只缓存当前正在解析的那一个对象。
+    元素默认按 fast_json.KugouFeature 解码，只保留用到的字段。
+    """
+
+    MARKER_RE = re.compile(rb'global.features\s*=\s*\[')
+    TITLE_RE = re.compile('<title>(.*?)_排行榜'.encode('utf-8'))
+    TOKEN_RE = re.compile(rb'["\\\[\]{}]')
+    STRING_TOKEN_RE = re.compile(rb'["\\]')
+    # 查找标记/标题时跨块保留的尾部字节数
+    TAIL_SIZE = 512
+
+    def __init__(self, decode: Optional[Callable[[bytes], Any]] = None):
+        """
+        Args:
+            decode: 数组元素字节的解码函数，默认 fast_json.decode_kugou_feature
+        """
+        self.title: Optional[str] = None
+        self.done = False
+        self._decode = decode or fast_json.decode_kugou_feature
+        self._buf = b''
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._element_start = -1
+        self._resume = 0
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        输入一块数据，返回本块内新解析出的数组元素
+
+        Raises:
+            json.JSONDecodeError: 数组元素不是合法JSON
+        """
+        if self.done or not chunk:
+            return []
+        self._buf += chunk
+        if not self._in_array and not self._find_marker():
+            return []
+        return self._scan()
+
+    def _find_marker(self) -> bool:
+        if self.title is None:
+            title_match = self.TITLE_RE.search(self._buf)
+            if title_match:
+                self.title = title_match.group(1).decode('utf-8', errors='replace')
+        match = self.MARKER_RE.search(self._buf)
+        if not match:
+            self._buf = self._buf[-self.TAIL_SIZE:]
+            return False
+        self._buf = self._buf[match.end():]
+        self._in_array = True
+        self._depth = 1
+        return True
+
+    def _scan(self) -> List[Any]:
+        items = []
+        buf = self._buf
+        pos = self._resume
+        while True:
+            token_re = self.STRING_TOKEN_RE if self._in_string else self.TOKEN_RE
+            match = token_re.search(buf, pos)
+            if not match:
+                break
+            char = buf[match.start()]
+            pos = match.end()
+            if self._in_string:
+                if char == 0x5c:  # 反斜杠：跳过被转义的字符
+                    if pos >= len(buf):
+                        # 转义字符落在下一块，回退等待更多数据
+                        pos = match.start()
+                        break
+                    pos += 1
+                else:
+                    self._in_string = False
+            elif char == 0x22:  # "
+                self._in_string = True
+            elif char in (0x7b, 0x5b):  # { [
+                if self._depth == 1:
+                    self._element_start = match.start()
+                self._depth += 1
+            else:  # } ]
+                self._depth -= 1
+                if self._depth == 1 and self._element_start >= 0:
+                    items.append(self._decode(buf[self._element_start:pos]))
+                    self._element_start = -1
+                elif self._depth == 0:
+                    self.done = True
+                    self._buf = b''
+                    return items
+
+        # 只保留当前未完成的元素，下次从已扫描的位置继续
+        if self._element_start >= 0:
+            self._buf = buf[self._element_start:]
+            self._resume = pos - self._element_start
+            self._element_start = 0
+        else:
+            self._buf = buf[pos:]
+            self._resume = 0
+        return items
+
+
+# 排行榜页面侧栏中的榜单链接，兼容单双引号、title 属性和 ?from=rank 等后缀
+RANK_LINK_PATTERN = re.compile(
+    r"""<a\b([^>]*?)href=['"][^'"]*/yy/rank/home/\d+-(\d+)\.html[^'"]*['"]([^>]*)>(.*?)</a>""",
+    re.S)
+TITLE_ATTR_PATTERN = re.compile(r"""title=['"]([^'"]+)['"]""")
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+def parse_rank_list(page: str) -> List[Dict[str, Any]]:
+    """
+    从排行榜页面侧栏解析全部榜单
+
+    Args:
+        page: 排行榜页面HTML（rank.html 或任意一个 rank/home 页面）
+
+    Returns:
+        [{'chart_id', 'name'}, ...]，按页面顺序，同一榜单只保留第一次出现
+    """
+    charts = []
+    seen = set()
+    for before, rank_id, after, inner in RANK_LINK_PATTERN.findall(page):
+        rank_id = int(rank_id)
+        if rank_id in seen:
+            continue
+        title = TITLE_ATTR_PATTERN.search(before + after)
+        name = title.group(1) if title else TAG_PATTERN.sub('', inner)
+        name = html.unescape(name).strip()
+        if not name:
+            continue
+        seen.add(rank_id)
+        charts.append({'chart_id': rank_id, 'name': name})
+    return charts
+
+
+class ToplistStreamError(RuntimeError):
+    """排行榜页面的流式下载或解析中途失败：已产出的歌曲不完整，应视为整个榜单获取失败"""
+
 
 class KugouAPI:
     """酷狗音乐API客户端，通过解析页面内嵌JSON获取排行榜"""
 
-    def __init__(self, timeout: int = 15):
+    STREAM_CHUNK_SIZE = 16 * 1024
+    RANK_LIST_URL = 'https://www.kugou.com/yy/html/rank.html'
+    SONG_INFO_URL = 'https://m.kugou.com/app/i/getSongInfo.php'
+    SEARCH_URL = 'https://songsearch.kugou.com/song_search_v2'
+    ALBUM_INFO_URL = 'http://mobilecdnbj.kugou.com/api/v3/album/info'
+    PLAYLIST_URL = 'https://m.kugou.com/plist/list/{}'
+
+    def __init__(self, timeout: int = 15, cache: Optional[HttpCache] = None,
+                 transport: Optional[Transport] = None,
+                 page_parser: Optional[Callable[[bytes, str], Optional[Dict[str, Any]]]] = None,
+                 enrich_details: bool = False, detail_cache: Optional[SongInfoCache] = None,
+                 detail_workers: int = 8):
+        """
+        Args:
+            timeout: 请求超时时间（秒）
+            cache: 可选的磁盘HTTP缓存，启用后页面未变化的榜单会带 unchanged=True；
+                流式解析时边下载边写入缓存（见 HttpCache.stream）
+            transport: 共用的HTTP传输层，默认使用进程内共享的 Transport
+            page_parser: 可选的整页解析函数 (content, url) -> 榜单，例如 CpuPool.parse_kugou；
+                设置后下载完整页面再交给它解析，不再边下载边解析
+            enrich_details: get_toplist 是否为每首歌补全时长和比特率（见 enrich）
+            detail_cache: 歌曲详情缓存，默认使用进程内共享的 SongInfoCache
+            detail_workers: 查询歌曲详情时同时进行的请求数
+        """
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
         }
         self.timeout = timeout
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
+        self.cache = cache
+        self.page_parser = page_parser
+        self.enrich_details = enrich_details
+        self.detail_cache = detail_cache
+        self.detail_workers = detail_workers
+        # 连接池由 Transport 统一管理，各平台的请求头在每次请求时单独传入
+        self.transport = transport or get_default_transport()
+        self.session = self.transport.session
+
+    def _fetch_page(self, url: str) -> Optional[bytes]:
+        """获取完整的页面字节"""
+        try:
+            response = self.session.get(url, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            return response.content
+        except requests.exceptions.RequestException as e:
+            print(f"请求HTML页面时出错: {e} - {url}")
+            return None
 
     def _fetch_html(self, url: str) -> Optional[str]:
         """安全的HTTP GET请求方法，用于获取HTML页面内容"""
         try:
-            response = self.session.get(url, timeout=self.timeout)
+            response = self.session.get(url, headers=self.headers, timeout=self.timeout)
             response.raise_for_status()
             return response.text
         except requests.exceptions.RequestException as e:
             print(f"请求HTML页面时出错: {e} - {url}")
             return None
 
+    def _fetch_html_cached(self, url: str) -> Optional[CachedResponse]:
+        """经由磁盘缓存获取HTML页面，发送条件请求"""
+        try:
+            return self.cache.fetch(self.session, 'GET', url, headers=self.headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            print(f"请求HTML页面时出错: {e} - {url}")
+            return None
+
     def get_toplist(self, rank_id: int) -> Optional[Dict[str, Any]]:
         """
         获取排行榜数据，通过解析页面内嵌的JSON
@@ -34,56 +260,360 @@ class KugouAPI:
         Returns:
             包含排行榜信息和歌曲列表的字典，失败时返回None
         """
-        url = f"https://www.kugou.com/yy/rank/home/1-{rank_id}.html"
-        
-        html_content = self._fetch_html(url)
-        if not html_content:
+        toplist = self._get_toplist(rank_id)
+        if toplist is not None and self.enrich_details:
+            toplist = dict(toplist, songs=self.enrich(toplist['songs']))
+        return toplist
+
+    @staticmethod
+    def _rank_url(rank_id: int) -> str:
+        return f"https://www.kugou.com/yy/rank/home/1-{rank_id}.html"
+
+    def _get_toplist(self, rank_id: int) -> Optional[Dict[str, Any]]:
+        if self.page_parser is None:
+            return self.get_toplist_stream(rank_id)
+
+        # 整页交给 page_parser（例如进程池）解析
+        url = self._rank_url(rank_id)
+        if self.cache is not None:
+            response = self._fetch_html_cached(url)
+            if not response:
+                return None
+            toplist = self.cache.memoize(response, 'toplist', lambda: self._parse_page(response.content, url))
+            if toplist is not None and not response.changed:
+                toplist = dict(toplist, unchanged=True)
+            return toplist
+        content = self._fetch_page(url)
+        return self._parse_page(content, url) if content is not None else None
+
+    def _parse_page(self, content: bytes, url: str) -> Optional[Dict[str, Any]]:
+        """从完整的排行榜页面字节中解析标题和歌曲列表，设置了 page_parser 时交给它解析"""
+        if self.page_parser is not None:
+            return self.page_parser(content, url)
+        return parse_toplist_page(content, url)
+
+    @staticmethod
+    def _song_from_feature(idx: int, item: Any) -> SongRecord:
+        """将 global.features 中的一项（字典或 fast_json.KugouFeature）转换为歌曲记录"""
+        if isinstance(item, dict):
+            filename = item.get('FileName', ' - ')
+            album, song_hash = item.get('album_name', '未知专辑'), item.get('Hash', '')
+            duration, album_id = item.get('timeLen', 0), item.get('album_id')
+        else:
+            filename, album, song_hash = item.FileName, item.album_name, item.Hash
+            duration, album_id = item.timeLen, item.album_id
+        parts = filename.split(' - ', 1)
+        singer = parts[0].strip()
+        song_name = parts[1].strip() if len(parts) > 1 else filename
+
+        return SongRecord(
+            rank=idx,
+            title=song_name,
+            artist=singer,
+            album=album,
+            song_id=song_hash,
+            duration=duration,
+            id_field=HASH_FIELD,
+            album_id=album_id or None
+        )
+
+    def _page_chunks(self, url: str) -> Tuple[Iterator[bytes], Optional[CachedStream]]:
+        """排行榜页面的数据块迭代器（开始迭代时才发出请求）；启用缓存时经由 HttpCache.stream 边读边写入缓存"""
+        if self.cache is not None:
+            stream = self.cache.stream(self.session, url, headers=self.headers, timeout=self.timeout)
+            return stream.iter_content(self.STREAM_CHUNK_SIZE), stream
+
+        def chunks():
+            with self.session.get(url, headers=self.headers, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                yield from response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE)
+        return chunks(), None
+
+    def _songs_from_chunks(self, url: str, chunks: Iterator[bytes],
+                           extractor: FeaturesStreamExtractor) -> Iterator[SongRecord]:
+        with closing(chunks):
+            try:
+                idx = 0
+                for chunk in chunks:
+                    for item in extractor.feed(chunk):
+                        idx += 1
+                        yield self._song_from_feature(idx, item)
+                    if extractor.done:
+                        break
+            except requests.exceptions.RequestException as e:
+                raise ToplistStreamError(f"请求HTML页面时出错: {e} - {url}") from e
+            except json.JSONDecodeError as e:
+                raise ToplistStreamError(f"解析页面数据时出错: {e} - {url}") from e
+        if not extractor.done:
+            raise ToplistStreamError(f"在页面 {url} 中未找到完整的global.features数据")
+
+    def iter_toplist_songs(self, rank_id: int, extractor: Optional[FeaturesStreamExtractor] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式获取排行榜歌曲：边下载边解析 global.features，数组结束后立即停止下载
+
+        Args:
+            rank_id: 排行榜ID
+            extractor: 可选的提取器，调用方可在迭代结束后读取其 title/done
+
+        Yields:
+            歌曲字典
+
+        Raises:
+            ToplistStreamError: 请求失败、页面数据无法解析或数组不完整；之前产出的歌曲不完整，调用方应丢弃
+        """
+        url = self._rank_url(rank_id)
+        chunks, _ = self._page_chunks(url)
+        yield from self._songs_from_chunks(url, chunks, extractor or FeaturesStreamExtractor())
+
+    def get_toplist_stream(self, rank_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取排行榜数据（流式版本），返回值与 get_toplist 相同
+
+        Args:
+            rank_id: 排行榜ID
+
+        Returns:
+            包含排行榜信息和歌曲列表的字典，失败时返回None；启用缓存且页面未变化时带 unchanged=True
+        """
+        url = self._rank_url(rank_id)
+        extractor = FeaturesStreamExtractor()
+        chunks, stream = self._page_chunks(url)
+        try:
+            songs = list(self._songs_from_chunks(url, chunks, extractor))
+        except ToplistStreamError as e:
+            print(e)
+            return None
+        toplist = {
+            'title': extractor.title or '未知榜单',
+            'total': len(songs),
+            'songs': songs
+        }
+        if stream is not None and stream.changed is False:
+            toplist['unchanged'] = True
+        return toplist
+
+    def get_song_info(self, song_hash: str) -> Optional[Tuple[int, int]]:
+        """
+        查询单首歌曲的播放信息
+
+        Args:
+            song_hash: 歌曲 Hash
+
+        Returns:
+            (时长秒, 比特率kbps)，失败时返回None
+        """
+        try:
+            response = self.session.get(self.SONG_INFO_URL, params={'cmd': 'playInfo', 'hash': song_hash},
+                                        headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            with get_telemetry().stage('decode'):
+                data = response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"请求歌曲信息时出错: {e} - {song_hash}")
+            return None
+        except ValueError as e:
+            print(f"解析歌曲信息时出错: {e} - {song_hash}")
+            return None
+        if data.get('errcode') or ('timeLength' not in data and 'bitRate' not in data):
+            print(f"未找到歌曲信息: {song_hash} ({data.get('error', '')})")
             return None
+        return int(data.get('timeLength') or 0), int(data.get('bitRate') or 0)
 
-        # 目标是 global.features = [...] 中的 [...]
-        # 正确转义了方括号
-        match = re.search(r'global.features\s*=\s*\[(.*?)\];', html_content)
-        if not match:
-            print(f"在页面 {url} 中未找到global.features数据")
+    def enrich(self, songs: List[SongRecord]) -> List[SongRecord]:
+        """
+        为歌曲补全时长和比特率
+
+        收集全部 Hash，去掉重复和详情缓存中已有的，其余以 detail_workers 个请求并发查询；
+        查询结果按 Hash 持久化，仍在榜上的歌曲以后不再请求。
+
+        Args:
+            songs: get_toplist 返回的歌曲记录
+
+        Returns:
+            补全后的歌曲记录列表（查询失败的歌曲保持原样）
+        """
+        detail_cache = self.detail_cache if self.detail_cache is not None else get_default_song_info_cache()
+        hashes = detail_cache.missing(song.song_id.upper() for song in songs if song.song_id)
+        if hashes:
+            with get_telemetry().span('enrich', songs=len(hashes)):
+                with ThreadPoolExecutor(max_workers=min(self.detail_workers, len(hashes))) as executor:
+                    # 每个请求在当前上下文的副本中执行，继承外层 span 的平台/榜单标签
+                    futures = {song_hash: executor.submit(contextvars.copy_context().run,
+                                                          self.get_song_info, song_hash)
+                               for song_hash in hashes}
+                    details = {song_hash: future.result() for song_hash, future in futures.items()}
+            detail_cache.update({song_hash: detail for song_hash, detail in details.items() if detail is not None})
+            detail_cache.save()
+
+        enriched = []
+        for song in songs:
+            detail = detail_cache.get(song.song_id.upper()) if song.song_id else None
+            if detail is None:
+                enriched.append(song)
+                continue
+            duration, bitrate = detail
+            enriched.append(song.replace(duration=duration or song.duration, bitrate=bitrate or None))
+        return enriched
+
+    def search(self, keyword: str, page: int = 1, page_size: int = 20) -> Optional[List[SongRecord]]:
+        """
+        按关键词搜索歌曲（song_search_v2）
+
+        Args:
+            keyword: 搜索关键词
+            page: 页码，从1开始
+            page_size: 每页歌曲数
+
+        Returns:
+            歌曲记录列表，排名为在搜索结果中的位置；失败时返回None
+        """
+        params = {'keyword': keyword, 'page': page, 'pagesize': page_size, 'platform': 'WebFilter'}
+        try:
+            response = self.session.get(self.SEARCH_URL, params=params, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            with get_telemetry().stage('decode'):
+                data = response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"搜索 {keyword} 时出错: {e}")
             return None
+        except ValueError as e:
+            print(f"解析搜索结果时出错: {e}")
+            return None
+        lists = (data.get('data') or {}).get('lists')
+        if lists is None:
+            print(f"搜索 {keyword} 失败: {data.get('error_msg', '')}")
+            return None
+        with get_telemetry().stage('parse'):
+            return [self._song_from_search(idx, item)
+                    for idx, item in enumerate(lists, (page - 1) * page_size + 1)]
+
+    @staticmethod
+    def _song_from_search(idx: int, item: Dict[str, Any]) -> SongRecord:
+        """将搜索结果中的一项转换为歌曲记录，去掉关键词高亮的 <em> 标签"""
+        def clean(text):
+            return html.unescape(TAG_PATTERN.sub('', text or '')).strip()
+
+        return SongRecord(
+            rank=idx,
+            title=clean(item.get('SongName')),
+            artist=clean(item.get('SingerName')),
+            album=clean(item.get('AlbumName')),
+            song_id=item.get('FileHash', ''),
+            duration=item.get('Duration') or None,
+            id_field=HASH_FIELD
+        )
 
+    def _get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         try:
-            # 提取歌曲列表JSON
-            songs_json_str = match.group(1)
-            song_list = json.loads(f'[{songs_json_str}]')
-
-            # 提取榜单标题
-            title_match = re.search(r'<title>(.*?)_排行榜', html_content)
-            title = title_match.group(1) if title_match else '未知榜单'
-
-            songs = []
-            for idx, item in enumerate(song_list, 1):
-                filename = item.get('FileName', ' - ')
-                parts = filename.split(' - ', 1)
-                singer = parts[0].strip()
-                song_name = parts[1].strip() if len(parts) > 1 else filename
-
-                songs.append({
-                    '排名': idx,
-                    '歌曲名': song_name,
-                    '歌手': singer,
-                    '专辑': item.get('album_name', '未知专辑'),
-                    'Hash': item.get('Hash', ''),
-                    '时长': item.get('timeLen', 0)
-                })
-            
-            return {
-                'title': title,
-                'total': len(songs),
-                'songs': songs
-            }
+            response = self.session.get(url, params=params, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            with get_telemetry().stage('decode'):
+                return response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"请求错误: {e} - {url}")
+        except ValueError as e:
+            print(f"JSON解析错误: {e} - {url}")
+        return None
 
-        except (json.JSONDecodeError, IndexError, Exception) as e:
-            print(f"解析页面数据时出错: {e}")
+    def get_album_info(self, album_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取专辑信息（一次一个专辑，批量获取见 batch_loader.kugou_album_loader）
+
+        Args:
+            album_id: 专辑ID
+
+        Returns:
+            {'album_id', 'name', 'artist', 'publish_time', 'intro', 'cover'}，失败时返回None
+        """
+        data = self._get_json(self.ALBUM_INFO_URL, {'albumid': album_id})
+        info = data.get('data') if data and data.get('status') == 1 else None
+        if not info:
+            print(f"获取专辑 {album_id} 失败")
             return None
+        return {
+            'album_id': str(album_id),
+            'name': info.get('albumname', ''),
+            'artist': info.get('singername', ''),
+            'publish_time': info.get('publishtime') or None,
+            'intro': info.get('intro', ''),
+            'cover': (info.get('imgurl') or '').replace('{size}', '400'),
+        }
+
+    def get_playlist_info(self, playlist_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取歌单信息（一次一个歌单，批量获取见 batch_loader.kugou_playlist_loader）
+
+        Args:
+            playlist_id: 歌单ID (specialid)
+
+        Returns:
+            {'playlist_id', 'name', 'author', 'song_count', 'intro', 'cover'}，失败时返回None
+        """
+        data = self._get_json(self.PLAYLIST_URL.format(playlist_id), {'json': 'true'})
+        info = (data.get('info') or {}).get('list') if data else None
+        if not info:
+            print(f"获取歌单 {playlist_id} 失败")
+            return None
+        songs = ((data.get('list') or {}).get('list') or {}).get('info') or []
+        return {
+            'playlist_id': str(playlist_id),
+            'name': info.get('specialname', ''),
+            'author': info.get('nickname', ''),
+            'song_count': info.get('songcount') or len(songs),
+            'intro': info.get('intro', ''),
+            'cover': (info.get('imgurl') or '').replace('{size}', '400'),
+        }
+
+    def get_rank_list(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取全部排行榜的目录（解析排行榜首页侧栏）
+
+        Returns:
+            [{'chart_id', 'name'}, ...]，失败时返回None
+        """
+        page = self._fetch_html(self.RANK_LIST_URL)
+        if page is None:
+            return None
+        charts = parse_rank_list(page)
+        if not charts:
+            print(f"在页面 {self.RANK_LIST_URL} 中未找到排行榜链接")
+            return None
+        return charts
+
+    async def get_toplist_async(self, rank_id: int) -> Optional[Dict[str, Any]]:
+        """get_toplist 的异步版本，阻塞的HTTP请求放到线程中执行，不会阻塞事件循环"""
+        return await asyncio.to_thread(self.get_toplist, rank_id)
 
     def close(self):
-        self.session.close()
+        """会话属于共用的 Transport，这里不关闭连接池，由 Transport.close() 统一关闭"""
+
+def parse_toplist_page(content: bytes, url: str) -> Optional[Dict[str, Any]]:
+    """
+    从完整的排行榜页面字节中解析标题和歌曲列表（模块级函数，可在进程池中执行）
+
+    Args:
+        content: 页面字节
+        url: 页面地址，仅用于错误信息
+
+    Returns:
+        {'title', 'total', 'songs'}，失败时返回None
+    """
+    with get_telemetry().stage('parse'):
+        extractor = FeaturesStreamExtractor()
+        try:
+            song_list = extractor.feed(content)
+        except json.JSONDecodeError as e:
+            print(f"解析页面数据时出错: {e}")
+            return None
+        if not extractor.done:
+            print(f"在页面 {url} 中未找到global.features数据")
+            return None
+        songs = [KugouAPI._song_from_feature(idx, item) for idx, item in enumerate(song_list, 1)]
+    return {
+        'title': extractor.title or '未知榜单',
+        'total': len(songs),
+        'songs': songs
+    }
 
 def main():
     """主函数，演示API使用"""
@@ -1,16 +1,39 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import contextvars
 import requests
 import json
 import base64
 import os
 import csv
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from Crypto.Cipher import AES
 
+import fast_json
+from detail_cache import DetailCache
+from song_record import SongRecord
+from telemetry import get_telemetry
+from transport import get_default_transport
+
 # --- Constants ---
 MODULUS = '00e0b509f6259df8642dbc35662901477df22677ec152b5ff68ace615bb7b725152b3ab17a876aea8a5aa76d2e417629ec4ee341f56135fccf695280104e0312ecbda92557c93870114af6c9d05c4f7f0c3685b7a46bee255932575cce10b424d813cfe4875d3e82047b97ddef52741d546b8e289dc6935b3ece0462db0a22b8e7'
 NONCE = b'0CoJUm6Qyw8W8jud'
 PUBKEY = '010001'
 API_URL = "https://music.163.com/weapi/v3/playlist/detail"
+TOPLIST_URL = "https://music.163.com/weapi/toplist"
+SONG_DETAIL_URL = "https://music.163.com/weapi/v3/song/detail"
+SEARCH_URL = "https://music.163.com/weapi/cloudsearch/get/web"
+# 每次 song/detail 请求查询的歌曲数，以及同时进行的请求数
+SONG_DETAIL_BATCH = 500
+SONG_DETAIL_WORKERS = 4
+# 歌曲详情缓存的条目上限，超出后淘汰最久未使用的
+TRACK_CACHE_SIZE = 50000
+# 响应结构变化时解析可能抛出的异常，与其它平台的客户端一致按失败处理
+PARSE_ERRORS = (ValueError, KeyError, TypeError, AttributeError)
+DEFAULT_TRACK_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'netease_tracks.json')
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
     'Referer': 'https://music.163.com/',
@@ -27,28 +50,130 @@ def aes_encrypt(text, key, iv):
 
 def rsa_encrypt(text, pub_key, modulus):
     text = text[::-1]
-    rs = int(text.hex(), 16) ** int(pub_key, 16) % int(modulus, 16)
+    rs = pow(int(text.hex(), 16), int(pub_key, 16), int(modulus, 16))
     return format(rs, 'x').zfill(256)
 
 def create_secret_key(size):
     import random
     return (''.join(random.choice('0123456789abcdef') for _ in range(size))).encode('utf-8')
 
-def weapi_encrypt(data):
-    data_bytes = json.dumps(data).encode('utf-8')
-    secret_key = create_secret_key(16)
-    iv = b'0102030405060708'
-    params = aes_encrypt(aes_encrypt(data_bytes, NONCE, iv), secret_key, iv)
-    enc_sec_key = rsa_encrypt(secret_key, PUBKEY, MODULUS)
-    return {
-        'params': params.decode('utf-8'),
-        'encSecKey': enc_sec_key
-    }
+class WeapiEncryptor:
+    """
+    可复用的 weapi 加密器
+
+    MODULUS/PUBKEY 只解析一次；预先生成一批 (secret_key, encSecKey)，
+    轮流使用，每个密钥用满 max_uses 次或超过 max_age 秒后换新。
+    这样每次加密只需两次AES，RSA只在换新密钥时计算。
+    """
+
+    IV = b'0102030405060708'
+
+    def __init__(self, pool_size=8, max_uses=100, max_age=None):
+        """
+        Args:
+            pool_size: 预生成的密钥对数量
+            max_uses: 单个密钥对的最大使用次数，1 表示每次请求都换新密钥
+            max_age: 单个密钥对的最长存活秒数，None 表示不按时间轮换
+        """
+        self.modulus = int(MODULUS, 16)
+        self.pub_key = int(PUBKEY, 16)
+        self.pool_size = pool_size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._pool = deque(self._new_entry() for _ in range(pool_size))
+
+    def rsa_encrypt(self, text):
+        text = text[::-1]
+        rs = pow(int.from_bytes(text, 'big'), self.pub_key, self.modulus)
+        return format(rs, 'x').zfill(256)
+
+    def _new_entry(self):
+        secret_key = create_secret_key(16)
+        # [secret_key, encSecKey, 已使用次数, 创建时间]
+        return [secret_key, self.rsa_encrypt(secret_key), 0, time.monotonic()]
+
+    def _acquire_key(self):
+        with self._lock:
+            entry = self._pool.popleft()
+            if self.max_age is not None and time.monotonic() - entry[3] > self.max_age:
+                entry = self._new_entry()
+            entry[2] += 1
+            if entry[2] < self.max_uses:
+                self._pool.append(entry)
+            else:
+                self._pool.append(self._new_entry())
+            return entry[0], entry[1]
+
+    def encrypt(self, data):
+        data_bytes = fast_json.dumps(data).encode('utf-8')
+        secret_key, enc_sec_key = self._acquire_key()
+        params = aes_encrypt(aes_encrypt(data_bytes, NONCE, self.IV), secret_key, self.IV)
+        return {
+            'params': params.decode('utf-8'),
+            'encSecKey': enc_sec_key
+        }
+
+_default_encryptor = None
+
+def get_default_encryptor():
+    """获取进程内共享的 WeapiEncryptor（首次调用时创建）"""
+    global _default_encryptor
+    if _default_encryptor is None:
+        _default_encryptor = WeapiEncryptor()
+    return _default_encryptor
+
+def weapi_encrypt(data, encryptor=None):
+    return (encryptor or get_default_encryptor()).encrypt(data)
 
 # --- Main Logic ---
-def fetch_and_save_toplist(chart_name, chart_id, output_dir):
-    print(f"正在抓取网易云音乐 -> {chart_name}...")
-    payload = {
+def iter_tracks(tracks, start=1):
+    """逐条把 tracks 转换为歌曲字典，排名从 start 开始"""
+    for i, track in enumerate(tracks, start):
+        artist_names = ' / '.join([ar['name'] for ar in track.get('ar', [])])
+        yield SongRecord(
+            rank=i,
+            title=track.get('name'),
+            artist=artist_names,
+            album=track.get('al', {}).get('name'),
+            song_id=track.get('id'),
+            album_id=track.get('al', {}).get('id')
+        )
+
+def iter_track_structs(tracks, start=1):
+    """iter_tracks 的类型化版本，tracks 为 fast_json.NeteaseTrack 列表"""
+    for i, track in enumerate(tracks, start):
+        yield SongRecord(
+            rank=i,
+            title=track.name,
+            artist=' / '.join([ar.name for ar in track.ar]),
+            album=track.al.name,
+            song_id=track.id,
+            album_id=track.al.id
+        )
+
+def parse_tracks(tracks):
+    return list(iter_tracks(tracks))
+
+def _playlist_parts(data):
+    """
+    从歌单详情响应中取出 (歌单名, 歌曲迭代器, 内联的 tracks 数, trackIds 中的歌曲ID)
+
+    Args:
+        data: 解码后的响应字典，或 fast_json.decode_netease_playlist 得到的类型化结构
+    """
+    if isinstance(data, dict):
+        playlist = data.get('playlist', {})
+        tracks = playlist.get('tracks', [])
+        track_ids = [track['id'] for track in playlist.get('trackIds', [])]
+        return playlist.get('name', ''), iter_tracks(tracks), len(tracks), track_ids
+    playlist = data.playlist
+    track_ids = [track.id for track in playlist.trackIds]
+    return playlist.name, iter_track_structs(playlist.tracks), len(playlist.tracks), track_ids
+
+def playlist_payload(chart_id):
+    """歌单详情接口加密前的请求数据"""
+    return {
         "id": str(chart_id),
         "offset": 0,
         "total": True,
@@ -56,44 +181,351 @@ def fetch_and_save_toplist(chart_name, chart_id, output_dir):
         "n": 1000,
         "csrf_token": ""
     }
-    
-    encrypted_data = weapi_encrypt(payload)
+
+# --- Track Hydration ---
+class HydrationError(RuntimeError):
+    """补全歌单中未内联的歌曲失败：只有内联的部分歌曲，应视为整个榜单获取失败"""
+
+
+class TrackDetailCache(DetailCache):
+    """
+    网易云歌曲详情缓存：track id -> (歌曲名, 歌手, 专辑)
+
+    歌单接口只内联一部分 tracks，其余歌曲只在 trackIds 中给出ID，需要另外查询详情。
+    只缓存查询过的歌曲，最多 max_entries 首。
+    """
+
+    def __init__(self, path=DEFAULT_TRACK_CACHE_PATH, max_entries=TRACK_CACHE_SIZE):
+        super().__init__(path, key_type=int, max_entries=max_entries)
+
+_default_track_cache = None
+
+def get_default_track_cache():
+    """获取进程内共享的 TrackDetailCache（首次调用时从磁盘加载）"""
+    global _default_track_cache
+    if _default_track_cache is None:
+        _default_track_cache = TrackDetailCache()
+    return _default_track_cache
+
+def song_detail_payload(track_ids):
+    """歌曲详情接口加密前的请求数据"""
+    return {
+        "c": json.dumps([{"id": track_id} for track_id in track_ids]),
+        "csrf_token": ""
+    }
+
+def _track_detail(track):
+    return (track.get('name'), ' / '.join([ar['name'] for ar in track.get('ar', [])]),
+            track.get('al', {}).get('name'))
+
+def fetch_song_details(track_ids, transport=None, encryptor=None):
+    """
+    查询一批歌曲的详情
+
+    Args:
+        track_ids: 歌曲ID列表，不超过 SONG_DETAIL_BATCH 个
+        transport: 共用的HTTP传输层，默认使用进程内共享的 Transport
+        encryptor: weapi 加密器，默认使用进程内共享的 WeapiEncryptor
+
+    Returns:
+        {track id: (歌曲名, 歌手, 专辑)}，已下架的歌曲不在其中；失败时返回None
+    """
+    session = (transport or get_default_transport()).session
+    try:
+        response = session.post(SONG_DETAIL_URL, headers=HEADERS,
+                                data=weapi_encrypt(song_detail_payload(track_ids), encryptor))
+        if response.status_code != 200:
+            print(f"  -> 错误：歌曲详情 HTTP状态码 {response.status_code}")
+            return None
+        with get_telemetry().stage('decode'):
+            songs = response.json().get('songs')
+        if songs is None:
+            print("  -> 错误：未在响应中找到歌曲详情。")
+            return None
+        return {song['id']: _track_detail(song) for song in songs}
+    except (requests.exceptions.RequestException, *PARSE_ERRORS) as e:
+        print(f"  -> 错误：{e}")
+        return None
+
+def hydrate_songs(songs, track_ids, transport=None, track_cache=None, encryptor=None,
+                  batch_size=SONG_DETAIL_BATCH, max_workers=SONG_DETAIL_WORKERS):
+    """
+    按 trackIds 补全歌单中未内联的歌曲
+
+    只有查询到的详情写入 track_cache（内联歌曲不缓存）；缓存中没有的ID按 batch_size 分批、
+    并发查询，所有批次共用同一个加密器。
+
+    Args:
+        songs: 歌单接口内联的歌曲记录
+        track_ids: 歌单的完整歌曲ID列表（按排名）
+        transport: 共用的HTTP传输层
+        track_cache: 歌曲详情缓存，默认使用进程内共享的 TrackDetailCache
+        encryptor: weapi 加密器，默认使用进程内共享的 WeapiEncryptor
+        batch_size: 每次请求查询的歌曲数
+        max_workers: 同时进行的请求数
+
+    Returns:
+        按排名排列的完整歌曲记录列表（已下架、查不到详情的歌曲跳过，排名保持为其在歌单中的位置）；
+        任一批次失败时返回None
+    """
+    track_cache = track_cache if track_cache is not None else get_default_track_cache()
+    encryptor = encryptor or get_default_encryptor()
+    inline = {song.song_id: song for song in songs}
+    missing = [track_id for track_id in track_cache.missing(track_ids) if track_id not in inline]
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+
+    if batches:
+        with get_telemetry().span('hydrate', tracks=len(missing), batches=len(batches)):
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+                # 每个请求在当前上下文的副本中执行，继承外层 span 的平台/榜单标签
+                futures = [executor.submit(contextvars.copy_context().run, fetch_song_details,
+                                           batch, transport, encryptor) for batch in batches]
+                results = [future.result() for future in futures]
+        if any(result is None for result in results):
+            return None
+        for result in results:
+            track_cache.update(result)
+    track_cache.save()
+
+    hydrated = []
+    for rank, track_id in enumerate(track_ids, 1):
+        song = inline.get(track_id)
+        if song is not None:
+            hydrated.append(song if song.rank == rank else song.replace(rank=rank))
+            continue
+        detail = track_cache.get(track_id)
+        if detail is not None:
+            hydrated.append(SongRecord(rank, *detail, song_id=track_id))
+    if len(hydrated) < len(track_ids):
+        print(f"  -> {len(track_ids) - len(hydrated)} 首歌曲已下架或查不到详情，已跳过")
+    return hydrated
+
+def _hydrate_toplist(toplist, transport, track_cache, encryptor):
+    # 歌单解析结果中带 track_ids 说明内联的 tracks 不完整
+    if toplist is None or 'track_ids' not in toplist:
+        return toplist
+    toplist = dict(toplist)
+    track_ids = toplist.pop('track_ids')
+    songs = hydrate_songs(toplist['songs'], track_ids, transport=transport, track_cache=track_cache,
+                          encryptor=encryptor)
+    if songs is None:
+        return None
+    toplist['songs'] = songs
+    return toplist
+
+def fetch_toplist(chart_id, cache=None, transport=None, encrypted_data=None, parser=None, track_cache=None,
+                  encryptor=None):
+    """
+    获取网易云榜单（歌单）数据
+
+    Args:
+        chart_id: 榜单ID
+        cache: 可选的磁盘HTTP缓存 (HttpCache)，以加密前的业务数据作为缓存键
+        transport: 共用的HTTP传输层，默认使用进程内共享的 Transport
+        encrypted_data: 预先加密好的请求体（例如由 CpuPool 批量加密），默认在当前线程加密
+        parser: 响应字节 -> 榜单字典 的解析函数（例如 CpuPool.parse_netease），默认为 parse_playlist_content
+        track_cache: 补全未内联歌曲时使用的详情缓存，默认使用进程内共享的 TrackDetailCache
+        encryptor: 歌单和歌曲详情请求共用的 weapi 加密器，默认使用进程内共享的 WeapiEncryptor
+
+    Returns:
+        {'title', 'songs'} 字典，失败时返回None；缓存命中且内容未变化时带 unchanged=True
+    """
+    payload = playlist_payload(chart_id)
+    encrypted_data = encrypted_data or weapi_encrypt(payload, encryptor)
+    parser = parser or parse_playlist_content
+    session = (transport or get_default_transport()).session
+
+    if cache is not None:
+        try:
+            response = cache.fetch(session, 'POST', API_URL, data=encrypted_data,
+                                   key_data=payload, headers=HEADERS)
+        except requests.exceptions.RequestException as e:
+            print(f"  -> 错误：{e}")
+            return None
+        try:
+            toplist = cache.memoize(response, 'toplist', lambda: parser(response.content))
+        except PARSE_ERRORS as e:
+            print(f"  -> 错误：{e}")
+            return None
+        toplist = _hydrate_toplist(toplist, transport, track_cache, encryptor)
+        if toplist is not None and not response.changed:
+            toplist = dict(toplist, unchanged=True)
+        return toplist
 
     try:
-        response = requests.post(API_URL, headers=HEADERS, data=encrypted_data)
+        response = session.post(API_URL, headers=HEADERS, data=encrypted_data)
         if response.status_code != 200:
             print(f"  -> 错误：HTTP状态码 {response.status_code}")
-            return
+            return None
+        toplist = parser(response.content)
+    except (requests.exceptions.RequestException, *PARSE_ERRORS) as e:
+        print(f"  -> 错误：{e}")
+        return None
+    return _hydrate_toplist(toplist, transport, track_cache, encryptor)
+
+def iter_toplist_songs(chart_id, transport=None, track_cache=None, encryptor=None):
+    """
+    获取网易云榜单并逐首产出歌曲字典（响应JSON整体解析，歌曲字典按需生成）
+
+    Args:
+        chart_id: 榜单ID
+        transport: 共用的HTTP传输层，默认使用进程内共享的 Transport
+        track_cache: 补全未内联歌曲时使用的详情缓存，默认使用进程内共享的 TrackDetailCache
+        encryptor: weapi 加密器，默认使用进程内共享的 WeapiEncryptor
 
-        data = response.json()
-        tracks = data.get('playlist', {}).get('tracks', [])
+    Yields:
+        歌曲字典，歌单请求出错时提前结束
 
-        if not tracks:
-            print("  -> 错误：未在响应中找到歌曲列表。")
+    Raises:
+        HydrationError: 歌单只内联了部分歌曲，且补全其余歌曲失败（不产出不完整的榜单）
+    """
+    session = (transport or get_default_transport()).session
+    payload = playlist_payload(chart_id)
+    try:
+        response = session.post(API_URL, headers=HEADERS, data=weapi_encrypt(payload, encryptor))
+        if response.status_code != 200:
+            print(f"  -> 错误：HTTP状态码 {response.status_code}")
             return
+        with get_telemetry().stage('decode'):
+            data = fast_json.decode_netease_playlist(response.content)
+        _, songs, inline_count, track_ids = _playlist_parts(data)
+    except (requests.exceptions.RequestException, *PARSE_ERRORS) as e:
+        print(f"  -> 错误：{e}")
+        return
+    if len(track_ids) > inline_count:
+        hydrated = hydrate_songs(list(songs), track_ids, transport=transport, track_cache=track_cache,
+                                 encryptor=encryptor)
+        if hydrated is None:
+            raise HydrationError(f"榜单 {chart_id} 未内联的 {len(track_ids) - inline_count} 首歌曲补全失败")
+        songs = hydrated
+    yield from songs
 
-        song_list = []
-        for i, track in enumerate(tracks, 1):
-            artist_names = ' / '.join([ar['name'] for ar in track.get('ar', [])])
-            song_info = {
-                '排名': i,
-                '歌曲名': track.get('name'),
-                '歌手': artist_names,
-                '专辑': track.get('al', {}).get('name')
-            }
-            song_list.append(song_info)
-        
-        # Save to CSV
+def parse_playlist_content(content):
+    """解析歌单接口的响应字节（模块级函数，可在进程池中执行）"""
+    telemetry = get_telemetry()
+    with telemetry.stage('decode'):
+        data = fast_json.decode_netease_playlist(content)
+    with telemetry.stage('parse'):
+        return _parse_playlist(data)
+
+def _parse_playlist(data):
+    title, songs, inline_count, track_ids = _playlist_parts(data)
+
+    if not inline_count and not track_ids:
+        print("  -> 错误：未在响应中找到歌曲列表。")
+        return None
+
+    toplist = {
+        'title': title,
+        'songs': list(songs)
+    }
+    # 大歌单只内联前一部分 tracks，完整列表只在 trackIds 中，交给 fetch_toplist 补全
+    if len(track_ids) > inline_count:
+        toplist['track_ids'] = track_ids
+    return toplist
+
+def fetch_toplist_catalog(transport=None):
+    """
+    获取全部官方榜单的目录
+
+    Args:
+        transport: 共用的HTTP传输层，默认使用进程内共享的 Transport
+
+    Returns:
+        [{'chart_id', 'name', 'frequency', 'update_time', 'intro'}, ...]，失败时返回None
+    """
+    session = (transport or get_default_transport()).session
+    try:
+        response = session.post(TOPLIST_URL, headers=HEADERS, data=weapi_encrypt({"csrf_token": ""}))
+        if response.status_code != 200:
+            print(f"  -> 错误：HTTP状态码 {response.status_code}")
+            return None
+        return _parse_toplist_catalog(response.json())
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"  -> 错误：{e}")
+        return None
+
+def _parse_toplist_catalog(data):
+    toplists = data.get('list')
+    if not toplists:
+        print("  -> 错误：未在响应中找到榜单目录。")
+        return None
+    charts = []
+    for toplist in toplists:
+        update_time = toplist.get('updateTime')
+        charts.append({
+            'chart_id': toplist['id'],
+            'name': toplist.get('name', ''),
+            'frequency': toplist.get('updateFrequency') or '',
+            # updateTime 为毫秒时间戳
+            'update_time': time.strftime('%Y-%m-%d', time.localtime(update_time / 1000)) if update_time else None,
+            'intro': toplist.get('description') or '',
+        })
+    return charts
+
+def search_songs(keyword, page=1, page_size=20, transport=None, encryptor=None):
+    """
+    按关键词搜索歌曲（cloudsearch，type=1 为单曲）
+
+    Args:
+        keyword: 搜索关键词
+        page: 页码，从1开始
+        page_size: 每页歌曲数
+        transport: 共用的HTTP传输层，默认使用进程内共享的 Transport
+        encryptor: weapi 加密器，默认使用进程内共享的 WeapiEncryptor
+
+    Returns:
+        歌曲记录列表，排名为在搜索结果中的位置；失败时返回None
+    """
+    session = (transport or get_default_transport()).session
+    offset = (page - 1) * page_size
+    payload = {"s": keyword, "type": "1", "offset": offset, "limit": page_size, "total": "true", "csrf_token": ""}
+    try:
+        response = session.post(SEARCH_URL, headers=HEADERS, data=weapi_encrypt(payload, encryptor))
+        if response.status_code != 200:
+            print(f"  -> 错误：HTTP状态码 {response.status_code}")
+            return None
+        with get_telemetry().stage('decode'):
+            data = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"  -> 错误：{e}")
+        return None
+    if data.get('code') != 200:
+        print(f"  -> 错误：搜索 {keyword} 返回 code={data.get('code')}")
+        return None
+    with get_telemetry().stage('parse'):
+        return list(iter_tracks((data.get('result') or {}).get('songs', []), offset + 1))
+
+def fetch_and_save_toplist(chart_name, chart_id, output_dir, cache=None, transport=None):
+    print(f"正在抓取网易云音乐 -> {chart_name}...")
+
+    try:
+        toplist = fetch_toplist(chart_id, cache=cache, transport=transport)
+        if not toplist:
+            return False
+
+        song_list = toplist['songs']
         output_path = os.path.join(output_dir, f"{chart_name}.csv")
+        if toplist.get('unchanged') and os.path.exists(output_path):
+            print(f"  -> 内容未变化，跳过写入 {output_path}")
+            return True
+
+        # Save to CSV
         with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=['排名', '歌曲名', '歌手', '专辑'])
+            writer = csv.DictWriter(f, fieldnames=['排名', '歌曲名', '歌手', '专辑'], extrasaction='ignore')
             writer.writeheader()
             writer.writerows(song_list)
         
         print(f"  -> 成功！已保存 {len(song_list)} 首歌曲到 {output_path}")
+        return True
 
     except Exception as e:
         print(f"  -> 发生意外错误: {e}")
+        return False
+
+async def fetch_and_save_toplist_async(chart_name, chart_id, output_dir, cache=None, transport=None):
+    """fetch_and_save_toplist 的异步版本，阻塞的请求和写文件放到线程中执行"""
+    return await asyncio.to_thread(fetch_and_save_toplist, chart_name, chart_id, output_dir, cache, transport)
 
 def main():
     charts_to_fetch = {
@@ -1,48 +1,200 @@
+import asyncio
 import requests
 import json
 import html
-from typing import Dict, List, Optional, Any
+import re
+from operator import itemgetter
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple, Union
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import fast_json
+from chart_cadence import cadence_for
+from http_cache import CachedResponse, HttpCache
+from schema_drift import SchemaMonitor, get_default_schema_monitor
+from song_record import SongRecord
+from telemetry import get_telemetry
+from transport import Transport, get_default_transport
+
+# GetDetail 的结构指纹在 SchemaMonitor 中的接口名
+DETAIL_ENDPOINT = 'qq.toplist_detail'
+# 歌曲列表可能出现的位置（按优先顺序）
+DETAIL_CONTAINERS = (('data',), ('data', 'data'))
+DETAIL_LIST_KEYS = ('songInfoList', 'song')
+# 歌名、歌曲ID、歌手、专辑各自的候选字段，按优先顺序取第一个存在的
+DETAIL_FIELD_CHOICES = (('name', 'title'), ('mid', 'songId'), ('singer', 'singerName'), ('album', 'albumMid'))
+# fast_json.QQDetailModule 解码成功即为这一结构
+TYPED_DETAIL_FINGERPRINT = 'data.songInfoList:name,mid,singer[],album{}'
+
+
+def detail_fingerprint(module_result: Dict) -> Optional[str]:
+    """
+    GetDetail 模块结果的结构指纹：歌曲列表的位置，以及第一首歌实际使用的字段（数组/对象带 []/{} 标记），
+    例如 'data.songInfoList:name,mid,singer[],album{}'、'data.song:title,songId,singerName,albumMid'
+
+    Returns:
+        指纹；找不到歌曲列表时为 'unknown:<data中的键>'；歌曲列表为空（例如分页越过了榜单末尾）时返回None
+    """
+    found_empty = False
+    for path in DETAIL_CONTAINERS:
+        container = module_result
+        for key in path:
+            container = container.get(key) if isinstance(container, dict) else None
+        if not isinstance(container, dict):
+            continue
+        for list_key in DETAIL_LIST_KEYS:
+            items = container.get(list_key)
+            if not isinstance(items, list):
+                continue
+            if not items:
+                found_empty = True
+                continue
+            first = items[0] if isinstance(items[0], dict) else {}
+            tokens = []
+            for choices in DETAIL_FIELD_CHOICES:
+                for field in choices:
+                    if field in first:
+                        value = first[field]
+                        tokens.append(field + ('[]' if isinstance(value, list) else '{}' if isinstance(value, dict) else ''))
+                        break
+            return f"{'.'.join(path)}.{list_key}:{','.join(tokens)}"
+    if found_empty:
+        return None
+    data = module_result.get('data')
+    return 'unknown:' + (','.join(sorted(data)) if isinstance(data, dict) else '')
+
+
+def compile_detail_extractor(fingerprint: str) -> Optional[Callable[[Dict, int], Tuple[str, List[SongRecord]]]]:
+    """
+    按指纹生成 GetDetail 的提取函数 (模块结果, 偏移) -> (榜单标题, 歌曲列表)
+
+    每个字段的取法在这里决定一次，提取时逐首歌直接按键取值，不再逐个尝试候选字段；
+    某首歌缺少字段时抛出 KeyError/TypeError，由调用方报告。缺少歌名、歌曲ID或歌手时无法提取，返回None。
+    """
+    location, _, tokens = fingerprint.partition(':')
+    if location == 'unknown':
+        return None
+    *path, list_key = location.split('.')
+    fields = set(tokens.split(',')) if tokens else set()
+
+    if 'name' in fields:
+        title_of = itemgetter('name')
+    elif 'title' in fields:
+        title_of = itemgetter('title')
+    else:
+        return None
+    if 'mid' in fields:
+        id_of = itemgetter('mid')
+    elif 'songId' in fields:
+        id_of = itemgetter('songId')
+    else:
+        return None
+    if 'singer[]' in fields:
+        def artist_of(item):
+            return ' & '.join([singer['name'] for singer in item['singer']])
+    elif 'singerName' in fields:
+        artist_of = itemgetter('singerName')
+    else:
+        return None
+    if 'album{}' in fields:
+        # 单曲没有专辑时专辑名和 mid 可能缺失（与 fast_json.QQAlbum 的默认值一致）
+        def album_of(item):
+            return item['album'].get('name', '')
+
+        def album_id_of(item):
+            return item['album'].get('mid') or None
+    else:
+        # data.song 结构中只有专辑 mid，没有专辑名
+        def album_of(item):
+            return ''
+
+        if 'albumMid' in fields:
+            def album_id_of(item):
+                return item['albumMid'] or None
+        else:
+            def album_id_of(item):
+                return None
+
+    def extract(module_result: Dict, offset: int = 0) -> Tuple[str, List[SongRecord]]:
+        html_decode = QQMusicAPI.html_decode
+        container = module_result
+        for key in path:
+            container = container[key]
+        songs = [SongRecord(
+            rank=idx,
+            title=html_decode(title_of(item)),
+            artist=html_decode(artist_of(item)),
+            album=html_decode(album_of(item)),
+            song_id=id_of(item),
+            album_id=album_id_of(item)
+        ) for idx, item in enumerate(container[list_key], offset + 1)]
+        return container.get('title', '未知排行榜'), songs
+
+    return extract
+
+
+class ToplistPageError(RuntimeError):
+    """分页获取榜单时某个窗口失败：已产出的页面只是榜单的一部分，应视为整个榜单获取失败"""
+
+
 class QQMusicAPI:
     """QQ音乐API客户端，用于获取排行榜数据"""
+
+    MUSICU_URL = 'https://u.y.qq.com/cgi-bin/musicu.fcg'
+    COMM = {"cv": 4747474, "ct": 24, "format": "json", "inCharset": "utf-8", "outCharset": "utf-8", "notice": 0, "platform": "yqq.json", "needNewCode": 1, "uin": 0, "g_tk_new_20200303": 5381, "g_tk": 5381}
+    # comm 在每个请求中都相同，只编码一次
+    _COMM_JSON = fast_json.dumps(COMM)
+    # GET请求中 data 参数超过该长度时改用POST，避免URL过长被服务器拒绝
+    MAX_GET_DATA_LENGTH = 1500
+    # 分页获取时每个偏移窗口的歌曲数
+    PAGE_SIZE = 100
     
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, cache: Optional[HttpCache] = None,
+                 transport: Optional[Transport] = None, schema_monitor: Optional[SchemaMonitor] = None):
         """
         初始化QQ音乐API客户端
         
         Args:
             timeout: 请求超时时间（秒）
+            cache: 可选的磁盘HTTP缓存，启用后内容未变化的榜单会带 unchanged=True
+            transport: 共用的HTTP传输层，默认使用进程内共享的 Transport
+            schema_monitor: 榜单响应的结构指纹与告警，默认使用进程内共享的 SchemaMonitor
         """
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Referer': 'https://y.qq.com/'
         }
         self.timeout = timeout
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
+        self.cache = cache
+        # 连接池由 Transport 统一管理，各平台的请求头在每次请求时单独传入
+        self.transport = transport or get_default_transport()
+        self.session = self.transport.session
+        self.schema_monitor = schema_monitor or get_default_schema_monitor()
     
-    def _make_request(self, url: str, params: Optional[Dict] = None) -> Optional[Dict]:
+    def _make_request(self, url: str, params: Optional[Dict] = None,
+                      decode: Optional[Callable[[bytes], Any]] = None) -> Optional[Dict]:
         """
         安全的HTTP请求方法
         
         Args:
             url: 请求URL
             params: 请求参数
+            decode: 响应字节的解码函数，默认 fast_json.loads
             
         Returns:
             响应JSON数据，失败时返回None
         """
         try:
-            response = self.session.get(url, params=params, timeout=self.timeout)
+            response = self.session.get(url, params=params, headers=self.headers, timeout=self.timeout)
             response.raise_for_status()
             
-            if not response.text.strip():
+            if not response.content.strip():
                 print(f"警告: API返回空内容 - {url}")
                 return None
                 
-            return response.json()
+            with get_telemetry().stage('decode'):
+                return (decode or fast_json.loads)(response.content)
         except requests.exceptions.RequestException as e:
             print(f"请求错误: {e} - {url}")
             return None
@@ -60,87 +212,511 @@ class QQMusicAPI:
     
     def get_toplist_period(self, topid: int) -> str:
         """
-        获取排行榜周期信息。
-        对于大多数日常更新的榜单，直接使用当前日期即可。
+        获取排行榜当前最新一期的周期。
+        按 chart_cadence 中配置的更新节奏计算：日榜为发布日期 (YYYY-MM-DD)，
+        周榜为 YYYY_WW；当天尚未到发布时刻时返回上一期。
         
         Args:
-            topid: 排行榜ID (此版本中未使用，但保留以兼容旧接口)
+            topid: 排行榜ID
             
         Returns:
-            当前日期的字符串，格式为 YYYY-MM-DD
+            周期字符串
         """
-        return datetime.now().strftime('%Y-%m-%d')
+        return cadence_for('qq', topid).period_at(datetime.now())
     
-    def get_toplist(self, topid: int, limit: int = 300) -> Optional[Dict[str, Any]]:
+    def _make_post_request(self, url: str, payload: Union[Dict, str],
+                           decode: Optional[Callable[[bytes], Any]] = None) -> Optional[Dict]:
+        """
+        以POST方式发送JSON请求体，用于URL过长的批量请求
+
+        Args:
+            url: 请求URL
+            payload: 请求体字典，或已编码好的JSON文本
+            decode: 响应字节的解码函数，默认 fast_json.loads
+
+        Returns:
+            响应JSON数据，失败时返回None
+        """
+        try:
+            body = payload if isinstance(payload, str) else fast_json.dumps(payload)
+            response = self.session.post(url, data=body, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+
+            if not response.content.strip():
+                print(f"警告: API返回空内容 - {url}")
+                return None
+
+            with get_telemetry().stage('decode'):
+                return (decode or fast_json.loads)(response.content)
+        except requests.exceptions.RequestException as e:
+            print(f"请求错误: {e} - {url}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"JSON解析错误: {e} - {url}")
+            return None
+
+    def _encode_musicu(self, data: Dict) -> str:
+        """编码请求字典；comm 为默认值时复用预先编码好的文本，只编码各模块调用"""
+        if data.get('comm') is not self.COMM:
+            return fast_json.dumps(data)
+        calls = fast_json.dumps({key: call for key, call in data.items() if key != 'comm'})
+        return '{"comm":' + self._COMM_JSON + (',' + calls[1:] if calls != '{}' else '}')
+
+    @staticmethod
+    def _decoder_for(data: Dict) -> Callable[[bytes], Any]:
+        """只含榜单 GetDetail 调用的请求按类型化结构解码（fast_json.decode_qq_detail），其余解码为字典"""
+        calls = [call for key, call in data.items() if key != 'comm']
+        if calls and all(call.get('module') == 'musicToplist.ToplistInfoServer' and call.get('method') == 'GetDetail'
+                         for call in calls):
+            return fast_json.decode_qq_detail
+        return fast_json.loads
+
+    def _request_musicu(self, data: Dict) -> Tuple[Optional[Dict], Optional[CachedResponse]]:
+        """
+        请求 musicu.fcg 接口，请求参数过长时自动改用POST
+
+        Args:
+            data: 包含 comm 及各模块调用的请求字典
+
+        Returns:
+            (响应JSON数据, 缓存响应)，失败时JSON数据为None；未启用缓存时缓存响应为None。
+            GetDetail 模块的结果可能是 fast_json.QQDetailModule 而不是字典
+        """
+        encoded = self._encode_musicu(data)
+        decode = self._decoder_for(data)
+        use_post = len(encoded) > self.MAX_GET_DATA_LENGTH
+        if self.cache is not None:
+            return self._request_musicu_cached(encoded, use_post, decode)
+
+        if use_post:
+            return self._make_post_request(self.MUSICU_URL, encoded, decode), None
+
+        # 移除旧的、复杂的参数构造，使用更简洁的方式
+        params = {
+            '_': str(int(time.time() * 1000)),
+            'data': encoded
+        }
+        return self._make_request(self.MUSICU_URL, params=params, decode=decode), None
+
+    def _request_musicu_cached(self, encoded: str, use_post: bool,
+                               decode: Callable[[bytes], Any]) -> Tuple[Optional[Dict], Optional[CachedResponse]]:
+        """经由磁盘缓存请求 musicu.fcg，防缓存时间戳 `_` 不参与缓存键计算"""
+        try:
+            if use_post:
+                response = self.cache.fetch(self.session, 'POST', self.MUSICU_URL, data=encoded,
+                                            headers=self.headers, timeout=self.timeout)
+            else:
+                params = {'_': str(int(time.time() * 1000)), 'data': encoded}
+                response = self.cache.fetch(self.session, 'GET', self.MUSICU_URL, params=params,
+                                            ignore_params=('_',), headers=self.headers, timeout=self.timeout)
+            if not response.content.strip():
+                print(f"警告: API返回空内容 - {self.MUSICU_URL}")
+                return None, None
+            with get_telemetry().stage('decode'):
+                return self.cache.memoize(response, 'json', lambda: decode(response.content)), response
+        except requests.exceptions.RequestException as e:
+            print(f"请求错误: {e} - {self.MUSICU_URL}")
+            return None, None
+        except json.JSONDecodeError as e:
+            print(f"JSON解析错误: {e} - {self.MUSICU_URL}")
+            return None, None
+
+    def _parse_module(self, module_result: Dict, response: Optional[CachedResponse],
+                      tag: str, offset: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        解析模块结果；启用缓存时内容未变化则复用上次的解析结果，并标记 unchanged
+        """
+        with get_telemetry().stage('parse'):
+            if response is None:
+                return self._parse_toplist(module_result, offset)
+            toplist = self.cache.memoize(response, tag, lambda: self._parse_toplist(module_result, offset))
+        if toplist is not None and not response.changed:
+            toplist = dict(toplist, unchanged=True)
+        return toplist
+
+    def _build_detail_call(self, topid: int, limit: int, offset: int = 0,
+                           period: Optional[str] = None) -> Dict[str, Any]:
+        """构造单个榜单的 ToplistInfoServer.GetDetail 模块调用，period 默认为最新一期"""
+        return {
+            "module": "musicToplist.ToplistInfoServer",
+            "method": "GetDetail",
+            "param": {
+                "topId": topid,
+                "offset": offset,
+                "num": limit,
+                "period": period or self.get_toplist_period(topid)
+            }
+        }
+
+    @staticmethod
+    def _module_code(module_result: Any) -> int:
+        """模块结果中的 code，兼容字典和类型化结构"""
+        if isinstance(module_result, dict):
+            return module_result.get('code', 0)
+        return module_result.code
+
+    def _parse_toplist(self, module_result: Any, offset: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        解析单个 GetDetail 模块调用的返回结果
+
+        响应结构由指纹识别（见 detail_fingerprint），每种结构的提取函数只编译一次；
+        结构变化、无法识别或提取失败时由 schema_monitor 告警，返回None而不是空的或缺字段的歌曲列表。
+
+        Args:
+            module_result: 响应中对应模块键下的字典，或 fast_json.QQDetailModule
+            offset: 该结果在榜单中的起始偏移，用于计算排名
+
+        Returns:
+            包含排行榜信息和歌曲列表的字典，失败时返回None
+        """
+        code = self._module_code(module_result)
+        if code != 0:
+            print(f"排行榜模块返回错误码 {code}")
+            return None
+        if not isinstance(module_result, dict):
+            if module_result.data is not None:
+                # 类型化结构解码成功本身就说明是 songInfoList 结构；空列表（分页越过了榜单末尾）不记录指纹
+                if module_result.data.songInfoList:
+                    self.schema_monitor.observe(DETAIL_ENDPOINT, TYPED_DETAIL_FINGERPRINT)
+                return self._parse_detail_module(module_result, offset)
+            module_result = {'code': code}
+
+        fingerprint = detail_fingerprint(module_result)
+        if fingerprint is None:
+            title = (module_result.get('data') or {}).get('title', '未知排行榜')
+            return {'title': self.html_decode(title), 'songs': []}
+        extract = self.schema_monitor.extractor(DETAIL_ENDPOINT, fingerprint, compile_detail_extractor)
+        if extract is None:
+            return None
+        try:
+            title, songs = extract(module_result, offset)
+        except (KeyError, TypeError, AttributeError) as e:
+            self.schema_monitor.failed(DETAIL_ENDPOINT, fingerprint, e)
+            return None
+        return {
+            'title': self.html_decode(title),
+            'songs': songs
+        }
+
+    def _parse_detail_module(self, module: Any, offset: int = 0) -> Dict[str, Any]:
+        """_parse_toplist 的类型化路径：结构定义保证了字段齐全，直接按属性取值"""
+        html_decode = self.html_decode
+        songs = [SongRecord(
+            rank=idx,
+            title=html_decode(song.name),
+            artist=html_decode(' & '.join([singer.name for singer in song.singer])),
+            album=html_decode(song.album.name),
+            song_id=song.mid,
+            album_id=song.album.mid or None
+        ) for idx, song in enumerate(module.data.songInfoList, offset + 1)]
+        return {
+            'title': html_decode(module.data.title),
+            'songs': songs
+        }
+
+    def get_toplist(self, topid: int, limit: int = 300, period: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         获取排行榜数据
         
         Args:
             topid: 排行榜ID
             limit: 获取歌曲数量限制
+            period: 榜单周期，默认最新一期；传入以前的周期可获取历史榜单
             
         Returns:
             包含排行榜信息和歌曲列表的字典，失败时返回None
         """
-        period = self.get_toplist_period(topid)
-        
-        url = 'https://u.y.qq.com/cgi-bin/musicu.fcg'
         # 请求体现在更规范，直接从浏览器开发者工具中获取
         data = {
-            "comm": {"cv": 4747474, "ct": 24, "format": "json", "inCharset": "utf-8", "outCharset": "utf-8", "notice": 0, "platform": "yqq.json", "needNewCode": 1, "uin": 0, "g_tk_new_20200303": 5381, "g_tk": 5381},
-            "detail": {
-                "module": "musicToplist.ToplistInfoServer",
-                "method": "GetDetail",
-                "param": {
-                    "topId": topid,
-                    "offset": 0,
-                    "num": limit,
-                    "period": period
-                }
-            }
+            "comm": self.COMM,
+            "detail": self._build_detail_call(topid, limit, period=period)
         }
         
-        # 移除旧的、复杂的参数构造，使用更简洁的方式
-        params = {
-            '_': str(int(time.time() * 1000)),
-            'data': json.dumps(data)
-        }
-        
-        result = self._make_request(url, params=params)
+        result, response = self._request_musicu(data)
         if not result:
             return None
         
+        return self._parse_module(result.get('detail', {}), response, 'detail')
+
+    def get_toplists(self, topids: List[int], limit: int = 300,
+                     batch_size: int = 20) -> Dict[int, Optional[Dict[str, Any]]]:
+        """
+        批量获取多个排行榜，每批榜单合并为一次 musicu.fcg 请求
+
+        musicu.fcg 支持在同一个请求体中放入多个命名的模块调用，
+        这里为每个榜单生成 detail_<topId> 键，返回后再按键拆分。
+
+        Args:
+            topids: 排行榜ID列表
+            limit: 每个榜单获取歌曲数量限制
+            batch_size: 每次请求包含的最大榜单数
+
+        Returns:
+            {topid: 排行榜字典}，某个榜单失败时对应的值为None
+        """
+        results: Dict[int, Optional[Dict[str, Any]]] = {}
+        unique_ids = list(dict.fromkeys(topids))
+
+        for start in range(0, len(unique_ids), batch_size):
+            batch = unique_ids[start:start + batch_size]
+            data: Dict[str, Any] = {"comm": self.COMM}
+            for topid in batch:
+                data[f"detail_{topid}"] = self._build_detail_call(topid, limit)
+
+            result, response = self._request_musicu(data)
+            for topid in batch:
+                module_result = result.get(f"detail_{topid}") if result else None
+                if not module_result or self._module_code(module_result) != 0:
+                    print(f"批量请求中榜单 {topid} 获取失败")
+                    results[topid] = None
+                    continue
+                results[topid] = self._parse_module(module_result, response, f"detail_{topid}")
+
+        return results
+    
+    def _fetch_window(self, topid: int, offset: int, num: int) -> Optional[Dict[str, Any]]:
+        """获取榜单中 [offset, offset+num) 这一段，失败时返回None"""
+        data = {
+            "comm": self.COMM,
+            "detail": self._build_detail_call(topid, num, offset)
+        }
+        result, response = self._request_musicu(data)
+        module_result = result.get('detail') if result else None
+        if not module_result or self._module_code(module_result) != 0:
+            return None
+        return self._parse_module(module_result, response, 'detail', offset)
+
+    def iter_toplist_pages(self, topid: int, limit: int = 300, page_size: Optional[int] = None,
+                           max_workers: int = 4) -> Iterator[Dict[str, Any]]:
+        """
+        分页获取排行榜：把榜单拆成多个偏移窗口并行请求，按排名顺序逐页产出
+
+        第一页到达后立即产出，不必等待整个榜单。相邻窗口之间重复的歌曲（请求期间榜单更新导致）
+        会被去掉，排名按合并后的顺序重新编号。某个窗口返回的歌曲数不足一页时说明榜单已到末尾，
+        不再请求之后的窗口。
+
+        Args:
+            topid: 排行榜ID
+            limit: 最多获取的歌曲数
+            page_size: 每个窗口的歌曲数，默认 PAGE_SIZE
+            max_workers: 同时进行的窗口请求数
+
+        Yields:
+            {'title', 'offset', 'songs', 'unchanged'}
+
+        Raises:
+            ToplistPageError: 某个窗口获取失败（包括第一页）；之前产出的页面不完整，调用方应丢弃
+        """
+        page_size = page_size or self.PAGE_SIZE
+        windows = [(offset, min(page_size, limit - offset)) for offset in range(0, limit, page_size)]
+        if not windows:
+            return
+
+        seen = set()
+        rank = 0
+        max_workers = min(max_workers, len(windows))
+        pool = ThreadPoolExecutor(max_workers=max_workers)
         try:
-            toplist_data = result.get('detail', {}).get('data', {})
-            song_info_list = toplist_data.get('songInfoList', [])
-            title = toplist_data.get('title', '未知排行榜')
-            
-            songs = []
-            for idx, song in enumerate(song_info_list, 1):
-                try:
-                    singer_name = ' & '.join([s.get('name', '未知歌手') for s in song.get('singer', [])])
-                    album_name = self.html_decode(song.get('album', {}).get('name', '未知专辑'))
-                    
-                    songs.append({
-                        '排名': idx,
-                        '歌曲名': self.html_decode(song.get('name', '')),
-                        '歌手': self.html_decode(singer_name),
-                        '专辑': album_name,
-                        '歌曲ID': song.get('mid', '')
-                    })
-                except Exception as e:
-                    print(f"解析歌曲信息时出错 (第{idx}首): {e}")
+            # 只让 max_workers 个窗口处于请求中，每消费一个完整的页再提交下一个，提前结束时浪费的请求有限
+            futures = [pool.submit(self._fetch_window, topid, offset, num) for offset, num in windows[:max_workers]]
+            for index, (offset, num) in enumerate(windows):
+                page = futures[index].result()
+                if page is None:
+                    raise ToplistPageError(f"榜单 {topid} 偏移 {offset} 的分页获取失败")
+                # 确认这一页完整后才提交下一个窗口：失败或不足一页时不再多发请求
+                if len(page['songs']) == num and index + max_workers < len(windows):
+                    next_offset, next_num = windows[index + max_workers]
+                    futures.append(pool.submit(self._fetch_window, topid, next_offset, next_num))
+
+                songs = []
+                for song in page['songs']:
+                    key = song['歌曲ID'] or (song['歌曲名'], song['歌手'])
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    rank += 1
+                    songs.append(song.replace(rank=rank))
+
+                yield {
+                    'title': page['title'],
+                    'offset': offset,
+                    'songs': songs,
+                    'unchanged': page.get('unchanged', False)
+                }
+                if len(page['songs']) < num:
+                    return
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_toplist_paginated(self, topid: int, limit: int = 300, page_size: Optional[int] = None,
+                              max_workers: int = 4) -> Optional[Dict[str, Any]]:
+        """
+        分页并行获取排行榜，返回值与 get_toplist 相同
+
+        Args:
+            topid: 排行榜ID
+            limit: 最多获取的歌曲数
+            page_size: 每个窗口的歌曲数，默认 PAGE_SIZE
+            max_workers: 同时进行的窗口请求数
+
+        Returns:
+            包含排行榜信息和歌曲列表的字典，任何一个窗口失败时返回None（不返回截断的榜单）
+        """
+        title = None
+        songs: List[Dict[str, Any]] = []
+        unchanged = True
+        try:
+            for page in self.iter_toplist_pages(topid, limit, page_size, max_workers):
+                title = title or page['title']
+                songs.extend(page['songs'])
+                unchanged = unchanged and page['unchanged']
+        except ToplistPageError as e:
+            print(e)
+            return None
+        if title is None:
+            return None
+
+        toplist: Dict[str, Any] = {'title': title, 'songs': songs}
+        if unchanged:
+            toplist['unchanged'] = True
+        return toplist
+
+    async def get_toplist_async(self, topid: int, limit: int = 300,
+                                period: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        get_toplist 的异步版本，阻塞的HTTP请求放到线程中执行，不会阻塞事件循环
+
+        Args:
+            topid: 排行榜ID
+            limit: 获取歌曲数量限制
+            period: 榜单周期，默认最新一期
+
+        Returns:
+            与 get_toplist 相同
+        """
+        return await asyncio.to_thread(self.get_toplist, topid, limit, period)
+
+    async def get_toplists_async(self, topids: List[int], limit: int = 300,
+                                 batch_size: int = 20) -> Dict[int, Optional[Dict[str, Any]]]:
+        """get_toplists 的异步版本"""
+        return await asyncio.to_thread(self.get_toplists, topids, limit, batch_size)
+
+    def get_album_infos(self, album_mids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        批量获取专辑信息，全部专辑合并为一次 musicu.fcg 请求（每个专辑一个 album_<mid> 模块调用）
+
+        Args:
+            album_mids: 专辑 mid 列表，调用方负责控制每批的数量（见 batch_loader.qq_album_loader）
+
+        Returns:
+            {mid: {'album_id', 'name', 'artist', 'publish_time', 'intro', 'company'}}，失败的专辑对应None
+        """
+        unique_mids = list(dict.fromkeys(album_mids))
+        data: Dict[str, Any] = {"comm": self.COMM}
+        for mid in unique_mids:
+            data[f"album_{mid}"] = {
+                "module": "music.musichallAlbum.AlbumInfoServer",
+                "method": "GetAlbumDetail",
+                "param": {"albumMid": mid}
+            }
+        result, _ = self._request_musicu(data)
+        return {mid: self._parse_album(mid, result.get(f"album_{mid}") if result else None) for mid in unique_mids}
+
+    @classmethod
+    def _parse_album(cls, mid: str, module_result: Optional[Dict]) -> Optional[Dict[str, Any]]:
+        if not module_result or module_result.get('code', 0) != 0:
+            print(f"批量请求中专辑 {mid} 获取失败")
+            return None
+        album = module_result.get('data', {})
+        basic = album.get('basicInfo', {})
+        singers = album.get('singer', {}).get('singerList', [])
+        return {
+            'album_id': mid,
+            'name': cls.html_decode(basic.get('albumName', '')),
+            'artist': cls.html_decode(' & '.join(singer.get('name', '') for singer in singers)),
+            'publish_time': basic.get('publishDate') or None,
+            'intro': cls.html_decode(basic.get('desc', '')),
+            'company': cls.html_decode(album.get('company', {}).get('name', '')),
+        }
+
+    def get_all_toplists(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        通过 ToplistInfoServer.GetAll 获取全部排行榜的目录
+
+        Returns:
+            [{'chart_id', 'name', 'group', 'period', 'update_time', 'intro'}, ...]，失败时返回None
+        """
+        data = {
+            "comm": self.COMM,
+            "toplist": {"module": "musicToplist.ToplistInfoServer", "method": "GetAll", "param": {}}
+        }
+        result, _ = self._request_musicu(data)
+        if not result:
+            return None
+        return self._parse_all_toplists(result.get('toplist', {}))
+
+    @classmethod
+    def _parse_all_toplists(cls, module_result: Dict) -> Optional[List[Dict[str, Any]]]:
+        """解析 GetAll 模块结果，按分组展开为榜单列表"""
+        groups = module_result.get('data', {}).get('group')
+        if not groups:
+            print("解析排行榜目录失败: 响应中没有 group")
+            return None
+        charts = []
+        for group in groups:
+            for toplist in group.get('toplist', []):
+                if not toplist.get('topId'):
                     continue
-            
-            return {
-                'title': self.html_decode(title),
-                'songs': songs
+                charts.append({
+                    'chart_id': int(toplist['topId']),
+                    'name': cls.html_decode(toplist.get('title', '')),
+                    'group': cls.html_decode(group.get('groupName', '')),
+                    'period': toplist.get('period') or None,
+                    'update_time': toplist.get('updateTime') or None,
+                    'intro': cls.html_decode(toplist.get('intro', '')),
+                })
+        return charts
+
+    def search(self, keyword: str, page: int = 1, page_size: int = 20) -> Optional[List[SongRecord]]:
+        """
+        按关键词搜索歌曲（SearchCgiService.DoSearchForQQMusicDesktop）
+
+        Args:
+            keyword: 搜索关键词
+            page: 页码，从1开始
+            page_size: 每页歌曲数
+
+        Returns:
+            歌曲记录列表，排名为在搜索结果中的位置；失败时返回None
+        """
+        data = {
+            "comm": self.COMM,
+            "search": {
+                "module": "music.search.SearchCgiService",
+                "method": "DoSearchForQQMusicDesktop",
+                "param": {"query": keyword, "search_type": 0, "page_num": page, "num_per_page": page_size}
             }
-            
-        except Exception as e:
-            print(f"解析排行榜数据时出错: {e}")
+        }
+        result, _ = self._request_musicu(data)
+        module_result = result.get('search') if result else None
+        if not module_result or module_result.get('code', 0) != 0:
+            print(f"搜索 {keyword} 失败")
             return None
-    
+        with get_telemetry().stage('parse'):
+            return self._parse_search(module_result, (page - 1) * page_size)
+
+    @classmethod
+    def _parse_search(cls, module_result: Dict, offset: int = 0) -> List[SongRecord]:
+        """解析搜索模块结果，结构与榜单中的歌曲相同"""
+        items = module_result.get('data', {}).get('body', {}).get('song', {}).get('list', [])
+        return [SongRecord(
+            rank=idx,
+            title=cls.html_decode(item.get('name', '')),
+            artist=cls.html_decode(' & '.join([s.get('name', '未知歌手') for s in item.get('singer', [])])),
+            album=cls.html_decode(item.get('album', {}).get('name', '')),
+            song_id=item.get('mid', '')
+        ) for idx, item in enumerate(items, offset + 1)]
+
     @staticmethod
     def html_decode(text: str) -> str:
         """HTML解码"""
@@ -149,8 +725,7 @@ class QQMusicAPI:
         return html.unescape(text)
     
     def close(self):
-        """关闭会话"""
-        self.session.close()
+        """会话属于共用的 Transport，这里不关闭连接池，由 Transport.close() 统一关闭"""
 
 def main():
     """主函数，演示API使用"""
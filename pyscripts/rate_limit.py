@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from telemetry import get_telemetry
+
+# 各平台主机的初始请求速率（次/秒），未列出的主机使用 RequestScheduler.default_rate
+HOST_RATES = {
+    'u.y.qq.com': 5.0,
+    'www.kugou.com': 3.0,
+    'music.163.com': 3.0,
+}
+
+
+class TokenBucket:
+    """令牌桶。采用预约方式：令牌不足时先扣成负数，再按差额计算需要等待的时间"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发请求数），默认等于 rate
+            clock: 时钟函数，测试时可替换
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """取一个令牌，返回需要等待的秒数（0 表示可以立即发送）"""
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = rate
+            self.capacity = max(1.0, rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+
+class AdaptiveRateLimiter:
+    """
+    自适应限速（加性增、乘性减）
+
+    - 收到 429/503 等限流响应时立即把速率乘以 decrease_factor
+    - 最近 window 次请求的错误率超过 error_threshold 时同样降速
+    - 连续 window 次成功后速率增加 increase_step，直到 max_rate
+    """
+
+    def __init__(self, rate: float, min_rate: float = 0.2, max_rate: Optional[float] = None,
+                 increase_step: float = 0.5, decrease_factor: float = 0.5, window: int = 20,
+                 error_threshold: float = 0.2, clock: Callable[[], float] = time.monotonic):
+        self.bucket = TokenBucket(rate, clock=clock)
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate * 2
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.window = window
+        self.error_threshold = error_threshold
+        self._outcomes: deque = deque(maxlen=window)
+        self._successes_since_change = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def reserve(self) -> float:
+        return self.bucket.reserve()
+
+    def _decrease(self):
+        self.bucket.set_rate(max(self.min_rate, self.bucket.rate * self.decrease_factor))
+        self._successes_since_change = 0
+        self._outcomes.clear()
+
+    def record(self, success: bool, throttled: bool = False):
+        """
+        反馈一次请求的结果
+
+        Args:
+            success: 请求是否成功
+            throttled: 是否被服务器限流（429/503 或带 Retry-After）
+        """
+        with self._lock:
+            self._outcomes.append(success)
+            if throttled:
+                self._decrease()
+                return
+            if not success:
+                errors = self._outcomes.count(False)
+                if len(self._outcomes) >= self.window // 2 and errors / len(self._outcomes) > self.error_threshold:
+                    self._decrease()
+                self._successes_since_change = 0
+                return
+            self._successes_since_change += 1
+            if self._successes_since_change >= self.window and self.bucket.rate < self.max_rate:
+                self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.increase_step))
+                self._successes_since_change = 0
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动的重试策略，优先遵守服务器的 Retry-After"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0,
+                 retry_statuses=(429, 500, 502, 503, 504), throttle_statuses=(429, 503),
+                 rng: Optional[random.Random] = None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = set(retry_statuses)
+        self.throttle_statuses = set(throttle_statuses)
+        self._rng = rng or random.Random()
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试（从0开始）前的等待秒数：在 [0, min(max_delay, base*2^attempt)] 内随机"""
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """解析 Retry-After 头，支持秒数和HTTP日期两种格式"""
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class RequestScheduler:
+    """
+    按主机限速并负责重试的请求调度器
+
+    每个主机一个自适应令牌桶；失败时按 Retry-After 或指数退避+抖动等待后重试，
+    并把结果反馈给限速器，错误或限流增多时自动降速。
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, host_rates: Optional[Dict[str, float]] = None,
+                 default_rate: float = 5.0, sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            policy: 重试策略
+            host_rates: {主机: 初始速率}，默认 HOST_RATES
+            default_rate: 未配置主机的初始速率（次/秒）
+            sleep: 等待函数，测试时可替换
+            clock: 时钟函数，测试时可替换
+        """
+        self.policy = policy or RetryPolicy()
+        self.host_rates = dict(HOST_RATES if host_rates is None else host_rates)
+        self.default_rate = default_rate
+        self._sleep = sleep
+        self._clock = clock
+        self._limiters: Dict[str, AdaptiveRateLimiter] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def limiter_for(self, host: str) -> AdaptiveRateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = AdaptiveRateLimiter(self.host_rates.get(host, self.default_rate), clock=self._clock)
+                self._limiters[host] = limiter
+                self._counters[host] = {'requests': 0, 'retries': 0, 'throttled': 0, 'errors': 0}
+            return limiter
+
+    def _count(self, host: str, name: str):
+        with self._lock:
+            self._counters[host][name] += 1
+        if name == 'retries':
+            get_telemetry().count('fetch_retries_total', host=host)
+
+    def request(self, session: Any, method: str, url: str, **kwargs):
+        """
+        通过限速和重试发送请求
+
+        Returns:
+            最后一次的响应（可能仍是错误状态码，由调用方 raise_for_status）
+
+        Raises:
+            requests.exceptions.RequestException: 重试用尽后仍然出现网络错误
+        """
+        host = urlsplit(url).hostname or ''
+        limiter = self.limiter_for(host)
+        attempt = 0
+        while True:
+            wait = limiter.reserve()
+            if wait > 0:
+                get_telemetry().record_stage('queue', wait, host=host)
+                self._sleep(wait)
+            self._count(host, 'requests')
+
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                limiter.record(success=False)
+                self._count(host, 'errors')
+                if attempt >= self.policy.max_retries:
+                    raise
+                self._sleep(self.policy.backoff(attempt))
+                attempt += 1
+                self._count(host, 'retries')
+                continue
+
+            status = response.status_code
+            if status not in self.policy.retry_statuses:
+                limiter.record(success=True)
+                return response
+
+            retry_after = self.policy.parse_retry_after(response.headers.get('Retry-After'))
+            throttled = status in self.policy.throttle_statuses or retry_after is not None
+            limiter.record(success=False, throttled=throttled)
+            self._count(host, 'throttled' if throttled else 'errors')
+            # 重试次数用完，或服务器要求等待的时间超过上限时，直接返回该响应
+            if attempt >= self.policy.max_retries or (retry_after or 0) > self.policy.max_delay:
+                return response
+
+            response.close()
+            self._sleep(retry_after if retry_after is not None else self.policy.backoff(attempt))
+            attempt += 1
+            self._count(host, 'retries')
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """每个主机当前的速率和请求/重试/限流/错误计数"""
+        with self._lock:
+            return {host: dict(self._counters[host], rate=round(limiter.rate, 3))
+                    for host, limiter in self._limiters.items()}
+
+
+class ScheduledSession:
+    """包装一个会话，所有请求都经过 RequestScheduler，用法与 requests.Session 相同"""
+
+    def __init__(self, session: Any, scheduler: RequestScheduler):
+        self._session = session
+        self.scheduler = scheduler
+
+    @property
+    def headers(self):
+        return self._session.headers
+
+    def request(self, method: str, url: str, **kwargs):
+        return self.scheduler.request(self._session, method, url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    def close(self):
+        self._session.close()
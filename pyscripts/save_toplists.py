@@ -1,12 +1,13 @@
-import csv
 from qqmusic_optimized import QQMusicAPI
+from http_cache import HttpCache
+from exporters import is_unchanged, write_songs_csv
 import os
 
 def save_toplists_to_csv():
     """
     获取QQ音乐排行榜数据并保存到CSV文件中。
     """
-    qq = QQMusicAPI()
+    qq = QQMusicAPI(cache=HttpCache())
     
     toplists = {
         "飙升榜": 62,
@@ -21,19 +22,24 @@ def save_toplists_to_csv():
         print(f"创建目录: {output_dir}")
         
     try:
+        # 所有榜单合并为一次批量请求
+        print(f"--- 正在批量获取 {len(toplists)} 个榜单 ---")
+        results = qq.get_toplists(list(toplists.values()), limit=300)
+
         for name, topid in toplists.items():
-            print(f"--- 正在获取 {name} (ID: {topid}) ---")
-            result = qq.get_toplist(topid, limit=300)
+            print(f"--- {name} (ID: {topid}) ---")
+            result = results.get(topid)
             
             if result and result['songs']:
                 filename = os.path.join(output_dir, f"{name}.csv")
                 headers = ['排名', '歌曲名', '歌手', '专辑']
+                if is_unchanged(result, filename):
+                    print(f"榜单内容未变化，跳过写入 {filename}")
+                    print("\n" + "="*50 + "\n")
+                    continue
                 
                 try:
-                    with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
-                        writer = csv.DictWriter(f, fieldnames=headers, extrasaction='ignore')
-                        writer.writeheader()
-                        writer.writerows(result['songs'])
+                    write_songs_csv(filename, result['songs'], headers)
                     print(f"成功将 {len(result['songs'])} 首歌曲保存到 {filename}")
                 except IOError as e:
                     print(f"写入文件时出错: {e}")
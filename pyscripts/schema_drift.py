@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+响应结构指纹与结构变化告警
+
+平台接口会在不通知的情况下改版，例如QQ音乐 GetDetail 的歌曲列表有过三种形态：
+data.songInfoList（singer 数组、album 对象）、data.song（singerName/title/songId），
+以及更早多嵌套一层的 data.data.song。逐首歌 try/.get() 兜底既慢，改版后又会悄悄产出空行或缺字段的行。
+
+SchemaMonitor 把"识别结构"和"提取数据"分开：
+- 调用方为每个响应计算一次指纹：一个描述歌曲列表位置和所用字段是否存在的短字符串
+- 每个 (接口, 指纹) 只编译一次提取函数并缓存，之后同结构的响应直接走这个函数，逐首歌不再判断
+- 接口的指纹与上次不同、出现无法识别的结构、或编译好的提取函数执行失败时发出告警
+  （默认打印，并计入 fetch_schema_drift_total），不产出降级的数据
+
+默认只在内存中记录指纹；配置了状态文件时（例如 async_fetcher.py --schema-state=schema_fingerprints.json）
+每个接口最近一次的指纹保存在该文件中，重启后仍能发现两次运行之间的变化。
+"""
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from telemetry import get_telemetry
+
+# 提取函数的参数与返回值由调用方约定
+Extractor = Callable[..., Any]
+# 指纹 -> 提取函数，无法识别的结构返回None
+Compiler = Callable[[str], Optional[Extractor]]
+
+
+class SchemaAlert(NamedTuple):
+    """一次结构告警"""
+    endpoint: str
+    # changed: 指纹与上次不同；unknown: 无法识别的结构；failed: 提取函数执行失败
+    kind: str
+    fingerprint: str
+    previous: Optional[str] = None
+    detail: str = ''
+
+
+def print_alert(alert: SchemaAlert):
+    """默认的告警方式：打印到控制台"""
+    if alert.kind == 'changed':
+        print(f"[结构告警] {alert.endpoint} 的响应结构发生变化: {alert.previous} -> {alert.fingerprint}")
+    elif alert.kind == 'unknown':
+        print(f"[结构告警] {alert.endpoint} 返回了无法识别的结构: {alert.fingerprint}")
+    else:
+        print(f"[结构告警] {alert.endpoint} 按结构 {alert.fingerprint} 提取失败: {alert.detail}")
+
+
+class SchemaMonitor:
+    """按接口记录响应结构指纹，缓存每种结构编译出的提取函数，线程安全"""
+
+    def __init__(self, path: Optional[str] = None,
+                 on_alert: Optional[Callable[[SchemaAlert], None]] = print_alert, max_alerts: int = 100):
+        """
+        Args:
+            path: 保存各接口最近指纹的文件，默认None，只在内存中使用
+            on_alert: 告警回调，None 表示只计数不通知
+            max_alerts: alerts 中保留的最近告警数
+        """
+        self.path = path
+        self.on_alert = on_alert
+        self._lock = threading.Lock()
+        self._last: Dict[str, str] = {}
+        self._extractors: Dict[Tuple[str, str], Optional[Extractor]] = {}
+        self.alerts: Deque[SchemaAlert] = deque(maxlen=max_alerts)
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._last.update(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    def _save(self):
+        """在持有锁时调用，只在指纹变化时写盘"""
+        if not self.path:
+            return
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._last, f, ensure_ascii=False, indent=2)
+        os.replace(self.path + '.tmp', self.path)
+
+    def _alert(self, alert: SchemaAlert):
+        get_telemetry().count('fetch_schema_drift_total', endpoint=alert.endpoint, kind=alert.kind)
+        with self._lock:
+            self.alerts.append(alert)
+        if self.on_alert is not None:
+            self.on_alert(alert)
+
+    def observe(self, endpoint: str, fingerprint: str) -> bool:
+        """
+        记录接口本次响应的指纹，与上次不同时告警
+
+        Returns:
+            指纹是否发生了变化（第一次见到该接口不算变化）
+        """
+        with self._lock:
+            previous = self._last.get(endpoint)
+            if previous == fingerprint:
+                return False
+            self._last[endpoint] = fingerprint
+            self._save()
+        if previous is None:
+            return False
+        self._alert(SchemaAlert(endpoint, 'changed', fingerprint, previous))
+        return True
+
+    def extractor(self, endpoint: str, fingerprint: str, compile: Compiler) -> Optional[Extractor]:
+        """
+        记录指纹并返回该结构的提取函数，每种结构只编译一次
+
+        Args:
+            endpoint: 接口名称，例如 'qq.toplist_detail'
+            fingerprint: 本次响应的结构指纹
+            compile: 由指纹编译提取函数，无法识别时返回None
+
+        Returns:
+            提取函数；结构无法识别时返回None（只在第一次遇到时告警）
+        """
+        self.observe(endpoint, fingerprint)
+        key = (endpoint, fingerprint)
+        with self._lock:
+            if key in self._extractors:
+                return self._extractors[key]
+        extractor = compile(fingerprint)
+        with self._lock:
+            self._extractors[key] = extractor
+        if extractor is None:
+            self._alert(SchemaAlert(endpoint, 'unknown', fingerprint))
+        return extractor
+
+    def failed(self, endpoint: str, fingerprint: str, error: Exception):
+        """报告提取函数执行失败：指纹相同但个别条目的结构不一致"""
+        self._alert(SchemaAlert(endpoint, 'failed', fingerprint, detail=repr(error)))
+
+    def fingerprints(self) -> Dict[str, str]:
+        """各接口最近一次的指纹"""
+        with self._lock:
+            return dict(self._last)
+
+    def recent_alerts(self) -> List[SchemaAlert]:
+        with self._lock:
+            return list(self.alerts)
+
+
+_default_monitor: Optional[SchemaMonitor] = None
+
+
+def get_default_schema_monitor() -> SchemaMonitor:
+    """获取进程内共享的 SchemaMonitor（只在内存中记录指纹，不写盘）"""
+    global _default_monitor
+    if _default_monitor is None:
+        _default_monitor = SchemaMonitor()
+    return _default_monitor
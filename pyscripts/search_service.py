@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+跨平台歌曲搜索服务
+
+一次搜索同时向QQ音乐、酷狗和网易云发出请求，结果经 song_identity 的歌名/歌手归一化
+合并为同一首歌，按倒数排名融合 (RRF) 排序：在多个平台都排得靠前的歌曲排在最前面。
+
+- 查询结果按 (归一化关键词, 页码) 缓存在带 TTL 的 LRU 中，仪表盘重复搜索直接命中内存
+- 返回一页后在后台预取下一页；同一页正在请求时，后来的调用等待这次请求而不是重复发出
+- 某个平台失败时返回其余平台的结果，这样的结果只缓存较短的时间
+
+用法: python search_service.py 关键词 [页码]
+"""
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from kugou_fixed import KugouAPI
+from netease_fetcher import search_songs as search_netease
+from qqmusic_optimized import QQMusicAPI
+from song_identity import SongIdentityIndex
+from song_record import SongRecord
+from transport import Transport, get_default_transport
+
+PLATFORMS = ('qq', 'kugou', 'netease')
+# 倒数排名融合的平滑常数，越大则各平台内的名次差异影响越小
+RRF_K = 60
+
+# (关键词, 页码, 每页数量) -> 歌曲记录列表，失败时返回None
+Searcher = Callable[[str, int, int], Optional[List[SongRecord]]]
+
+
+class SearchHit(NamedTuple):
+    """合并后的一条搜索结果"""
+    canonical_id: str
+    title: str
+    artist: str
+    album: str
+    score: float
+    # 平台 -> 该平台结果中排名最高的记录
+    sources: Dict[str, SongRecord]
+
+
+class _Entry(NamedTuple):
+    expires_at: float
+    hits: List[SearchHit]
+    # 至少一个平台返回了整页，可能还有下一页
+    has_more: bool
+
+
+def normalize_query(keyword: str) -> str:
+    """缓存键使用的关键词：统一全半角、大小写和空白"""
+    return ' '.join(unicodedata.normalize('NFKC', keyword).casefold().split())
+
+
+def default_searchers(transport: Optional[Transport] = None) -> Dict[str, Searcher]:
+    """三个平台客户端的搜索函数，共用同一个 Transport"""
+    transport = transport or get_default_transport()
+    return {
+        'qq': QQMusicAPI(transport=transport).search,
+        'kugou': KugouAPI(transport=transport).search,
+        'netease': partial(search_netease, transport=transport),
+    }
+
+
+def merge_results(results: Dict[str, List[SongRecord]], identity: SongIdentityIndex,
+                  k: int = RRF_K) -> List[SearchHit]:
+    """
+    把各平台的搜索结果合并为同一首歌，按倒数排名融合打分
+
+    Args:
+        results: 平台 -> 该平台的搜索结果（按排名）
+        identity: 跨平台歌曲身份索引
+        k: RRF 平滑常数
+
+    Returns:
+        按得分从高到低排列的搜索结果
+    """
+    groups: Dict[str, List] = {}
+    for platform in PLATFORMS:
+        for song in results.get(platform) or ():
+            canonical_id = identity.resolve(platform, song)
+            group = groups.get(canonical_id)
+            if group is None:
+                # [得分, 最高名次, 来源]
+                group = groups[canonical_id] = [0.0, song.rank, {}]
+            sources = group[2]
+            if platform in sources:
+                # 同一平台的其它版本（翻唱、Live 等归一化后相同）只计一次
+                continue
+            sources[platform] = song
+            group[0] += 1.0 / (k + song.rank)
+            group[1] = min(group[1], song.rank)
+
+    hits = []
+    for canonical_id, (score, _, sources) in groups.items():
+        # 展示字段取名次最高的来源
+        best = min(sources.values(), key=lambda song: song.rank)
+        hits.append(SearchHit(canonical_id, best.title, best.artist, best.album, score, sources))
+    hits.sort(key=lambda hit: (-hit.score, min(song.rank for song in hit.sources.values())))
+    return hits
+
+
+class SearchService:
+    """并行搜索三个平台并缓存合并后的结果"""
+
+    def __init__(self, searchers: Optional[Dict[str, Searcher]] = None,
+                 identity: Optional[SongIdentityIndex] = None, page_size: int = 20,
+                 cache_size: int = 256, ttl: float = 300, error_ttl: float = 30,
+                 prefetch: bool = True, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            searchers: 平台 -> 搜索函数，默认使用三个平台客户端的 search
+            identity: 跨平台歌曲身份索引，默认为只在内存中使用的新索引
+            page_size: 每个平台每页的歌曲数
+            cache_size: 缓存的查询页数上限，超出后淘汰最久未使用的
+            ttl: 结果缓存秒数
+            error_ttl: 有平台失败时结果的缓存秒数
+            prefetch: 返回一页后是否在后台预取下一页
+            clock: 时钟函数，测试时可替换
+        """
+        self.searchers = searchers if searchers is not None else default_searchers()
+        self.identity = identity or SongIdentityIndex(None)
+        self.page_size = page_size
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.prefetch = prefetch
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[Tuple[str, int], _Entry]' = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], Future] = {}
+        # 平台请求和预取分开两个线程池：预取任务会等待平台请求，放在同一个池里可能互相占满
+        self._executor = ThreadPoolExecutor(max_workers=len(self.searchers) * 2)
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        self._closed = False
+        self._stats = {'cache_hits': 0, 'misses': 0, 'prefetched': 0, 'joined': 0}
+
+    def search(self, keyword: str, page: int = 1) -> List[SearchHit]:
+        """
+        搜索一页结果
+
+        Args:
+            keyword: 搜索关键词
+            page: 页码，从1开始
+
+        Returns:
+            合并排序后的搜索结果；所有平台都失败时返回空列表
+        """
+        key = (normalize_query(keyword), page)
+        with self._lock:
+            entry = self._get_cached(key)
+            if entry is not None:
+                self._stats['cache_hits'] += 1
+                future = None
+            else:
+                future = self._inflight.get(key)
+                owner = future is None
+                if owner:
+                    future = self._inflight[key] = Future()
+                    self._stats['misses'] += 1
+                else:
+                    self._stats['joined'] += 1
+
+        if entry is None:
+            if owner:
+                entry = self._fetch(key, keyword, future)
+            else:
+                entry = future.result()
+        if entry is not None and entry.has_more and self.prefetch:
+            self._schedule_prefetch((key[0], page + 1), keyword)
+        return entry.hits if entry is not None else []
+
+    def _get_cached(self, key: Tuple[str, int]) -> Optional[_Entry]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= self.clock():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry
+
+    def _fetch(self, key: Tuple[str, int], keyword: str, future: Future) -> Optional[_Entry]:
+        """并行请求各平台并写入缓存；结果通过 future 交给同时在等待这一页的调用"""
+        entry = None
+        try:
+            entry = self._search_platforms(keyword, key[1])
+            if entry is not None:
+                with self._lock:
+                    self._cache[key] = entry
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_result(entry)
+        return entry
+
+    def _search_platforms(self, keyword: str, page: int) -> Optional[_Entry]:
+        futures = {platform: self._executor.submit(self._search_one, searcher, keyword, page)
+                   for platform, searcher in self.searchers.items()}
+        results = {platform: future.result() for platform, future in futures.items()}
+        succeeded = {platform: songs for platform, songs in results.items() if songs is not None}
+        if not succeeded:
+            return None
+        failed = len(succeeded) < len(results)
+        ttl = self.error_ttl if failed else self.ttl
+        has_more = any(len(songs) >= self.page_size for songs in succeeded.values())
+        return _Entry(self.clock() + ttl, merge_results(succeeded, self.identity), has_more)
+
+    def _search_one(self, searcher: Searcher, keyword: str, page: int) -> Optional[List[SongRecord]]:
+        try:
+            return searcher(keyword, page, self.page_size)
+        except Exception as e:
+            print(f"搜索 {keyword} 时出错: {e}")
+            return None
+
+    def _schedule_prefetch(self, key: Tuple[str, int], keyword: str):
+        with self._lock:
+            if self._closed or key in self._inflight or self._get_cached(key) is not None:
+                return
+            future = self._inflight[key] = Future()
+            self._stats['prefetched'] += 1
+            task = self._prefetcher.submit(self._fetch, key, keyword, future)
+        # 预取在开始前被取消（close）时 _fetch 不会执行，由这里结束等待这一页的调用
+        task.add_done_callback(lambda task: task.cancelled() and self._abandon(key, future))
+
+    def _abandon(self, key: Tuple[str, int], future: Future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_result(None)
+
+    def stats(self) -> Dict[str, int]:
+        """缓存命中、未命中、预取次数，以及等待进行中请求的次数"""
+        with self._lock:
+            return dict(self._stats, cached_pages=len(self._cache))
+
+    def close(self):
+        """关闭线程池：尚未开始的预取被取消，正在等待这些页的调用得到空结果，不会一直阻塞"""
+        with self._lock:
+            self._closed = True
+        self._prefetcher.shutdown(wait=True, cancel_futures=True)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    keyword = sys.argv[1]
+    page = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    service = SearchService()
+    try:
+        for attempt in ('首次', '再次'):
+            start = time.perf_counter()
+            hits = service.search(keyword, page)
+            print(f"{attempt}搜索耗时 {(time.perf_counter() - start) * 1000:.2f} 毫秒，{len(hits)} 条结果")
+        for i, hit in enumerate(hits[:20], 1):
+            platforms = ' '.join(f"{platform}#{song.rank}" for platform, song in hit.sources.items())
+            print(f"{i:>3}. {hit.title} - {hit.artist}  [{platforms}]")
+        print(f"缓存统计: {service.stats()}")
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from chart_diff import song_key
+from song_record import CANONICAL_ID_FIELD, with_canonical_id
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'song_identity.json')
+
+try:
+    import opencc
+    _t2s = opencc.OpenCC('t2s').convert
+except ImportError:
+    _t2s = None
+
+# 未安装 opencc 时使用的简易繁简对照（仅覆盖歌名、歌手名中的常见字）
+_T2S_TABLE = str.maketrans(
+    '愛個們說聽戀夢風時對無會來這過還後開讓嗎為與長東裡離見幾歲淚邊關於記憶憂傷願問樂歡聲覺燈鐘晝雲電'
+    '陽華飛萬氣發鄉頭實樹紅綠藍別單雙將間當給從誰難寫語讀詩畫劍龍鳳鳥馬魚親媽隻錯體歸獨戰勝國謝麗嘆聞'
+    '憐蕭陳張劉黃楊趙吳鄭週蘇韓馮葉鄧許羅偉轉變熱傑倫輝潔賢鋒濤聖義順號碼裝鐵銀錢鏡陣貝買賣顏嗚戲劇場'
+    '雖藝術湯燒島廣遠門題線壞響鬧鬥',
+    '爱个们说听恋梦风时对无会来这过还后开让吗为与长东里离见几岁泪边关于记忆忧伤愿问乐欢声觉灯钟昼云电'
+    '阳华飞万气发乡头实树红绿蓝别单双将间当给从谁难写语读诗画剑龙凤鸟马鱼亲妈只错体归独战胜国谢丽叹闻'
+    '怜萧陈张刘黄杨赵吴郑周苏韩冯叶邓许罗伟转变热杰伦辉洁贤锋涛圣义顺号码装铁银钱镜阵贝买卖颜呜戏剧场'
+    '虽艺术汤烧岛广远门题线坏响闹斗',
+)
+
+# 括号内的版本标注，例如 (Live)、（伴奏）、[Remix]、【DJ版】
+_BRACKET_RE = re.compile(r'\([^()]*\)|\[[^\[\]]*\]|【[^【】]*】|<[^<>]*>')
+# 歌名中的合作标注，例如 "xxx feat. yyy"、"xxx ft.yyy"
+_FEAT_RE = re.compile(r'\s*\b(?:feat\.?|ft\.|featuring)\s.*$', re.IGNORECASE)
+# 歌手分隔符：QQ 用 ' & '，网易云用 ' / '，酷狗常见 '、'
+_ARTIST_SPLIT_RE = re.compile(r'\s*(?:&|/|、|,|;|\bfeat\.?|\bft\.|\bwith\b|\bx\b|×)\s*', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def to_simplified(text: str) -> str:
+    if _t2s is not None:
+        return _t2s(text)
+    return text.translate(_T2S_TABLE)
+
+
+def _base_normalize(text: str) -> str:
+    # NFKC 统一全角/半角（全角括号、字母、数字都会转成半角）
+    text = unicodedata.normalize('NFKC', text or '')
+    return to_simplified(text).lower()
+
+
+def normalize_title(title: str) -> str:
+    """歌名归一化：全半角、繁简、大小写，去掉括号版本标注和 feat. 部分"""
+    text = _base_normalize(title)
+    stripped = _FEAT_RE.sub('', _BRACKET_RE.sub(' ', text))
+    stripped = _SPACE_RE.sub(' ', stripped).strip()
+    # 整个歌名都在括号里时保留原文
+    return stripped or _SPACE_RE.sub(' ', text).strip()
+
+
+def normalize_artists(artists: str) -> FrozenSet[str]:
+    """歌手归一化为集合，兼容各平台不同的分隔符和 feat. 写法"""
+    text = _BRACKET_RE.sub(' ', _base_normalize(artists))
+    names = (_SPACE_RE.sub(' ', name).strip() for name in _ARTIST_SPLIT_RE.split(text))
+    return frozenset(name for name in names if name)
+
+
+def _make_canonical_id(title: str, artists: FrozenSet[str]) -> str:
+    material = title + '\t' + '\t'.join(sorted(artists))
+    return hashlib.sha1(material.encode('utf-8')).hexdigest()[:16]
+
+
+class SongIdentityIndex:
+    """
+    跨平台歌曲身份索引
+
+    以归一化歌名作为桶键，同一个桶内歌手集合有交集即视为同一首歌，
+    因此整体匹配是近线性的，不需要两两比较。
+    (平台, 平台歌曲ID) -> 标准ID 的映射持久化在磁盘上，保证标准ID在多次运行之间稳定。
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_INDEX_PATH):
+        """
+        Args:
+            path: 索引文件路径，None 表示只在内存中使用
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # "平台:歌曲ID" -> 标准ID
+        self._members: Dict[str, str] = {}
+        # 标准ID -> (归一化歌名, 歌手集合)
+        self._canonical: Dict[str, Tuple[str, FrozenSet[str]]] = {}
+        # 归一化歌名 -> [标准ID, ...]
+        self._buckets: Dict[str, List[str]] = {}
+        self._dirty = False
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        for canonical_id, (title, artists) in data.get('canonical', {}).items():
+            self._add_canonical(canonical_id, title, frozenset(artists))
+        self._members.update(data.get('members', {}))
+
+    def save(self):
+        """把索引写回磁盘"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                'canonical': {cid: [title, sorted(artists)] for cid, (title, artists) in self._canonical.items()},
+                'members': self._members,
+            }
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(self.path + '.tmp', self.path)
+            self._dirty = False
+
+    def _add_canonical(self, canonical_id: str, title: str, artists: FrozenSet[str]):
+        self._canonical[canonical_id] = (title, artists)
+        self._buckets.setdefault(title, []).append(canonical_id)
+
+    def _match(self, title: str, artists: FrozenSet[str]) -> str:
+        for canonical_id in self._buckets.get(title, ()):
+            known_title, known_artists = self._canonical[canonical_id]
+            if not artists or not known_artists or artists & known_artists:
+                # 合并歌手集合，后续以其它写法出现的合作歌手也能匹配上
+                if not artists <= known_artists:
+                    self._canonical[canonical_id] = (known_title, known_artists | artists)
+                return canonical_id
+
+        canonical_id = _make_canonical_id(title, artists)
+        while canonical_id in self._canonical:
+            canonical_id = hashlib.sha1(canonical_id.encode('utf-8')).hexdigest()[:16]
+        self._add_canonical(canonical_id, title, artists)
+        return canonical_id
+
+    def resolve(self, platform: str, song: Dict[str, Any]) -> str:
+        """返回歌曲的标准ID，必要时新建"""
+        member_key = f"{platform}:{song_key(song, platform)}"
+        with self._lock:
+            canonical_id = self._members.get(member_key)
+            if canonical_id is None:
+                title = normalize_title(song.get('歌曲名') or '')
+                artists = normalize_artists(song.get('歌手') or '')
+                canonical_id = self._match(title, artists)
+                self._members[member_key] = canonical_id
+                self._dirty = True
+            return canonical_id
+
+    def annotate(self, platform: str, songs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """为每首歌附加标准ID字段 (标准ID)，原地替换列表中的元素并返回同一个列表"""
+        for i, song in enumerate(songs):
+            songs[i] = with_canonical_id(song, self.resolve(platform, song))
+        return songs
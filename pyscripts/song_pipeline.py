@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+流式歌曲处理管线：解析出一首歌就往下游传递一首，不在内存中构建完整的歌曲列表
+
+    解码(source) -> 规范化(normalize) -> 补充(enrich) -> 去重(dedupe) -> 输出(sinks)
+
+每个阶段都是 "记录迭代器 -> 记录迭代器" 的生成器函数，可以自由组合；
+同一条记录会同时写入所有输出（CSV、JSON Lines、SQLite）。
+多个榜单、多个周期串联成一个流时内存占用保持不变，第一行也能更早写出。
+
+用法: python song_pipeline.py  （抓取所有默认榜单，输出CSV和 datasets/songs.jsonl）
+"""
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from chart_diff import song_key
+from exporters import CSV_DIRS, CSV_HEADERS, OPTIONAL_ID_HEADERS
+from kugou_fixed import KugouAPI
+from netease_fetcher import iter_toplist_songs as iter_netease_songs
+from qqmusic_optimized import QQMusicAPI
+from song_identity import CANONICAL_ID_FIELD, SongIdentityIndex
+from song_record import with_canonical_id
+from transport import Transport
+
+Record = Dict[str, Any]
+Stage = Callable[[Iterable[Record]], Iterator[Record]]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 规范化后每条记录的字段（JSON Lines 与数据库使用），原始平台行保存在 'row' 中供CSV使用
+RECORD_FIELDS = ('platform', 'chart_id', 'chart_name', 'period', 'rank', 'song_id',
+                 'title', 'artist', 'album', 'canonical_id')
+
+
+# --- 解码：各平台的流式数据源 ---
+
+def _wrap(platform: str, chart_id: Any, chart_name: str, period: Optional[str],
+          rows: Iterable[Dict[str, Any]]) -> Iterator[Record]:
+    period = period or datetime.now().strftime('%Y-%m-%d')
+    for row in rows:
+        yield {'platform': platform, 'chart_id': chart_id, 'chart_name': chart_name, 'period': period, 'row': row}
+
+
+def qq_source(api: QQMusicAPI, topid: int, chart_name: str, limit: int = 300,
+              period: Optional[str] = None) -> Iterator[Record]:
+    """QQ音乐榜单，按偏移窗口分页获取，每页到达后立即产出；某个窗口失败时抛出 ToplistPageError"""
+    pages = api.iter_toplist_pages(topid, limit)
+    return _wrap('qq', topid, chart_name, period, (song for page in pages for song in page['songs']))
+
+
+def kugou_source(api: KugouAPI, rank_id: int, chart_name: str,
+                 period: Optional[str] = None) -> Iterator[Record]:
+    """酷狗榜单，边下载页面边解析 global.features；页面流中途失败时抛出 ToplistStreamError"""
+    return _wrap('kugou', rank_id, chart_name, period, api.iter_toplist_songs(rank_id))
+
+
+def netease_source(chart_id: int, chart_name: str, transport: Optional[Transport] = None,
+                   period: Optional[str] = None) -> Iterator[Record]:
+    """网易云榜单；未内联的歌曲补全失败时抛出 HydrationError"""
+    return _wrap('netease', chart_id, chart_name, period, iter_netease_songs(chart_id, transport))
+
+
+# --- 处理阶段 ---
+
+def normalize(records: Iterable[Record]) -> Iterator[Record]:
+    """把各平台不同的字段统一为 RECORD_FIELDS，原始行保留在 'row'"""
+    for record in records:
+        row = record['row']
+        record['rank'] = int(row.get('排名') or 0)
+        record['song_id'] = song_key(row, record['platform'])
+        record['title'] = row.get('歌曲名') or ''
+        record['artist'] = row.get('歌手') or ''
+        record['album'] = row.get('专辑') or ''
+        yield record
+
+
+def enrich(identity: SongIdentityIndex) -> Stage:
+    """补充跨平台标准ID（同时写入原始行的 标准ID 列）"""
+    def stage(records: Iterable[Record]) -> Iterator[Record]:
+        for record in records:
+            canonical_id = identity.resolve(record['platform'], record['row'])
+            record['canonical_id'] = canonical_id
+            record['row'] = with_canonical_id(record['row'], canonical_id)
+            yield record
+    return stage
+
+
+def dedupe(fields: Sequence[str] = ('platform', 'chart_id', 'period', 'song_id')) -> Stage:
+    """按给定字段去重，只保留第一次出现的记录。只记住键本身，不保留记录"""
+    def stage(records: Iterable[Record]) -> Iterator[Record]:
+        seen = set()
+        for record in records:
+            key = tuple(record.get(field) for field in fields)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield record
+    return stage
+
+
+# --- 输出 ---
+
+class Sink:
+    """管线输出的基类，子类实现 write 逐条写入"""
+
+    def write(self, record: Record):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """数据源中途失败时代替 close 调用：丢弃当前榜单已写入的部分，之前写完的榜单保留"""
+        self.close()
+
+
+class CsvSink(Sink):
+    """
+    按榜单写CSV，文件路径和列与 CsvExporter 相同
+
+    同一时刻只打开一个文件：记录属于新榜单时关闭上一个文件。
+    先写到临时文件，榜单写完（切换榜单或关闭时）再替换正式文件，写入过程中原有CSV保持完整可读；
+    中途失败 (abort) 时删除临时文件，原有CSV不变。
+    """
+
+    def __init__(self, output_root: str, song_ids: bool = False):
+        self.output_root = output_root
+        self.song_ids = song_ids
+        self._chart: Optional[Tuple[str, str]] = None
+        self._file = None
+        self._writer: Optional[csv.DictWriter] = None
+        self._path: Optional[str] = None
+
+    def _open(self, record: Record):
+        self._finish()
+        output_dir = os.path.join(self.output_root, CSV_DIRS[record['platform']])
+        os.makedirs(output_dir, exist_ok=True)
+        self._path = os.path.join(output_dir, f"{record['chart_name']}.csv")
+        headers = CSV_HEADERS[record['platform']]
+        if self.song_ids and record['platform'] in OPTIONAL_ID_HEADERS:
+            headers = headers + [OPTIONAL_ID_HEADERS[record['platform']]]
+        if CANONICAL_ID_FIELD in record['row']:
+            headers = headers + [CANONICAL_ID_FIELD]
+        self._file = open(self._path + '.tmp', 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.DictWriter(self._file, fieldnames=headers, extrasaction='ignore')
+        self._writer.writeheader()
+        self._chart = (record['platform'], record['chart_name'])
+
+    def _finish(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._path + '.tmp', self._path)
+        self._file = None
+
+    def write(self, record: Record):
+        if (record['platform'], record['chart_name']) != self._chart:
+            self._open(record)
+        self._writer.writerow(record['row'])
+
+    def close(self):
+        self._finish()
+
+    def abort(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.remove(self._path + '.tmp')
+        self._file = None
+
+
+def _chart_of(record: Record) -> Tuple:
+    return record['platform'], record['chart_id'], record['period']
+
+
+class JsonLinesSink(Sink):
+    """每条记录一行JSON（只包含 RECORD_FIELDS），追加写入；中途失败时截掉当前榜单已追加的行"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._chart: Optional[Tuple] = None
+        self._chart_start = self._file.tell()
+
+    def write(self, record: Record):
+        if _chart_of(record) != self._chart:
+            self._chart = _chart_of(record)
+            self._chart_start = self._file.tell()
+        self._file.write(json.dumps({field: record.get(field) for field in RECORD_FIELDS}, ensure_ascii=False))
+        self._file.write('\n')
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        self._file.truncate(self._chart_start)
+        self._file.close()
+
+
+class SqliteSink(Sink):
+    """
+    写入 SQLite 表，按 (平台, 榜单, 周期, 排名) 覆盖
+
+    每 batch_size 条批量写入一次，每个榜单写完（切换榜单或关闭时）才提交；中途失败 (abort) 时回滚当前榜单。
+    """
+
+    def __init__(self, path: str, table: str = 'chart_songs', batch_size: int = 500):
+        self._conn = sqlite3.connect(path)
+        self._table = table
+        self._batch_size = batch_size
+        self._batch: List[Tuple] = []
+        self._chart: Optional[Tuple] = None
+        columns = ', '.join(f"{field} {'INTEGER' if field == 'rank' else 'TEXT'}" for field in RECORD_FIELDS)
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns}, "
+                           f"PRIMARY KEY (platform, chart_id, period, rank))")
+        placeholders = ', '.join('?' for _ in RECORD_FIELDS)
+        self._insert = f"INSERT OR REPLACE INTO {table} ({', '.join(RECORD_FIELDS)}) VALUES ({placeholders})"
+
+    def _flush(self):
+        if self._batch:
+            self._conn.executemany(self._insert, self._batch)
+            self._batch = []
+
+    def write(self, record: Record):
+        if _chart_of(record) != self._chart:
+            self._flush()
+            self._conn.commit()
+            self._chart = _chart_of(record)
+        self._batch.append(tuple(str(record[field]) if field == 'chart_id' else record.get(field)
+                                 for field in RECORD_FIELDS))
+        if len(self._batch) >= self._batch_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._conn.commit()
+        self._conn.close()
+
+    def abort(self):
+        self._batch = []
+        self._conn.rollback()
+        self._conn.close()
+
+
+# --- 组合 ---
+
+class Pipeline:
+    """
+    把数据源和若干处理阶段串起来，再分发给多个输出
+
+    例如:
+        Pipeline(chain_sources(sources)).pipe(normalize).pipe(dedupe()).run([CsvSink(root)])
+    """
+
+    def __init__(self, source: Iterable[Record]):
+        self._stream: Iterable[Record] = source
+
+    def pipe(self, stage: Stage) -> 'Pipeline':
+        self._stream = stage(self._stream)
+        return self
+
+    def __iter__(self) -> Iterator[Record]:
+        return iter(self._stream)
+
+    def run(self, sinks: Sequence[Sink], close: bool = True) -> int:
+        """
+        消费整个流，每条记录依次写入所有输出
+
+        数据源中途抛出异常（例如 ToplistPageError、HydrationError）时，输出丢弃失败榜单已写入的部分 (abort)，
+        之前完整的CSV和数据库记录保持不变，异常继续向上抛出
+
+        Args:
+            sinks: 输出列表
+            close: 结束后是否关闭所有输出
+
+        Returns:
+            写出的记录数
+        """
+        count = 0
+        try:
+            for record in self._stream:
+                for sink in sinks:
+                    sink.write(record)
+                count += 1
+        except BaseException:
+            if close:
+                for sink in sinks:
+                    sink.abort()
+            raise
+        if close:
+            for sink in sinks:
+                sink.close()
+        return count
+
+
+def chain_sources(sources: Iterable[Iterable[Record]]) -> Iterator[Record]:
+    """依次串联多个数据源；sources 本身也可以是惰性的，用到时才开始请求"""
+    return itertools.chain.from_iterable(sources)
+
+
+def default_sources(transport: Optional[Transport] = None) -> Iterator[Iterator[Record]]:
+    """async_fetcher 中配置的全部默认榜单，按平台依次产出数据源"""
+    from async_fetcher import KUGOU_TOPLISTS, NETEASE_TOPLISTS, QQ_TOPLISTS
+
+    qq = QQMusicAPI(transport=transport)
+    kugou = KugouAPI(transport=transport)
+    for name, topid in QQ_TOPLISTS.items():
+        yield qq_source(qq, topid, name)
+    for name, rank_id in KUGOU_TOPLISTS.items():
+        yield kugou_source(kugou, rank_id, name)
+    for name, chart_id in NETEASE_TOPLISTS.items():
+        yield netease_source(chart_id, name, transport)
+
+
+def main():
+    """抓取所有默认榜单，流式写入CSV和 JSON Lines。命令行参数可指定 JSON Lines 路径"""
+    jsonl_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(BASE_DIR, 'datasets', 'songs.jsonl')
+    identity = SongIdentityIndex()
+    pipeline = (Pipeline(chain_sources(default_sources()))
+                .pipe(normalize)
+                .pipe(enrich(identity))
+                .pipe(dedupe()))
+    count = pipeline.run([CsvSink(BASE_DIR), JsonLinesSink(jsonl_path)])
+    identity.save()
+    print(f"共写出 {count} 条歌曲记录，JSON Lines: {jsonl_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+# 与原有歌曲字典相同的键名
+RANK_FIELD = '排名'
+TITLE_FIELD = '歌曲名'
+ARTIST_FIELD = '歌手'
+ALBUM_FIELD = '专辑'
+SONG_ID_FIELD = '歌曲ID'
+HASH_FIELD = 'Hash'
+DURATION_FIELD = '时长'
+BITRATE_FIELD = '比特率'
+CANONICAL_ID_FIELD = '标准ID'
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+class SongRecord(Mapping):
+    """
+    紧凑、不可变的歌曲记录，三个平台的客户端共用
+
+    用 __slots__ 保存字段，不为每首歌创建字典；歌名、歌手、专辑和歌曲ID字符串经 sys.intern
+    驻留，同一首歌在多个榜单、多个周期中只保存一份。
+    同时实现只读的 Mapping 接口，键名与原来的歌曲字典相同（'排名'、'歌曲名'、'歌手'、'专辑'、
+    '歌曲ID' 或酷狗的 'Hash'，以及可选的 '时长'、'比特率'、'标准ID'），
+    所以 song['排名']、song.get(...)、csv.DictWriter 等原有用法不需要修改；需要真正的字典时调用 to_dict()。
+    """
+
+    __slots__ = ('rank', 'title', 'artist', 'album', 'song_id', 'duration', 'canonical_id', 'id_field', 'bitrate',
+                 'album_id')
+
+    def __init__(self, rank: int, title: Optional[str], artist: Optional[str], album: Optional[str],
+                 song_id: Any, duration: Optional[int] = None, canonical_id: Optional[str] = None,
+                 id_field: str = SONG_ID_FIELD, bitrate: Optional[int] = None, album_id: Any = None):
+        """
+        Args:
+            rank: 排名
+            title: 歌曲名
+            artist: 歌手（多个歌手已按平台习惯拼接）
+            album: 专辑
+            song_id: 平台内的歌曲ID（QQ 的 mid、网易云的 track id、酷狗的 Hash）
+            duration: 时长（秒，只有酷狗提供）
+            canonical_id: 跨平台标准ID
+            id_field: 歌曲ID在字典形式中的键名，酷狗为 'Hash'
+            bitrate: 比特率（kbps，只有补全了详情的酷狗歌曲才有）
+            album_id: 平台内的专辑ID（QQ 为 album mid），用于批量查询专辑信息，不出现在字典形式中
+        """
+        setattr_ = object.__setattr__
+        setattr_(self, 'rank', rank)
+        setattr_(self, 'title', _intern(title))
+        setattr_(self, 'artist', _intern(artist))
+        setattr_(self, 'album', _intern(album))
+        setattr_(self, 'song_id', _intern(song_id))
+        setattr_(self, 'duration', duration)
+        setattr_(self, 'canonical_id', canonical_id)
+        setattr_(self, 'id_field', id_field)
+        setattr_(self, 'bitrate', bitrate)
+        setattr_(self, 'album_id', album_id)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"SongRecord 不可修改，请使用 replace({name}=...)")
+
+    def __delattr__(self, name):
+        raise AttributeError("SongRecord 不可修改")
+
+    def __reduce__(self):
+        return (SongRecord, (self.rank, self.title, self.artist, self.album, self.song_id,
+                             self.duration, self.canonical_id, self.id_field, self.bitrate,
+                             self.album_id))
+
+    def replace(self, **changes) -> 'SongRecord':
+        """返回修改了部分字段的新记录"""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return SongRecord(**fields)
+
+    # --- Mapping 接口（原有的字典用法） ---
+
+    def __getitem__(self, key: str) -> Any:
+        if key == RANK_FIELD:
+            return self.rank
+        if key == TITLE_FIELD:
+            return self.title
+        if key == ARTIST_FIELD:
+            return self.artist
+        if key == ALBUM_FIELD:
+            return self.album
+        if key == self.id_field:
+            return self.song_id
+        if key == DURATION_FIELD and self.duration is not None:
+            return self.duration
+        if key == BITRATE_FIELD and self.bitrate is not None:
+            return self.bitrate
+        if key == CANONICAL_ID_FIELD and self.canonical_id is not None:
+            return self.canonical_id
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield RANK_FIELD
+        yield TITLE_FIELD
+        yield ARTIST_FIELD
+        yield ALBUM_FIELD
+        yield self.id_field
+        if self.duration is not None:
+            yield DURATION_FIELD
+        if self.bitrate is not None:
+            yield BITRATE_FIELD
+        if self.canonical_id is not None:
+            yield CANONICAL_ID_FIELD
+
+    def __len__(self) -> int:
+        return 5 + (self.duration is not None) + (self.bitrate is not None) + (self.canonical_id is not None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为原来的歌曲字典"""
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"SongRecord({self.to_dict()!r})"
+
+
+def with_canonical_id(song, canonical_id: str):
+    """为歌曲附加标准ID：SongRecord 返回新记录，普通字典原地修改后返回"""
+    if isinstance(song, SongRecord):
+        return song.replace(canonical_id=canonical_id)
+    song[CANONICAL_ID_FIELD] = canonical_id
+    return song
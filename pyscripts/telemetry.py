@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+抓取链路的指标与追踪
+
+每个请求、每个处理阶段记录为一个 span（OpenTelemetry 风格：trace_id/span_id/父 span/起止时间/属性），
+同时汇总为 Prometheus 指标：
+
+- fetch_stage_seconds (histogram): 各阶段耗时，标签 stage/platform/chart
+    queue     限速器排队等待
+    dns       DNS 解析（启用 transport 的 DNS 缓存时才能单独计时，否则计入 connect）
+    connect   TCP 连接
+    tls       TLS 握手
+    ttfb      请求发出到收到响应头
+    download  读取响应体（含 gzip/br 解压）
+    decode    响应字节解码为 JSON
+    parse     解析为歌曲记录（酷狗页面的 JSON 解码也计入此阶段）
+    normalize 附加跨平台标准ID
+    write     导出（CSV/Parquet/SQLite）
+- fetch_requests_total / fetch_bytes_total / fetch_retries_total (counter)
+
+平台和榜单标签由外层 span 的属性继承：AsyncFetchEngine 在 fetch_chart 中打开带 platform/chart 的 span，
+asyncio.to_thread 会复制上下文，线程中发出的请求和解析都归到该榜单下。
+
+用法:
+    with get_telemetry().span('fetch_chart', platform='qq', chart=26):
+        ...
+    print(get_telemetry().prometheus_text())
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+STAGE_METRIC = 'fetch_stage_seconds'
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 由父 span 继承、并作为指标标签的属性
+INHERITED_LABELS = ('platform', 'chart')
+
+METRIC_HELP = {
+    STAGE_METRIC: ('histogram', '各抓取阶段耗时（秒）'),
+    'fetch_requests_total': ('counter', 'HTTP请求数'),
+    'fetch_bytes_total': ('counter', '传输字节数，direction=in 为线上接收的（压缩后）字节'),
+    'fetch_retries_total': ('counter', '请求重试次数'),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+class Span:
+    """一个计时区间，结束后交给 Telemetry 保存"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'labels', 'status')
+
+    def __init__(self, name: str, parent: Optional['Span'], attributes: Dict[str, Any],
+                 start: Optional[float] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else _new_id(16)
+        self.span_id = _new_id(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time() if start is None else start
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.labels = dict(parent.labels) if parent else {}
+        for key in INHERITED_LABELS:
+            if key in attributes:
+                self.labels[key] = str(attributes[key])
+        self.status = 'OK'
+
+    def set(self, **attributes):
+        """补充属性，例如状态码、字节数"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """OpenTelemetry (OTLP JSON) 风格的字典"""
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'start_time_unix_nano': int(self.start * 1e9),
+            'end_time_unix_nano': int((self.end or self.start) * 1e9),
+            'attributes': self.attributes,
+            'status': self.status,
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('current_span', default=None)
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels: LabelKey, extra: str = '') -> str:
+    parts = ['{}="{}"'.format(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Telemetry:
+    """进程内的指标与 span 收集器，线程安全"""
+
+    def __init__(self, max_spans: int = 10000, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Args:
+            max_spans: 内存中保留的已结束 span 数，超出后丢弃最旧的
+            buckets: 阶段耗时直方图的分桶上限（秒）
+        """
+        self.buckets = buckets
+        self._spans: deque = deque(maxlen=max_spans)
+        self._histograms: Dict[Tuple[str, LabelKey], _Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._lock = threading.Lock()
+
+    # --- span ---
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """打开一个子 span，退出时结束；出现异常时状态记为 ERROR"""
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = 'ERROR'
+            span.attributes.setdefault('error', repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    @contextmanager
+    def stage(self, stage: str, **attributes) -> Iterator[Span]:
+        """计时一个处理阶段：记录 span，并计入 fetch_stage_seconds"""
+        with self.span(stage, **attributes) as span:
+            try:
+                yield span
+            finally:
+                # span 在外层 with 退出时才结束，这里用当前时间计算耗时
+                self._observe_stage(stage, time.time() - span.start, span.labels)
+
+    def record_stage(self, stage: str, seconds: float, **attributes):
+        """记录一个已经结束的阶段（例如连接回调里测得的耗时）"""
+        end = time.time()
+        span = Span(stage, _current_span.get(), attributes, start=end - seconds)
+        self._finish(span, end)
+        self._observe_stage(stage, seconds, span.labels)
+
+    def _finish(self, span: Span, end: Optional[float] = None):
+        span.end = time.time() if end is None else end
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self) -> List[Dict[str, Any]]:
+        """已结束的 span（旧的在前）"""
+        with self._lock:
+            return [span.to_dict() for span in self._spans]
+
+    def export_spans(self, path: str) -> int:
+        """把已结束的 span 以 JSON Lines 追加写入文件，返回写出的条数"""
+        spans = self.spans()
+        with open(path, 'a', encoding='utf-8') as f:
+            for span in spans:
+                f.write(json.dumps(span, ensure_ascii=False, default=str))
+                f.write('\n')
+        return len(spans)
+
+    # --- 指标 ---
+
+    def _key(self, name: str, labels: Dict[str, Any]) -> Tuple[str, LabelKey]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def _observe_stage(self, stage: str, seconds: float, labels: Dict[str, str]):
+        key = self._key(STAGE_METRIC, dict(labels, stage=stage))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """计数器加 value；平台/榜单标签取自当前 span"""
+        span = _current_span.get()
+        if span is not None:
+            labels = dict(span.labels, **labels)
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def counter_value(self, name: str, **labels) -> float:
+        """某个计数器在匹配给定标签的所有序列上的合计"""
+        wanted = {key: str(value) for key, value in labels.items()}
+        with self._lock:
+            return sum(value for (metric, key), value in self._counters.items()
+                       if metric == name and wanted.items() <= dict(key).items())
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """按阶段汇总 {阶段: {'count', 'sum'}}，便于打印"""
+        summary: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for (_, key), histogram in self._histograms.items():
+                entry = summary.setdefault(dict(key)['stage'], {'count': 0, 'sum': 0.0})
+                entry['count'] += histogram.count
+                entry['sum'] += histogram.sum
+        return summary
+
+    def prometheus_text(self) -> str:
+        """Prometheus 文本格式 (text/plain; version=0.0.4)"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        if histograms:
+            kind, help_text = METRIC_HELP[STAGE_METRIC]
+            lines.append(f"# HELP {STAGE_METRIC} {help_text}")
+            lines.append(f"# TYPE {STAGE_METRIC} {kind}")
+            for (name, labels), histogram in histograms:
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{_format_labels(labels, le)} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        described = set()
+        for (name, labels), value in counters:
+            if name not in described:
+                described.add(name)
+                kind, help_text = METRIC_HELP.get(name, ('counter', name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._histograms.clear()
+            self._counters.clear()
+
+
+_default_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    """进程内共享的 Telemetry"""
+    return _default_telemetry
+
+
+# --- Prometheus 抓取端点 ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.telemetry.prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, telemetry: Optional[Telemetry] = None,
+                         host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """
+    在后台线程中提供 /metrics 端点供 Prometheus 抓取
+
+    Returns:
+        服务器对象，调用 shutdown() 停止
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.telemetry = telemetry or get_telemetry()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+异步抓取引擎的离线测试：各平台客户端由 Fake 对象替换，检查按主机的并发上限和 run_all 的汇总结果。
+
+可直接运行 `python test_async_fetcher.py`，也可用 pytest 执行。
+"""
+import asyncio
+
+from async_fetcher import AsyncFetchEngine, HostLimiter
+from exporters import Exporter
+from transport import Transport
+
+
+class RecordingExporter(Exporter):
+    name = 'recording'
+
+    def __init__(self):
+        self.exported = []
+
+    def export(self, platform, chart_id, chart_name, result, period=None):
+        self.exported.append((platform, chart_id, period))
+        return f"{platform}/{chart_id}"
+
+
+class FakeKugou:
+    """每个榜单请求耗时 delay 秒并记录同时进行的请求数，failing 中的榜单抛出异常"""
+
+    def __init__(self, delay: float = 0.02, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.active = 0
+        self.max_active = 0
+
+    async def get_toplist_async(self, rank_id):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if rank_id in self.failing:
+                raise RuntimeError('boom')
+            return {'title': f'榜单{rank_id}', 'songs': [{'排名': 1, '歌名': '歌', '歌手': '歌手'}]}
+        finally:
+            self.active -= 1
+
+    def close(self):
+        pass
+
+
+class FakeQQ:
+    def __init__(self):
+        self.batches = []
+
+    async def get_toplists_async(self, topids, limit=300):
+        self.batches.append(list(topids))
+        return {topid: {'title': f'榜单{topid}', 'songs': [{'排名': 1}]} if topid != 0 else None
+                for topid in topids}
+
+    def get_toplist_period(self, topid):
+        return '2024_10'
+
+    def close(self):
+        pass
+
+
+def make_engine(per_host_limit: int, kugou: FakeKugou, exporter: RecordingExporter) -> AsyncFetchEngine:
+    engine = AsyncFetchEngine(per_host_limit=per_host_limit, exporters=[exporter],
+                              transport=Transport(dns_cache_ttl=None))
+    engine.qq.close()
+    engine.kugou.close()
+    engine.qq, engine.kugou = FakeQQ(), kugou
+    return engine
+
+
+def test_host_limiter_caps_each_host_separately():
+    async def run():
+        limiter = HostLimiter(per_host_limit=2)
+        active = {'a': 0, 'b': 0}
+        peak = {'a': 0, 'b': 0}
+
+        async def request(host):
+            async with limiter.get(host):
+                active[host] += 1
+                peak[host] = max(peak[host], active[host])
+                await asyncio.sleep(0.01)
+                active[host] -= 1
+
+        await asyncio.gather(*(request(host) for host in 'ab' * 5))
+        assert limiter.get('a') is limiter.get('a')
+        return peak
+
+    assert asyncio.run(run()) == {'a': 2, 'b': 2}
+
+
+def test_run_all_fetches_concurrently_and_reports_failures():
+    kugou = FakeKugou(failing={3})
+    exporter = RecordingExporter()
+    engine = make_engine(2, kugou, exporter)
+    try:
+        summary = asyncio.run(engine.run_all(
+            qq_charts={'热歌榜': 26, '坏榜': 0},
+            kugou_charts={f'榜{rank_id}': rank_id for rank_id in range(1, 6)},
+            netease_charts={}))
+    finally:
+        engine.close()
+
+    assert summary == {
+        'qq/热歌榜': True, 'qq/坏榜': False,
+        'kugou/榜1': True, 'kugou/榜2': True, 'kugou/榜3': False, 'kugou/榜4': True, 'kugou/榜5': True,
+    }
+    # 酷狗的5个榜单同时发出，但同一主机最多2个并发
+    assert kugou.max_active == 2
+    # QQ音乐的榜单合并为一次批量请求
+    assert engine.qq.batches == [[26, 0]]
+    assert sorted(exporter.exported) == [('kugou', 1, None), ('kugou', 2, None), ('kugou', 4, None),
+                                         ('kugou', 5, None), ('qq', 26, '2024_10')]
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
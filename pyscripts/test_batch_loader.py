@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+BatchLoader 的离线测试：批量函数由假的实现代替，记录每一批请求的ID。
+
+可直接运行 `python test_batch_loader.py`，也可用 pytest 执行。
+"""
+import asyncio
+import json
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_loader import BatchLoader, kugou_album_loader, parallel, qq_album_loader
+from kugou_fixed import KugouAPI
+from qqmusic_optimized import QQMusicAPI
+from schema_drift import SchemaMonitor
+from song_record import SongRecord
+
+
+class RecordingBatch:
+    """返回 {ID: 'album-ID'}，fail 中的ID返回None"""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, keys):
+        with self._lock:
+            self.batches.append(sorted(keys))
+        return {key: None if key in self.fail else f"album-{key}" for key in keys}
+
+    def fetched(self):
+        return sorted(key for batch in self.batches for key in batch)
+
+
+def test_concurrent_callers_are_coalesced():
+    batch_fn = RecordingBatch()
+    loader = BatchLoader(batch_fn, window=0.05)
+    charts = [[1, 2, 3], [2, 3, 4], [3, 4, 5, 5], [1, 5]]
+    barrier = threading.Barrier(len(charts))
+
+    def load_chart(album_ids):
+        barrier.wait()
+        return loader.load_many(album_ids)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(charts)) as executor:
+            results = list(executor.map(load_chart, charts))
+        assert results[2] == {3: 'album-3', 4: 'album-4', 5: 'album-5'}
+        # 每张专辑在本周期只获取一次，且都落在同一个时间窗口的一批里
+        assert batch_fn.fetched() == [1, 2, 3, 4, 5]
+        assert batch_fn.batches == [[1, 2, 3, 4, 5]]
+        assert loader.load(4) == 'album-4' and len(batch_fn.batches) == 1
+        stats = loader.stats()
+        assert stats['batches'] == 1 and stats['fetched'] == 5 and stats['coalesced'] >= 5
+    finally:
+        loader.close()
+
+
+def test_batch_size_limit_and_cycles():
+    batch_fn = RecordingBatch()
+    loader = BatchLoader(batch_fn, window=0.05, max_batch_size=3)
+    try:
+        assert len(loader.load_many(range(1, 8))) == 7
+        assert sorted(len(batch) for batch in batch_fn.batches) == [1, 3, 3]
+        # 新周期重新获取
+        loader.clear()
+        loader.load(1)
+        assert batch_fn.fetched().count(1) == 2
+        # 预先放入的结果不会发出请求
+        loader.prime(99, 'known')
+        assert loader.load(99) == 'known' and 99 not in batch_fn.fetched()
+    finally:
+        loader.close()
+
+
+def test_failures_are_retried():
+    batch_fn = RecordingBatch(fail=['bad'])
+    loader = BatchLoader(batch_fn, window=0.001)
+    try:
+        assert loader.load_many(['ok', 'bad', None]) == {'ok': 'album-ok', 'bad': None}
+        batch_fn.fail.clear()
+        assert loader.load('bad') == 'album-bad'
+        assert loader.load('ok') == 'album-ok'
+        assert batch_fn.fetched() == ['bad', 'bad', 'ok']
+
+        broken = BatchLoader(lambda keys: 1 / 0, window=0.001)
+        assert broken.load('x') is None and broken.stats()['failed'] == 1
+        broken.close()
+    finally:
+        loader.close()
+
+
+def test_load_async():
+    batch_fn = RecordingBatch()
+    loader = BatchLoader(batch_fn, window=0.02)
+
+    async def run():
+        return await asyncio.gather(*(loader.load_async(key) for key in (1, 2, 1, 3, 2)))
+
+    try:
+        assert asyncio.run(run()) == ['album-1', 'album-2', 'album-1', 'album-3', 'album-2']
+        assert batch_fn.batches == [[1, 2, 3]]
+    finally:
+        loader.close()
+
+
+def test_parallel_wrapper():
+    def fetch_one(key):
+        return key * 10
+
+    assert parallel(fetch_one, max_workers=4)([1, 2, 3]) == {1: 10, 2: 20, 3: 30}
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.content = json.dumps(body).encode('utf-8')
+        self.text = self.content.decode('utf-8')
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeSession:
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.requests.append((url, params))
+        return FakeResponse(self.handler(url, params))
+
+
+class FakeTransport:
+    def __init__(self, session):
+        self.session = session
+
+
+def test_qq_albums_share_one_request():
+    def handler(url, params):
+        calls = json.loads(params['data'])
+        body = {'code': 0}
+        for key, call in calls.items():
+            if key == 'comm':
+                continue
+            mid = call['param']['albumMid']
+            body[key] = {'code': 0 if mid != 'gone' else 404, 'data': {
+                'basicInfo': {'albumMid': mid, 'albumName': f'专辑 &amp; {mid}', 'publishDate': '2024-01-01'},
+                'singer': {'singerList': [{'name': '甲'}, {'name': '乙'}]},
+                'company': {'name': '公司'}}}
+        return body
+
+    session = FakeSession(handler)
+    api = QQMusicAPI(transport=FakeTransport(session), schema_monitor=SchemaMonitor(None))
+    api.MAX_GET_DATA_LENGTH = 10 ** 6
+    loader = qq_album_loader(api, window=0.02)
+    try:
+        albums = loader.load_many(['m1', 'm2', 'gone', 'm1'])
+        assert len(session.requests) == 1
+        assert albums['m1'] == {'album_id': 'm1', 'name': '专辑 & m1', 'artist': '甲 & 乙',
+                                'publish_time': '2024-01-01', 'intro': '', 'company': '公司'}
+        assert albums['gone'] is None
+    finally:
+        loader.close()
+
+
+def test_kugou_album_loader():
+    def handler(url, params):
+        assert url == KugouAPI.ALBUM_INFO_URL
+        return {'status': 1, 'data': {'albumid': params['albumid'], 'albumname': f"专辑{params['albumid']}",
+                                      'singername': '歌手', 'imgurl': 'http://img/{size}/a.jpg'}}
+
+    session = FakeSession(handler)
+    loader = kugou_album_loader(KugouAPI(transport=FakeTransport(session)), window=0.02)
+    try:
+        albums = loader.load_many(['1810111', '1973060', '1810111'])
+        assert albums['1973060']['name'] == '专辑1973060'
+        assert albums['1810111']['cover'] == 'http://img/400/a.jpg'
+        assert sorted(params['albumid'] for _, params in session.requests) == ['1810111', '1973060']
+    finally:
+        loader.close()
+
+
+def test_album_id_is_kept_out_of_mapping():
+    song = SongRecord(1, '晴天', '周杰伦', '叶惠美', 'H', album_id='1810111')
+    assert 'album_id' not in song.to_dict() and len(song) == 5
+    assert pickle.loads(pickle.dumps(song)).album_id == '1810111'
+    assert song.replace(rank=2).album_id == '1810111'
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+离线基准套件的冒烟测试：用很少的迭代次数跑一遍 stub 服务器上的全部基准，并检查结果的保存与对比。
+
+可直接运行 `python test_bench_fetchers.py`，也可用 pytest 执行。
+"""
+import contextlib
+import io
+import json
+import os
+import tempfile
+
+from bench_fetchers import compare_results, run_benchmarks, save_results
+
+EXPECTED_SONGS = {'qq': 100, 'kugou': 30, 'netease': 200}
+
+
+def test_benchmarks_replay_all_platforms_without_errors():
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = run_benchmarks(latency=0, concurrency_levels=(1, 2), parse_iterations=2, requests_per_worker=2)
+
+    assert {name: entry['songs'] for name, entry in results['parse'].items()} == EXPECTED_SONGS
+    for name, levels in results['e2e'].items():
+        assert [level['concurrency'] for level in levels] == [1, 2]
+        assert all(level['errors'] == 0 and level['charts_per_s'] > 0 for level in levels), name
+        assert [level['requests'] for level in levels] == [2, 4]
+
+    with tempfile.TemporaryDirectory() as root:
+        path = save_results(results, root)
+        assert os.path.dirname(path) == root and path.endswith(f"_{results['meta']['commit']}.json")
+        with open(path, 'r', encoding='utf-8') as f:
+            assert json.load(f) == results
+
+
+def test_compare_reports_regressions():
+    old = {'meta': {'commit': 'aaa'},
+           'parse': {'qq': {'median_ms': 1.0, 'peak_bytes_per_song': 100}},
+           'e2e': {'qq': [{'concurrency': 4, 'charts_per_s': 50.0}]}}
+    new = {'meta': {'commit': 'bbb'},
+           'parse': {'qq': {'median_ms': 1.5, 'peak_bytes_per_song': 100}, 'kugou': {'median_ms': 1.0}},
+           'e2e': {'qq': [{'concurrency': 4, 'charts_per_s': 40.0}, {'concurrency': 8, 'charts_per_s': 60.0}]}}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        compare_results(old, new)
+    lines = output.getvalue().splitlines()
+    assert 'aaa -> bbb' in lines[1]
+    # 只对比两次都有的指标：解析两项、端到端并发4一项
+    assert len(lines) == 5
+    assert '(+50.0%)' in lines[2] and '(+0.0%)' in lines[3] and '(-20.0%)' in lines[4]
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+榜单目录的离线测试：目录解析使用 fixtures/ 中保存的三个平台目录响应，缓存与刷新使用假的获取函数。
+
+可直接运行 `python test_chart_catalog.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import tempfile
+from datetime import datetime
+
+from chart_cadence import DISCOVERED_CADENCES, DailyCadence, WeeklyCadence, cadence_for, cadence_from_frequency
+from chart_catalog import ChartCatalog, ChartInfo
+from kugou_fixed import parse_rank_list
+from netease_fetcher import _parse_toplist_catalog
+from qqmusic_optimized import QQMusicAPI
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingDiscoverer:
+    """按顺序返回预设结果并记录调用次数"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.results[min(self.calls, len(self.results)) - 1]
+
+
+def test_parse_qq_catalog():
+    charts = QQMusicAPI._parse_all_toplists(json.loads(load_fixture('qq_toplist_all.json'))['toplist'])
+    assert [chart['chart_id'] for chart in charts] == [62, 26, 27, 4, 5, 3, 16, 60]
+    hot = charts[1]
+    assert hot == {'chart_id': 26, 'name': '热歌榜', 'group': '巅峰榜', 'period': '2024_23',
+                   'update_time': '2024-06-06', 'intro': '根据一周播放量计算'}
+    assert ChartInfo('qq', **hot).infer_cadence().period_at(datetime(2024, 6, 6, 12)) == '2024_23'
+    # 周榜的发布日取更新时间的星期：欧美榜更新于 2024-06-03（周一）
+    europe = ChartInfo('qq', **charts[5]).infer_cadence()
+    assert isinstance(europe, WeeklyCadence) and europe.weekday == 0
+    assert isinstance(ChartInfo('qq', **charts[0]).infer_cadence(), DailyCadence)
+
+
+def test_parse_kugou_rank_list():
+    charts = parse_rank_list(load_fixture('kugou_rank_list.html'))
+    assert [chart['chart_id'] for chart in charts] == [8888, 6666, 59703, 31308, 31310, 52144, 24971, 33160]
+    assert charts[0]['name'] == '酷狗TOP500'
+    # 没有 title 属性时取链接文字并解码实体
+    assert charts[-1] == {'chart_id': 33160, 'name': '电音&DJ榜'}
+    # 旧的排行榜详情页侧栏（单引号链接）也能解析
+    assert parse_rank_list(load_fixture('kugou_rank_8888.html')) == [{'chart_id': 6666, 'name': '酷狗飙升榜'}]
+
+
+def test_parse_netease_catalog():
+    charts = _parse_toplist_catalog(json.loads(load_fixture('netease_toplist.json')))
+    assert len(charts) == 6
+    assert charts[3]['chart_id'] == 3778678 and charts[3]['frequency'] == '每周四更新'
+    assert charts[4]['intro'] == ''
+    cadence = ChartInfo('netease', **charts[4]).infer_cadence()
+    assert isinstance(cadence, WeeklyCadence) and cadence.weekday == 4
+    assert isinstance(cadence_from_frequency('刚刚更新'), DailyCadence)
+    assert cadence_from_frequency('不定期') is None
+
+
+def test_ttl_and_incremental_refresh():
+    clock = FakeClock()
+    qq = CountingDiscoverer([{'chart_id': 62, 'name': '飙升榜'}],
+                            [{'chart_id': 62, 'name': '飙升榜'}, {'chart_id': 4, 'name': '流行指数榜'}])
+    kugou = CountingDiscoverer([{'chart_id': 8888, 'name': '酷狗TOP500'}])
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'catalog.json')
+        catalog = ChartCatalog(path, ttl=3600, discoverers={'qq': qq, 'kugou': kugou}, clock=clock)
+        assert catalog.toplists('qq') == {'飙升榜': 62}
+        assert catalog.toplists('kugou') == {'酷狗TOP500': 8888}
+
+        # TTL 内不再请求；缓存文件重新加载后同样不请求
+        clock.now += 1800
+        catalog.toplists('qq')
+        reloaded = ChartCatalog(path, ttl=3600, discoverers={'qq': qq, 'kugou': kugou}, clock=clock)
+        assert reloaded.toplists('qq') == {'飙升榜': 62}
+        assert qq.calls == 1
+
+        # 只刷新过期的平台
+        clock.now += 1800
+        kugou_fetched = reloaded._platforms['kugou']['fetched_at']
+        assert reloaded.refresh(['qq']) == {'qq': True}
+        assert reloaded.toplists('qq') == {'飙升榜': 62, '流行指数榜': 4}
+        assert reloaded._platforms['kugou']['fetched_at'] == kugou_fetched
+
+
+def test_failed_refresh_keeps_previous_catalog():
+    clock = FakeClock()
+    netease = CountingDiscoverer([{'chart_id': 2884035, 'name': '原创榜', 'frequency': '每周四更新'}], None)
+    with tempfile.TemporaryDirectory() as root:
+        catalog = ChartCatalog(os.path.join(root, 'catalog.json'), ttl=60,
+                               discoverers={'netease': netease}, clock=clock)
+        assert catalog.toplists('netease') == {'原创榜': 2884035}
+        clock.now += 120
+        assert catalog.refresh(['netease']) == {'netease': False}
+        assert catalog.toplists('netease') == {'原创榜': 2884035}
+        # 推断出的节奏已登记，未配置的榜单不再按每天处理
+        assert isinstance(cadence_for('netease', 2884035), WeeklyCadence)
+        # 从未获取成功的平台退回默认榜单
+        assert catalog.toplists('kugou') == {"酷狗TOP500榜": 8888, "酷狗飙升榜": 6666}
+    DISCOVERED_CADENCES.pop(('netease', 2884035), None)
+
+
+def test_duplicate_names_and_jobs():
+    charts = [{'chart_id': 1, 'name': '热歌榜'}, {'chart_id': 2, 'name': '热歌榜'}]
+    with tempfile.TemporaryDirectory() as root:
+        catalog = ChartCatalog(os.path.join(root, 'catalog.json'),
+                               discoverers={'qq': lambda: charts, 'kugou': lambda: [], 'netease': lambda: None})
+        assert catalog.toplists('qq') == {'热歌榜': 1, '热歌榜_2': 2}
+        jobs = catalog.jobs()
+        assert [(job.platform, job.chart_id) for job in jobs][:2] == [('qq', 1), ('qq', 2)]
+        assert {job.platform for job in jobs} == {'qq', 'kugou', 'netease'}
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
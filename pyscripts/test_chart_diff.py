@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+榜单快照与差异计算的离线测试。
+
+可直接运行 `python test_chart_diff.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import tempfile
+
+from chart_diff import ChartTracker, SnapshotStore, diff_songs
+
+
+def songs(*ids):
+    return [{'排名': rank, '歌曲ID': song_id, '歌曲名': f'歌{song_id}', '歌手': '歌手'}
+            for rank, song_id in enumerate(ids, 1)]
+
+
+def test_diff_classifies_entries_exits_and_moves():
+    diff = diff_songs(songs('a', 'b', 'c', 'd'), songs('b', 'a', 'c', 'e'), 'qq')
+    assert diff.entries == [('e', 4, '歌e')]
+    assert diff.exits == [('d', 4, '歌d')]
+    assert diff.moves == [('b', 2, 1), ('a', 1, 2)]
+    assert diff.unchanged == 1 and diff.has_changes
+
+    # 缺少平台ID时按 歌曲名+歌手 识别同一首歌
+    previous = [{'排名': 1, '歌曲名': '歌', '歌手': '甲'}]
+    assert not diff_songs(previous, [dict(previous[0])], 'kugou').has_changes
+
+
+def test_tracker_diffs_against_previous_period_in_date_order():
+    with tempfile.TemporaryDirectory() as root:
+        tracker = ChartTracker(SnapshotStore(root))
+        first = tracker.record('qq', 26, songs('a', 'b'), period='2024_9')
+        assert first.previous_period is None and len(first.entries) == 2
+
+        # '2024_10' 按字符串比较排在 '2024_9' 之前，但按发布日期是下一期
+        second = tracker.record('qq', 26, songs('b', 'a', 'c'), period='2024_10')
+        assert second.previous_period == '2024_9'
+        assert second.moves == [('b', 2, 1), ('a', 1, 2)] and second.entries == [('c', 3, '歌c')]
+        assert tracker.store.periods('qq', 26) == ['2024_9', '2024_10']
+
+        # 同一周期重复抓取且没有变化时不写变更日志
+        assert not tracker.record('qq', 26, songs('b', 'a', 'c'), period='2024_10').has_changes
+        with open(os.path.join(root, 'changes.jsonl'), 'r', encoding='utf-8') as f:
+            periods = [json.loads(line)['period'] for line in f]
+        assert periods == ['2024_9', '2024_10']
+
+        loaded = tracker.store.load('qq', 26, '2024_10')
+        assert [(song['歌曲ID'], song['排名']) for song in loaded] == [('b', 1), ('a', 2), ('c', 3)]
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+榜单调度服务的离线测试：使用虚拟时钟和假的抓取引擎，不发出网络请求。
+
+可直接运行 `python test_chart_scheduler.py`，也可用 pytest 执行。
+"""
+import asyncio
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from chart_cadence import DailyCadence, WeeklyCadence, cadence_for
+from chart_diff import SnapshotStore
+from chart_scheduler import ChartJob, ChartScheduler
+
+
+class FakeClock:
+    """虚拟时钟，sleep 直接推进时间"""
+
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.now += timedelta(seconds=seconds)
+        await asyncio.sleep(0)
+
+
+def chart_songs(period):
+    """每一期榜单的内容：只有一首以周期命名的歌"""
+    return [{'排名': 1, '歌曲ID': period, 'Hash': period}]
+
+
+class FakeEngine:
+    """
+    记录每次请求；发布后 publish_delay 内新一期尚未出现：QQ返回None，其它平台返回已出现的最近一期。
+    与 AsyncFetchEngine 一样，通过 accept 检查的结果保存快照；unchanged 模拟HTTP缓存的未变化标记
+    """
+
+    def __init__(self, clock: FakeClock, publish_delay: timedelta = timedelta(0), unchanged: bool = False):
+        self.clock = clock
+        self.publish_delay = publish_delay
+        self.unchanged = unchanged
+        self.snapshots = None
+        self.calls = []
+
+    async def fetch_chart(self, platform, name, chart_id, period=None, accept=None):
+        self.calls.append((self.clock(), period))
+        cadence = cadence_for(platform, chart_id)
+        released = cadence.release_at(self.clock())
+        if self.clock() - released < self.publish_delay and platform == 'qq':
+            return None
+        while self.clock() - released < self.publish_delay:
+            released -= cadence.step
+        result = {'songs': chart_songs(cadence.period_of(released)), 'unchanged': self.unchanged}
+        if accept is not None and not accept(result):
+            return None
+        self.snapshots.save(platform, chart_id, period, result['songs'])
+        return result
+
+
+def make_scheduler(root, engine, clock, jobs, **kwargs):
+    engine.snapshots = SnapshotStore(os.path.join(root, 'snapshots'))
+    return ChartScheduler(engine, jobs, state_path=os.path.join(root, 'state.json'), snapshots=engine.snapshots,
+                          clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def seed(scheduler, job, period):
+    """模拟上次运行成功获取了 period 这一期"""
+    scheduler.state[job.key] = period
+    scheduler.snapshots.save(job.platform, job.chart_id, period, chart_songs(period))
+
+
+def test_daily_chart_polled_once_per_release():
+    clock = FakeClock(datetime(2024, 6, 3, 8, 0))
+    engine = FakeEngine(clock)
+    job = ChartJob('netease', '飙升榜', 19723756, DailyCadence(10))
+    with tempfile.TemporaryDirectory() as root:
+        scheduler = make_scheduler(root, engine, clock, [job], spread=600)
+        asyncio.run(scheduler.run(until=datetime(2024, 6, 10, 8, 0)))
+        # 启动时先取一次当前一期（6月2日），之后每天发布后各一次
+        assert len(engine.calls) == 8
+        offset = scheduler.offset_of(job)
+        for when, _ in engine.calls[1:]:
+            assert when.time() == (datetime(2024, 1, 1, 10) + offset).time()
+        with open(os.path.join(root, 'state.json'), encoding='utf-8') as f:
+            assert json.load(f) == {'netease/19723756': '2024-06-09'}
+
+
+def test_unpublished_period_retries_with_backoff():
+    clock = FakeClock(datetime(2024, 6, 3, 10, 0))
+    engine = FakeEngine(clock, publish_delay=timedelta(minutes=30))
+    job = ChartJob('kugou', '酷狗飙升榜', 6666, DailyCadence(10))
+    with tempfile.TemporaryDirectory() as root:
+        scheduler = make_scheduler(root, engine, clock, [job], spread=0, retry_delays=(300, 600, 1200))
+        seed(scheduler, job, '2024-06-02')
+        asyncio.run(scheduler.run(until=datetime(2024, 6, 3, 12, 0)))
+        # 10:00 与上一期相同，10:05、10:15 仍相同，10:35 获取到；非QQ平台同样按周期保存
+        assert [when.strftime('%H:%M') for when, _ in engine.calls] == ['10:00', '10:05', '10:15', '10:35']
+        assert {period for _, period in engine.calls} == {'2024-06-03'}
+        assert scheduler.stats() == {'polls': 4, 'new_periods': 1, 'retries': 3, 'given_up': 0}
+        assert scheduler.state[job.key] == '2024-06-03'
+        assert scheduler.snapshots.periods('kugou', 6666) == ['2024-06-02', '2024-06-03']
+
+
+def test_gives_up_until_next_release():
+    clock = FakeClock(datetime(2024, 6, 3, 10, 0))
+    engine = FakeEngine(clock, publish_delay=timedelta(days=2))
+    job = ChartJob('netease', '新歌榜', 3779629, DailyCadence(10))
+    with tempfile.TemporaryDirectory() as root:
+        scheduler = make_scheduler(root, engine, clock, [job], spread=0, retry_delays=(60, 60))
+        # 上次获取的 6月2日 一期实际是 6月1日 的内容，6月3日发布的一期两天后才出现
+        scheduler.state[job.key] = '2024-06-02'
+        scheduler.snapshots.save(job.platform, job.chart_id, '2024-06-02', chart_songs('2024-06-01'))
+        asyncio.run(scheduler.run(until=datetime(2024, 6, 4, 11, 0)))
+        assert scheduler.stats() == {'polls': 4, 'new_periods': 1, 'retries': 2, 'given_up': 1}
+        assert engine.calls[3] == (datetime(2024, 6, 4, 10, 0), '2024-06-04')
+        assert scheduler.state[job.key] == '2024-06-04'
+
+
+def test_warm_cache_restart_is_not_retried():
+    clock = FakeClock(datetime(2024, 6, 3, 10, 0))
+    # 重启前HTTP缓存里已经是新一期的响应，客户端会标记为 unchanged
+    engine = FakeEngine(clock, unchanged=True)
+    job = ChartJob('netease', '飙升榜', 19723756, DailyCadence(10))
+    with tempfile.TemporaryDirectory() as root:
+        scheduler = make_scheduler(root, engine, clock, [job], spread=0)
+        seed(scheduler, job, '2024-06-02')
+        asyncio.run(scheduler.run(until=datetime(2024, 6, 3, 11, 0)))
+        assert scheduler.stats() == {'polls': 1, 'new_periods': 1, 'retries': 0, 'given_up': 0}
+        assert scheduler.state[job.key] == '2024-06-03'
+
+
+def test_qq_backfills_missed_periods_after_downtime():
+    clock = FakeClock(datetime(2024, 6, 6, 12, 0))
+    engine = FakeEngine(clock)
+    job = ChartJob('qq', '飙升榜', 62, DailyCadence(10))
+    with tempfile.TemporaryDirectory() as root:
+        scheduler = make_scheduler(root, engine, clock, [job], spread=0, max_backfill=3)
+        scheduler.state[job.key] = '2024-06-01'
+        asyncio.run(scheduler.run(until=datetime(2024, 6, 6, 13, 0)))
+        # 错过了 6月2日~6日 五期，最多回补最近三期
+        assert [period for _, period in engine.calls] == ['2024-06-04', '2024-06-05', '2024-06-06']
+        assert scheduler.state[job.key] == '2024-06-06'
+
+
+def test_state_survives_restart():
+    clock = FakeClock(datetime(2024, 6, 3, 11, 0))
+    engine = FakeEngine(clock)
+    job = ChartJob('qq', '新歌榜', 27, DailyCadence(10))
+    with tempfile.TemporaryDirectory() as root:
+        asyncio.run(make_scheduler(root, engine, clock, [job], spread=0).run(until=datetime(2024, 6, 3, 12, 0)))
+        restarted = make_scheduler(root, engine, clock, [job], spread=0)
+        asyncio.run(restarted.run(until=datetime(2024, 6, 3, 13, 0)))
+        assert len(engine.calls) == 1
+
+
+def test_cadence_period_labels():
+    weekly = WeeklyCadence(3, 10, week_label=True)
+    # 2024-06-06 是周四
+    assert weekly.period_at(datetime(2024, 6, 6, 9, 59)) == '2024_22'
+    assert weekly.period_at(datetime(2024, 6, 6, 10, 0)) == '2024_23'
+    assert weekly.next_release(datetime(2024, 6, 3)) == datetime(2024, 6, 6, 10, 0)
+    # 周标签换算为该周的发布日，用于排序和比较
+    assert weekly.period_date('2024_23') == '2024-06-06' and weekly.period_date('2024_9') < '2024-06-06'
+    daily = DailyCadence(10)
+    assert daily.period_at(datetime(2024, 6, 3, 9, 0)) == '2024-06-02'
+    assert daily.missed_periods('2024-06-01', datetime(2024, 6, 3, 11, 0), 7) == ['2024-06-02', '2024-06-03']
+    assert daily.missed_periods(None, datetime(2024, 6, 3, 11, 0), 7) == ['2024-06-03']
+    assert daily.period_date('2024-06-03') == '2024-06-03'
+
+
+def test_snapshot_periods_sort_by_release_date():
+    with tempfile.TemporaryDirectory() as root:
+        store = SnapshotStore(root)
+        for period in ('2024_9', '2024_10', '2024_11'):
+            store.save('qq', 26, period, chart_songs(period))
+        assert store.periods('qq', 26) == ['2024_9', '2024_10', '2024_11']
+        assert store.latest_before('qq', 26, '2024_10') == '2024_10'
+        assert store.latest_before('qq', 26, '2024_8') is None
+
+
+def test_offsets_are_stable_and_spread():
+    jobs = [ChartJob('qq', str(i), i, DailyCadence(10)) for i in range(20)]
+    scheduler = ChartScheduler(None, jobs, state_path='unused_state.json', spread=600)
+    offsets = [scheduler.offset_of(job) for job in jobs]
+    assert offsets == [scheduler.offset_of(job) for job in jobs]
+    assert all(timedelta(0) <= offset < timedelta(seconds=600) for offset in offsets)
+    assert len(set(offsets)) > 10
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+CpuPool 的离线测试：进程池中的解析结果必须与直接解析一致。
+
+可直接运行 `python test_cpu_pool.py`，也可用 pytest 执行。
+"""
+import asyncio
+import os
+
+from cpu_pool import CpuPool
+from kugou_fixed import parse_toplist_page
+from netease_fetcher import parse_playlist_content, playlist_payload
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+KUGOU_URL = 'https://www.kugou.com/yy/rank/home/1-8888.html'
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def test_parse_matches_inline():
+    netease = load_fixture('netease_playlist_3778678.json')
+    kugou = load_fixture('kugou_rank_8888.html')
+    pool = CpuPool(2)
+    try:
+        assert pool.parse_netease(netease) == parse_playlist_content(netease)
+        assert pool.parse_kugou(kugou, KUGOU_URL) == parse_toplist_page(kugou, KUGOU_URL)
+        assert pool.parse_kugou(b'<html></html>', KUGOU_URL) is None
+    finally:
+        pool.close()
+
+
+def test_encrypt_batches_keep_order():
+    pool = CpuPool(2, batch_size=4)
+    try:
+        payloads = [playlist_payload(chart_id) for chart_id in range(10)]
+        assert [len(chunk) for chunk in pool._chunks(payloads)] == [4, 4, 2]
+        assert [len(chunk) for chunk in pool._chunks(payloads[:3])] == [2, 1]
+        results = pool.encrypt_many(payloads)
+        assert len(results) == 10
+        assert all(set(result) == {'params', 'encSecKey'} and len(result['encSecKey']) == 256 for result in results)
+        # 同一请求数据在不同进程、不同密钥下加密，密文各不相同
+        assert len({result['params'] for result in results}) == 10
+        assert len(asyncio.run(pool.encrypt_many_async(payloads))) == 10
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
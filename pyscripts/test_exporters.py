@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+导出器的离线测试，歌曲数据来自 fixtures/netease_playlist_3778678.json。Parquet 部分需要 pyarrow，未安装时跳过。
+
+可直接运行 `python test_exporters.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import tempfile
+
+from exporters import ParquetExporter, rank_history
+from netease_fetcher import parse_tracks
+
+try:
+    import pyarrow
+except ImportError:  # 可选依赖
+    pyarrow = None
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'netease_playlist_3778678.json')
+
+
+def load_songs():
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        return parse_tracks(json.load(f)['playlist']['tracks'])
+
+
+def test_parquet_partitions_sort_by_period_date():
+    if pyarrow is None:
+        return
+    songs = load_songs()[:5]
+    with tempfile.TemporaryDirectory() as root:
+        exporter = ParquetExporter(root)
+        # QQ音乐周标签不补零，按字符串比较 '2024_10' < '2024_9'
+        for period in ('2024_10', '2024_9'):
+            exporter.export('qq', 26, '热歌榜', {'title': '热歌榜', 'songs': songs}, period=period)
+        assert sorted(os.listdir(root)) == ['date=2024-02-29', 'date=2024-03-07']
+
+        history = rank_history([songs[0]['歌曲ID']], root)
+        assert history.column('period').to_pylist() == ['2024_9', '2024_10']
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
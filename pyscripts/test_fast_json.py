@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+类型化快速解码的离线测试：对 fixtures/ 中的录制响应，fast_json 的解码路径与
+标准库 json + 字典解析得到的歌曲列表必须完全一致。
+
+可直接运行 `python test_fast_json.py`，也可用 pytest 执行。
+"""
+import json
+import os
+
+import fast_json
+from bench_fetchers import musicu_response
+from kugou_fixed import FeaturesStreamExtractor, KugouAPI, parse_toplist_page
+from netease_fetcher import _parse_playlist, parse_playlist_content
+from qqmusic_optimized import QQMusicAPI
+from schema_drift import SchemaMonitor
+from telemetry import get_telemetry
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def rows(toplist):
+    return [(song.to_dict(), song.album_id) for song in toplist['songs']]
+
+
+def test_qq_detail_matches_dict_path():
+    content = musicu_response(load_fixture('qq_toplist_26.json'), ['detail'])
+    api = QQMusicAPI(schema_monitor=SchemaMonitor(None))
+    module = fast_json.decode_qq_detail(content)['detail']
+    if fast_json.msgspec is not None:
+        assert not isinstance(module, dict)
+    typed = api._parse_toplist(module, offset=10)
+    expected = api._parse_toplist(json.loads(content)['detail'], offset=10)
+    assert typed['title'] == expected['title']
+    assert rows(typed) == rows(expected) and len(typed['songs']) == 100
+    assert typed['songs'][0].rank == 11 and typed['songs'][0].album_id
+
+
+def test_netease_playlist_matches_dict_path():
+    content = load_fixture('netease_playlist_3778678.json')
+    typed = parse_playlist_content(content)
+    expected = _parse_playlist(json.loads(content))
+    assert typed['title'] == expected['title'] and rows(typed) == rows(expected)
+
+    # 只内联了前两首的大歌单，两条路径给出相同的 trackIds
+    data = json.loads(content)
+    data['playlist']['tracks'] = data['playlist']['tracks'][:2]
+    truncated = json.dumps(data).encode('utf-8')
+    typed = parse_playlist_content(truncated)
+    assert len(typed['songs']) == 2
+    assert typed['track_ids'] == _parse_playlist(json.loads(truncated))['track_ids']
+
+
+def test_kugou_features_match_dict_path():
+    content = load_fixture('kugou_rank_8888.html')
+    typed = parse_toplist_page(content, 'fixture')
+    extractor = FeaturesStreamExtractor(decode=json.loads)
+    items = extractor.feed(content)
+    expected = [KugouAPI._song_from_feature(idx, item) for idx, item in enumerate(items, 1)]
+    assert rows(typed) == [(song.to_dict(), song.album_id) for song in expected]
+
+
+def test_schema_drift_falls_back_to_dict():
+    telemetry = get_telemetry()
+    before = telemetry.counter_value('fetch_decode_fallback_total', schema='qq_detail')
+    body = {'code': 0, 'detail': {'code': 0, 'data': {'title': '榜', 'songInfoList': [
+        {'name': 12345, 'mid': 'M1', 'singer': [{'name': '歌手'}], 'album': {'name': '专辑', 'mid': 'A1'}}]}}}
+    result = fast_json.decode_qq_detail(json.dumps(body).encode('utf-8'))
+    assert isinstance(result['detail'], dict)
+    if fast_json.msgspec is not None:
+        assert telemetry.counter_value('fetch_decode_fallback_total', schema='qq_detail') == before + 1
+
+    try:
+        fast_json.decode_netease_playlist(b'{"playlist": ')
+    except json.JSONDecodeError:
+        pass
+    else:
+        raise AssertionError('不完整的JSON应抛出 json.JSONDecodeError')
+
+
+def test_qq_modules_fall_back_one_at_a_time():
+    telemetry = get_telemetry()
+    before = telemetry.counter_value('fetch_decode_fallback_total', schema='qq_detail')
+    module = json.loads(load_fixture('qq_toplist_26.json'))
+    broken = json.loads(load_fixture('qq_toplist_26.json'))
+    broken['data']['songInfoList'][3]['singer'] = '歌手'
+    single = {'name': '单曲', 'mid': 'M1', 'singer': [{'name': '歌手'}], 'album': {'name': ''}}
+    body = {'code': 0, 'ts': 1, 'detail_26': module, 'detail_27': broken,
+            'detail_28': {'code': 0, 'data': {'title': '榜', 'songInfoList': [single]}},
+            'detail_29': {'code': 0, 'data': {'title': '榜', 'songInfoList': []}}}
+    result = fast_json.decode_qq_detail(json.dumps(body).encode('utf-8'))
+    assert result['code'] == 0 and result['ts'] == 1
+    assert isinstance(result['detail_27'], dict)
+    if fast_json.msgspec is None:
+        return
+    # 只有结构不符的模块退回字典；缺少专辑 mid 的单曲和空的分页窗口仍按类型化结构解码
+    assert telemetry.counter_value('fetch_decode_fallback_total', schema='qq_detail') == before + 1
+    assert not any(isinstance(result[key], dict) for key in ('detail_26', 'detail_28', 'detail_29'))
+
+    api = QQMusicAPI(schema_monitor=SchemaMonitor(None, on_alert=None))
+    assert len(api._parse_toplist(result['detail_26'])['songs']) == 100
+    assert api._parse_toplist(result['detail_27']) is None
+    song = api._parse_toplist(result['detail_28'])['songs'][0]
+    assert song.album == '' and song.album_id is None
+    assert api._parse_toplist(result['detail_29']) == {'title': '榜', 'songs': []}
+    assert [alert.kind for alert in api.schema_monitor.recent_alerts()] == ['failed']
+
+
+def test_musicu_request_encoding():
+    api = QQMusicAPI(schema_monitor=SchemaMonitor(None))
+    data = {'comm': api.COMM, 'detail': api._build_detail_call(26, 100, period='2024-06-01')}
+    encoded = api._encode_musicu(data)
+    assert json.loads(encoded) == data and ', ' not in encoded
+    assert json.loads(api._encode_musicu({'comm': api.COMM})) == {'comm': api.COMM}
+    custom = {'comm': dict(api.COMM, uin=1), 'search': {'param': {'query': '晴天'}}}
+    assert json.loads(api._encode_musicu(custom)) == custom and '晴天' in api._encode_musicu(custom)
+    assert api._decoder_for(data) is fast_json.decode_qq_detail
+    assert api._decoder_for(custom) is fast_json.loads
+
+
+class FakeResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.text = content.decode('utf-8')
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """按请求中的模块键返回录制的 GetDetail 结果，topId 为 0 的榜单返回错误码；记录每个请求的方法与模块键"""
+
+    def __init__(self):
+        self.module = load_fixture('qq_toplist_26.json')
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        return self._respond('GET', params['data'])
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        return self._respond('POST', data)
+
+    def _respond(self, method, encoded):
+        calls = json.loads(encoded)
+        self.requests.append((method, [key for key in calls if key != 'comm']))
+        parts = [b'"code":0']
+        for key, call in calls.items():
+            if key == 'comm':
+                continue
+            module = self.module if call['param']['topId'] else b'{"code":2000}'
+            parts.append(f'"{key}":'.encode('utf-8') + module)
+        return FakeResponse(b'{' + b','.join(parts) + b'}')
+
+
+class FakeTransport:
+    def __init__(self, session):
+        self.session = session
+
+
+def test_client_batch_uses_typed_modules():
+    api = QQMusicAPI(transport=FakeTransport(FakeSession()), schema_monitor=SchemaMonitor(None))
+    api.MAX_GET_DATA_LENGTH = 10 ** 6
+    results = api.get_toplists([26, 0, 27], limit=100)
+    assert results[0] is None
+    assert rows(results[26]) == rows(results[27]) and len(results[26]['songs']) == 100
+    assert results[26]['title'] == json.loads(api.session.module)['data']['title']
+
+
+
+def test_client_sends_one_request_per_batch():
+    api = QQMusicAPI(transport=FakeTransport(FakeSession()), schema_monitor=SchemaMonitor(None))
+    api.MAX_GET_DATA_LENGTH = 10 ** 6
+    results = api.get_toplists([26, 27, 26, 28, 29, 30], limit=100, batch_size=2)
+    assert sorted(results) == [26, 27, 28, 29, 30]
+    assert api.session.requests == [
+        ('GET', ['detail_26', 'detail_27']),
+        ('GET', ['detail_28', 'detail_29']),
+        ('GET', ['detail_30']),
+    ]
+
+
+def test_long_payload_switches_to_post():
+    api = QQMusicAPI(transport=FakeTransport(FakeSession()), schema_monitor=SchemaMonitor(None))
+    topids = list(range(1, 21))
+    long_data = {'comm': api.COMM}
+    long_data.update((f"detail_{topid}", api._build_detail_call(topid, 100)) for topid in topids)
+    assert len(api._encode_musicu(long_data)) > api.MAX_GET_DATA_LENGTH
+    short_data = {'comm': api.COMM, 'detail_26': api._build_detail_call(26, 100)}
+    assert len(api._encode_musicu(short_data)) <= api.MAX_GET_DATA_LENGTH
+
+    results = api.get_toplists(topids, limit=100)
+    assert all(results[topid] is not None for topid in topids)
+    assert api.session.requests == [('POST', [f"detail_{topid}" for topid in topids])]
+
+    assert api.get_toplists([26], limit=100)[26] is not None
+    assert api.session.requests[-1] == ('GET', ['detail_26'])
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
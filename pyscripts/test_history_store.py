@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite 榜单历史库的离线测试，歌曲数据来自 fixtures/netease_playlist_3778678.json。
+
+可直接运行 `python test_history_store.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import tempfile
+
+from history_store import HistoryStore, split_artists
+from netease_fetcher import parse_tracks
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'netease_playlist_3778678.json')
+
+
+def load_songs():
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        return parse_tracks(json.load(f)['playlist']['tracks'])
+
+
+def test_chart_at_round_trip():
+    songs = load_songs()
+    with tempfile.TemporaryDirectory() as root:
+        store = HistoryStore(os.path.join(root, 'history.db'))
+        store.save('netease', 3778678, '热歌榜', songs, period='2024-06-01')
+        # 歌曲ID统一以字符串保存（与 chart_diff.song_key 一致）
+        assert store.chart_at('netease', 3778678, '2024-06-01') == [song.replace(song_id=str(song['歌曲ID']))
+                                                                    for song in songs]
+        assert store.chart_at('netease', 3778678, '2024-06-02') is None
+        # 同一周期重复写入时覆盖
+        store.save('netease', 3778678, '热歌榜', songs[:10], period='2024-06-01')
+        assert len(store.chart_at('netease', 3778678, '2024-06-01')) == 10
+        store.close()
+
+
+def test_trajectory_and_new_entries():
+    songs = load_songs()
+    with tempfile.TemporaryDirectory() as root:
+        store = HistoryStore(os.path.join(root, 'history.db'))
+        store.save('netease', 3778678, '热歌榜', songs[:100], period='2024-06-01')
+        # 第二期：前10首跌出，后面的歌整体上升10名，再新进10首
+        second = [song.replace(rank=rank) for rank, song in enumerate(songs[10:110], 1)]
+        store.save('netease', 3778678, '热歌榜', second, period='2024-06-08')
+
+        target = songs[50]
+        trajectory = store.song_trajectory('netease', target['歌曲ID'])
+        assert [(point['period'], point['rank']) for point in trajectory] == [('2024-06-01', 51), ('2024-06-08', 41)]
+
+        new = store.new_entries('netease', 3778678, since='2024-06-02')
+        assert sorted(entry['song_id'] for entry in new) == sorted(str(song['歌曲ID']) for song in songs[100:110])
+        store.close()
+
+
+def test_weekly_labels_compare_by_release_date():
+    songs = load_songs()
+    with tempfile.TemporaryDirectory() as root:
+        store = HistoryStore(os.path.join(root, 'history.db'))
+        # QQ音乐热歌榜的周标签不补零，按字符串比较 '2024_10' < '2024_9'
+        store.save('qq', 26, '热歌榜', songs[:50], period='2024_9')
+        store.save('qq', 26, '热歌榜', songs[10:60], period='2024_10')
+
+        trajectory = store.song_trajectory('qq', songs[20]['歌曲ID'])
+        assert [point['period'] for point in trajectory] == ['2024_9', '2024_10']
+        new = store.new_entries('qq', 26, since='2024_10')
+        assert sorted(entry['song_id'] for entry in new) == sorted(str(song['歌曲ID']) for song in songs[50:60])
+        assert {entry['first_period'] for entry in new} == {'2024_10'}
+        # 日期形式的 since 与周标签按发布日（周四）比较：第10周发布于 2024-03-07
+        assert len(store.new_entries('qq', 26, since='2024-03-07')) == 10
+        assert len(store.new_entries('qq', 26, since='2024-03-08')) == 0
+        store.close()
+
+
+def query_plans(store, query):
+    """执行 query(store)，返回其间执行的每条 SELECT（参数已代入）的查询计划"""
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+    try:
+        query(store)
+    finally:
+        store._conn.set_trace_callback(None)
+    return [' | '.join(row[3] for row in store._conn.execute('EXPLAIN QUERY PLAN ' + sql))
+            for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+
+
+def test_queries_use_covering_indexes():
+    base = load_songs()
+    songs = [song.replace(rank=rank, song_id=f"{song['歌曲ID']}-{rank}")
+             for rank, song in enumerate((base * 5)[:1000], 1)]
+    with tempfile.TemporaryDirectory() as root:
+        store = HistoryStore(os.path.join(root, 'history.db'))
+        store.save('netease', 1, '大榜', songs, period='2024-06-01')
+        store.save('netease', 1, '大榜', songs, period='2024-06-02')
+        assert len(store.chart_at('netease', 1, '2024-06-02')) == 1000
+
+        # 检查 new_entries / song_trajectory 实际执行的SQL
+        [new_entries] = query_plans(store, lambda s: s.new_entries('netease', 1, since='2024-06-01'))
+        assert 'COVERING INDEX idx_chart_songs_first' in new_entries
+        for query in (lambda s: s.song_trajectory('netease', songs[0]['歌曲ID']),
+                      lambda s: s.song_trajectory('netease', songs[0]['歌曲ID'], chart_id=1)):
+            [trajectory] = query_plans(store, query)
+            assert 'COVERING INDEX idx_entries_song' in trajectory
+        store.close()
+
+
+def test_split_artists():
+    assert split_artists('周杰伦 & 费玉清') == ['周杰伦', '费玉清']
+    assert split_artists('Taylor Swift / Ed Sheeran / Taylor Swift') == ['Taylor Swift', 'Ed Sheeran']
+    assert split_artists('') == []
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
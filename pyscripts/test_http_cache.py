@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+HttpCache 的离线测试：条件请求、TTL 过期、按最近最少使用淘汰与解析结果复用，网络由 FakeSession 模拟。
+
+可直接运行 `python test_http_cache.py`，也可用 pytest 执行。
+"""
+import tempfile
+import time
+
+from http_cache import HttpCache
+
+URL = 'https://example.com/toplist'
+
+
+class FakeResponse:
+    def __init__(self, content: bytes, status_code: int = 200, etag: str = None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {'ETag': etag} if etag else {}
+        self.encoding = 'utf-8'
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """按URL返回 bodies 中的内容；请求带上与当前 ETag 相同的 If-None-Match 时返回 304，并记录每次请求"""
+
+    def __init__(self, bodies):
+        self.bodies = dict(bodies)
+        self.requests = []
+
+    def etag_of(self, url):
+        return f'"{len(self.bodies[url])}-{self.bodies[url][:4].hex()}"'
+
+    def request(self, method, url, params=None, data=None, headers=None, timeout=None):
+        self.requests.append((url, dict(headers or {})))
+        etag = self.etag_of(url)
+        if (headers or {}).get('If-None-Match') == etag:
+            return FakeResponse(b'', status_code=304, etag=etag)
+        return FakeResponse(self.bodies[url], etag=etag)
+
+
+def test_fresh_entry_skips_the_network():
+    session = FakeSession({URL: b'{"songs": [1, 2]}'})
+    with tempfile.TemporaryDirectory() as root:
+        cache = HttpCache(root, ttl=3600)
+        first = cache.fetch(session, 'GET', URL)
+        assert first.changed and not first.from_cache
+        second = cache.fetch(session, 'GET', URL)
+        assert second.from_cache and not second.changed
+        assert second.content == first.content and len(session.requests) == 1
+
+
+def test_expired_entry_revalidates_with_etag():
+    session = FakeSession({URL: b'{"songs": [1, 2]}'})
+    with tempfile.TemporaryDirectory() as root:
+        cache = HttpCache(root, ttl=0)
+        first = cache.fetch(session, 'GET', URL)
+        assert 'If-None-Match' not in session.requests[0][1]
+
+        # TTL 已过期：发出条件请求，304 时返回缓存内容并标记未变化
+        second = cache.fetch(session, 'GET', URL)
+        assert session.requests[1][1]['If-None-Match'] == session.etag_of(URL)
+        assert not second.changed and not second.from_cache
+        assert second.content == first.content and second.digest == first.digest
+
+        # 内容更新后 ETag 不再匹配，返回新内容并标记变化
+        session.bodies[URL] = b'{"songs": [3]}'
+        third = cache.fetch(session, 'GET', URL)
+        assert third.changed and third.content == b'{"songs": [3]}'
+
+
+def test_least_recently_used_entry_is_evicted():
+    urls = [f'{URL}/{i}' for i in range(3)]
+    session = FakeSession({url: bytes([65 + i]) * 40 for i, url in enumerate(urls)})
+    with tempfile.TemporaryDirectory() as root:
+        cache = HttpCache(root, ttl=3600, max_bytes=100)
+        cache.fetch(session, 'GET', urls[0])
+        time.sleep(0.01)
+        cache.fetch(session, 'GET', urls[1])
+        time.sleep(0.01)
+        # 命中缓存会刷新最近访问时间，第二条因此成为最久未用的条目
+        assert cache.fetch(session, 'GET', urls[0]).from_cache
+        time.sleep(0.01)
+        cache.fetch(session, 'GET', urls[2])
+
+        assert len(session.requests) == 3
+        assert cache.fetch(session, 'GET', urls[0]).from_cache
+        assert cache.fetch(session, 'GET', urls[2]).from_cache
+        assert not cache.fetch(session, 'GET', urls[1]).from_cache
+        assert len(session.requests) == 4
+
+
+def test_memoize_reuses_parse_for_same_content():
+    session = FakeSession({URL: b'{"songs": [1, 2]}'})
+    parsed = []
+
+    def parse(response):
+        parsed.append(response.digest)
+        return response.json()
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = HttpCache(root, ttl=0)
+        for _ in range(3):
+            response = cache.fetch(session, 'GET', URL)
+            assert cache.memoize(response, 'json', lambda: parse(response)) == {'songs': [1, 2]}
+        assert len(parsed) == 1 and len(session.requests) == 3
+
+        # 不同的 tag 与变化后的内容都会重新解析
+        cache.memoize(response, 'other', lambda: parse(response))
+        session.bodies[URL] = b'{"songs": [3]}'
+        response = cache.fetch(session, 'GET', URL)
+        assert cache.memoize(response, 'json', lambda: parse(response)) == {'songs': [3]}
+        assert len(parsed) == 3
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+酷狗歌曲详情补全的离线测试：排行榜页面使用 fixtures/kugou_rank_8888.html，
+getSongInfo.php 由假的 session 应答，并记录每个 Hash 被查询的次数。
+
+可直接运行 `python test_kugou_enrich.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+
+from kugou_fixed import KugouAPI, SongInfoCache, parse_toplist_page
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'kugou_rank_8888.html')
+RANK_URL = 'https://www.kugou.com/yy/rank/home/1-8888.html'
+
+
+def load_fixture() -> bytes:
+    with open(FIXTURE, 'rb') as f:
+        return f.read()
+
+
+class FakeResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeSession:
+    """排行榜页面返回 fixture；歌曲信息按 Hash 返回固定的时长和比特率，unknown 中的 Hash 返回错误"""
+
+    def __init__(self, unknown=()):
+        self.unknown = set(unknown)
+        self.queries = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        if url == RANK_URL:
+            return FakeResponse(load_fixture())
+        assert url == KugouAPI.SONG_INFO_URL and params['cmd'] == 'playInfo'
+        song_hash = params['hash']
+        with self._lock:
+            self.queries[song_hash] += 1
+        if song_hash in self.unknown:
+            return FakeResponse(json.dumps({'status': 0, 'errcode': 30020, 'error': '歌曲不存在'}).encode())
+        return FakeResponse(json.dumps({'status': 1, 'errcode': 0, 'timeLength': 200 + len(song_hash),
+                                        'bitRate': 320}).encode())
+
+
+class FakeTransport:
+    def __init__(self, session):
+        self.session = session
+
+
+def make_api(session, detail_cache):
+    return KugouAPI(transport=FakeTransport(session), page_parser=parse_toplist_page,
+                    enrich_details=True, detail_cache=detail_cache, detail_workers=4)
+
+
+def test_enrich_dedupes_and_fills_fields():
+    songs = parse_toplist_page(load_fixture(), RANK_URL)['songs']
+    session = FakeSession(unknown=[songs[1].song_id])
+    api = make_api(session, SongInfoCache(None))
+    enriched = api.enrich(songs + songs[:5])
+
+    # 重复的 Hash 只查询一次
+    assert set(session.queries.values()) == {1}
+    assert len(session.queries) == len({song.song_id for song in songs})
+    first = enriched[0]
+    assert first['比特率'] == 320 and first['时长'] == 200 + len(first.song_id)
+    assert first.rank == songs[0].rank and first.title == songs[0].title
+    # 查不到的歌曲保持原样，也不写入缓存，下次仍会重试
+    assert enriched[1] is songs[1] and '比特率' not in enriched[1]
+    assert songs[1].song_id not in api.detail_cache
+
+
+def test_get_toplist_uses_persistent_cache():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'song_info.json')
+        session = FakeSession()
+        toplist = make_api(session, SongInfoCache(path)).get_toplist(8888)
+        assert all(song['比特率'] == 320 for song in toplist['songs'])
+        first_wave = sum(session.queries.values())
+        assert first_wave == len(toplist['songs'])
+
+        # 重新加载缓存后，仍在榜上的歌曲不再请求
+        session.queries.clear()
+        toplist = make_api(session, SongInfoCache(path)).get_toplist(8888)
+        assert not session.queries
+        assert toplist['songs'][0]['时长'] == 200 + len(toplist['songs'][0].song_id)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
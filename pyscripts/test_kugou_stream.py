@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+酷狗 global.features 流式提取器的离线测试，使用 fixtures/ 中保存的排行榜页面。
+
+可直接运行 `python test_kugou_stream.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import tempfile
+
+import requests
+
+from http_cache import HttpCache
+from kugou_fixed import FeaturesStreamExtractor, KugouAPI, ToplistStreamError
+from transport import Transport
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'kugou_rank_8888.html')
+
+
+def load_fixture() -> bytes:
+    with open(FIXTURE, 'rb') as f:
+        return f.read()
+
+
+class FakeStreamResponse:
+    """模拟 requests 的流式响应，记录被读取的块数；fail_after 块之后抛出网络错误"""
+
+    def __init__(self, content: bytes, status_code: int = 200, etag: str = None, fail_after: int = None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {'ETag': etag} if etag else {}
+        self.encoding = 'utf-8'
+        self.fail_after = fail_after
+        self.chunks_read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            if self.chunks_read == self.fail_after:
+                raise requests.exceptions.ChunkedEncodingError('connection broken')
+            self.chunks_read += 1
+            yield self.content[start:start + chunk_size]
+
+
+def extract_in_chunks(content: bytes, chunk_size: int):
+    # 按完整字典解码，便于与整页解码的结果逐项比较
+    extractor = FeaturesStreamExtractor(decode=json.loads)
+    items = []
+    for start in range(0, len(content), chunk_size):
+        items.extend(extractor.feed(content[start:start + chunk_size]))
+        if extractor.done:
+            break
+    return extractor, items
+
+
+def decode_whole_array(content: bytes):
+    """对照实现：对整页文本定位数组起点后一次性解码"""
+    text = content.decode('utf-8')
+    start = text.index('[', text.index('global.features'))
+    return json.JSONDecoder().raw_decode(text, start)[0]
+
+
+def test_stream_matches_whole_page_decode():
+    content = load_fixture()
+    expected = decode_whole_array(content)
+
+    for chunk_size in (1, 7, 64, 1024, len(content)):
+        extractor, items = extract_in_chunks(content, chunk_size)
+        assert extractor.done, chunk_size
+        assert extractor.title == '酷狗TOP500', chunk_size
+        assert items == expected, chunk_size
+
+
+def test_brackets_and_escapes_inside_strings():
+    _, items = extract_in_chunks(load_fixture(), 5)
+    names = [item['FileName'] for item in items]
+    assert '薛之谦 - 悬溺 [Live]' in names
+    assert 'Taylor Swift - Say "Hello"];' in names
+    assert '张韶涵 - 反斜杠 \\ 测试 {x}' in names
+    assert len(items) == 30
+
+
+def test_stops_downloading_after_array_closes():
+    content = load_fixture()
+    response = FakeStreamResponse(content)
+    api = KugouAPI(transport=Transport(dns_cache_ttl=None))
+    api.session.get = lambda url, **kwargs: response
+
+    toplist = api.get_toplist_stream(8888)
+    assert toplist['title'] == '酷狗TOP500'
+    assert toplist['total'] == 30
+    assert toplist['songs'][0]['排名'] == 1
+    total_chunks = -(-len(content) // api.STREAM_CHUNK_SIZE)
+    assert response.chunks_read < total_chunks or total_chunks == 1
+    api.close()
+
+
+def test_missing_features_returns_none():
+    response = FakeStreamResponse('<html><title>x_排行榜</title></html>'.encode('utf-8') * 10)
+    api = KugouAPI(transport=Transport(dns_cache_ttl=None))
+    api.session.get = lambda url, **kwargs: response
+    assert api.get_toplist_stream(1) is None
+    api.close()
+
+
+def test_broken_stream_fails_the_chart():
+    content = load_fixture()
+    api = KugouAPI(transport=Transport(dns_cache_ttl=None))
+    api.STREAM_CHUNK_SIZE = 256
+    for response in (FakeStreamResponse(content, fail_after=3), FakeStreamResponse(content[:len(content) // 2])):
+        api.session.get = lambda url, **kwargs: response
+        try:
+            list(api.iter_toplist_songs(8888))
+        except ToplistStreamError:
+            pass
+        else:
+            raise AssertionError('页面流中途断开时应抛出 ToplistStreamError')
+        assert api.get_toplist_stream(8888) is None
+
+
+def test_cached_stream_parses_while_downloading():
+    content = load_fixture()
+    requests_sent = []
+
+    def get(url, headers=None, **kwargs):
+        requests_sent.append(headers.get('If-None-Match'))
+        if headers.get('If-None-Match') == '"v1"':
+            return FakeStreamResponse(b'', status_code=304)
+        return FakeStreamResponse(content, etag='"v1"')
+
+    with tempfile.TemporaryDirectory() as root:
+        api = KugouAPI(cache=HttpCache(root, ttl=0), transport=Transport(dns_cache_ttl=None))
+        api.STREAM_CHUNK_SIZE = 256
+        api.session.get = get
+        first = api.get_toplist(8888)
+        assert first['total'] == 30 and 'unchanged' not in first
+        # 数组闭合后停止下载，缓存中只有读到的部分
+        entry = next(iter(api.cache._index.values()))
+        assert entry['partial'] and entry['size'] < len(content)
+
+        second = api.get_toplist(8888)
+        assert second['unchanged'] and second['songs'] == first['songs']
+        assert requests_sent == [None, '"v1"']
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
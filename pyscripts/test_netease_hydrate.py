@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+网易云大歌单补全的离线测试：歌单接口和歌曲详情接口都由假的 session 应答，
+加密器原样返回请求数据，便于检查每次查询了哪些歌曲。
+
+可直接运行 `python test_netease_hydrate.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import tempfile
+import threading
+
+import requests
+
+from netease_fetcher import (API_URL, SONG_DETAIL_URL, HydrationError, TrackDetailCache, fetch_toplist, hydrate_songs,
+                             iter_toplist_songs, parse_tracks)
+
+
+def make_track(track_id):
+    return {'id': track_id, 'name': f'歌曲{track_id}', 'ar': [{'name': f'歌手{track_id}'}], 'al': {'name': '专辑'}}
+
+
+class PlainEncryptor:
+    def encrypt(self, data):
+        return data
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.content = json.dumps(body).encode('utf-8')
+        self.status_code = status_code
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeSession:
+    """歌单接口返回 playlist；歌曲详情接口返回 catalog 中有的歌曲，并记录每批查询的ID"""
+
+    def __init__(self, playlist=None, catalog=(), fail=False, down=False):
+        self.playlist = playlist
+        self.down = down
+        self.catalog = set(catalog)
+        self.fail = fail
+        self.detail_batches = []
+        self._lock = threading.Lock()
+
+    def post(self, url, headers=None, data=None):
+        if self.down:
+            raise requests.exceptions.ConnectionError('connection refused')
+        if url == API_URL:
+            return FakeResponse({'code': 200, 'playlist': self.playlist})
+        assert url == SONG_DETAIL_URL
+        ids = [item['id'] for item in json.loads(data['c'])]
+        with self._lock:
+            self.detail_batches.append(ids)
+        if self.fail:
+            return FakeResponse({'code': 503}, status_code=503)
+        return FakeResponse({'code': 200, 'songs': [make_track(i) for i in ids if i in self.catalog]})
+
+
+class FakeTransport:
+    def __init__(self, session):
+        self.session = session
+
+
+def test_hydrate_batches_and_cache():
+    inline = parse_tracks([make_track(i) for i in (1, 2)])
+    track_ids = [1, 2, 3, 4, 5, 6]
+    session = FakeSession(catalog=range(1, 100))
+    cache = TrackDetailCache(None)
+    songs = hydrate_songs(inline, track_ids, FakeTransport(session), cache, PlainEncryptor(), batch_size=2)
+    assert [song.song_id for song in songs] == track_ids
+    assert [song.rank for song in songs] == [1, 2, 3, 4, 5, 6]
+    assert songs[4]['歌曲名'] == '歌曲5' and songs[4]['歌手'] == '歌手5'
+    assert sorted(session.detail_batches) == [[3, 4], [5, 6]]
+    # 只缓存查询到的歌曲，内联歌曲不缓存
+    assert len(cache) == 4 and 1 not in cache
+
+    # 歌单小幅变化后只查询缓存中没有的歌曲（新上榜的8，以及原来内联、现在掉出内联范围的1）
+    session.detail_batches.clear()
+    inline = parse_tracks([make_track(7)])
+    songs = hydrate_songs(inline, [7, 3, 1, 8, 5], FakeTransport(session), cache, PlainEncryptor(), batch_size=2)
+    assert [(song.rank, song.song_id) for song in songs] == [(1, 7), (2, 3), (3, 1), (4, 8), (5, 5)]
+    assert session.detail_batches == [[1, 8]]
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TrackDetailCache(None, max_entries=3)
+    session = FakeSession(catalog=range(1, 100))
+    hydrate_songs([], [1, 2, 3], FakeTransport(session), cache, PlainEncryptor())
+    # 再次用到1之后查询4，淘汰最久未使用的2
+    hydrate_songs([], [1, 4], FakeTransport(session), cache, PlainEncryptor())
+    assert len(cache) == 3 and 2 not in cache and 1 in cache
+    assert session.detail_batches == [[1, 2, 3], [4]]
+
+
+def test_unavailable_and_failed_batches():
+    session = FakeSession(catalog=[2, 4])
+    songs = hydrate_songs([], [2, 3, 4], FakeTransport(session), TrackDetailCache(None), PlainEncryptor())
+    # 查不到详情的歌曲跳过，其余歌曲保持原来的排名
+    assert [(song.rank, song.song_id) for song in songs] == [(1, 2), (3, 4)]
+
+    failing = FakeSession(fail=True)
+    assert hydrate_songs([], [1, 2], FakeTransport(failing), TrackDetailCache(None), PlainEncryptor()) is None
+
+
+def test_cache_persists():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'tracks.json')
+        cache = TrackDetailCache(path)
+        hydrate_songs([], [10, 11], FakeTransport(FakeSession(catalog=[10, 11])), cache, PlainEncryptor())
+        reloaded = TrackDetailCache(path)
+        assert len(reloaded) == 2 and reloaded.get(11) == ('歌曲11', '歌手11', '专辑')
+        session = FakeSession()
+        songs = hydrate_songs([], [11, 10], FakeTransport(session), reloaded, PlainEncryptor())
+        assert [song.song_id for song in songs] == [11, 10] and session.detail_batches == []
+
+
+def test_fetch_toplist_hydrates_large_playlist():
+    playlist = {
+        'name': '大歌单',
+        'tracks': [make_track(i) for i in range(1, 4)],
+        'trackIds': [{'id': i, 'v': 1} for i in range(1, 11)],
+    }
+    session = FakeSession(playlist=playlist, catalog=range(1, 11))
+    toplist = fetch_toplist(1, transport=FakeTransport(session), track_cache=TrackDetailCache(None),
+                            encryptor=PlainEncryptor())
+    assert toplist['title'] == '大歌单' and 'track_ids' not in toplist
+    assert [song['排名'] for song in toplist['songs']] == list(range(1, 11))
+    assert sorted(i for batch in session.detail_batches for i in batch) == list(range(4, 11))
+
+    # 内联完整的歌单不再请求歌曲详情
+    playlist['trackIds'] = playlist['trackIds'][:3]
+    session.detail_batches.clear()
+    toplist = fetch_toplist(1, transport=FakeTransport(session), track_cache=TrackDetailCache(None),
+                            encryptor=PlainEncryptor())
+    assert len(toplist['songs']) == 3 and session.detail_batches == []
+
+
+def test_request_errors_and_failed_hydration_fail_the_chart():
+    transport = FakeTransport(FakeSession(down=True))
+    assert fetch_toplist(1, transport=transport, encryptor=PlainEncryptor()) is None
+    # 响应结构变化（trackIds 中的元素缺少 id）按失败处理，不抛出
+    broken = FakeTransport(FakeSession(playlist={'name': 'x', 'tracks': [], 'trackIds': [{'v': 1}]}))
+    assert fetch_toplist(1, transport=broken, encryptor=PlainEncryptor()) is None
+
+    # 只有部分歌曲内联、其余补全失败时不产出不完整的榜单
+    playlist = {
+        'name': '大歌单',
+        'tracks': [make_track(i) for i in range(1, 4)],
+        'trackIds': [{'id': i, 'v': 1} for i in range(1, 11)],
+    }
+    session = FakeSession(playlist=playlist, fail=True)
+    assert fetch_toplist(1, transport=FakeTransport(session), track_cache=TrackDetailCache(None),
+                         encryptor=PlainEncryptor()) is None
+    try:
+        list(iter_toplist_songs(1, transport=FakeTransport(session), track_cache=TrackDetailCache(None),
+                                encryptor=PlainEncryptor()))
+    except HydrationError:
+        pass
+    else:
+        raise AssertionError('补全失败时应抛出 HydrationError')
+
+    session.fail = False
+    session.catalog = set(range(1, 11))
+    songs = list(iter_toplist_songs(1, transport=FakeTransport(session), track_cache=TrackDetailCache(None),
+                                    encryptor=PlainEncryptor()))
+    assert [song['排名'] for song in songs] == list(range(1, 11))
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
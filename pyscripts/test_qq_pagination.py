@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+QQ音乐分页获取的离线测试，musicu.fcg 的响应由 fixtures/qq_toplist_26.json 按偏移切片模拟。
+
+可直接运行 `python test_qq_pagination.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import threading
+from typing import Optional, Tuple
+
+from qqmusic_optimized import QQMusicAPI, ToplistPageError
+from schema_drift import SchemaMonitor
+from transport import Transport
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'qq_toplist_26.json')
+
+
+def make_chart(total: int):
+    """用录制的歌曲拼出一个 total 首的榜单，每首歌的 mid 唯一"""
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        module = json.load(f)
+    base = module['data']['songInfoList']
+    songs = [dict(base[i % len(base)], mid=f"MID{i:05d}") for i in range(total)]
+    return module['data']['title'], songs
+
+
+class FakeMusicu:
+    """替换 QQMusicAPI._request_musicu，按请求中的 offset/num 返回榜单切片"""
+
+    def __init__(self, total: int, shift_after_first: int = 0, hold: Optional[Tuple[int, int]] = None):
+        """hold=(offset, n): 该偏移的窗口等到共收到 n 个请求后才返回，使并行请求的数量确定"""
+        self.title, self.songs = make_chart(total)
+        self.shift_after_first = shift_after_first
+        self.hold = hold
+        self.calls = []
+        self._changed = threading.Condition()
+
+    def __call__(self, data):
+        param = data['detail']['param']
+        offset, num = param['offset'], param['num']
+        with self._changed:
+            self.calls.append(offset)
+            self._changed.notify_all()
+            if self.hold and offset == self.hold[0]:
+                self._changed.wait_for(lambda: len(self.calls) >= self.hold[1], timeout=5)
+        # 模拟请求期间榜单更新：第一页之后的窗口整体后移，与上一页产生重叠
+        start = max(0, offset - self.shift_after_first) if offset else 0
+        window = self.songs[start:start + num]
+        return {'code': 0, 'detail': {'code': 0, 'data': {'title': self.title, 'songInfoList': window}}}, None
+
+
+def make_api(fake: FakeMusicu) -> QQMusicAPI:
+    api = QQMusicAPI(transport=Transport(dns_cache_ttl=None), schema_monitor=SchemaMonitor(None))
+    api._request_musicu = fake
+    return api
+
+
+def test_pages_merge_in_rank_order():
+    fake = FakeMusicu(300)
+    api = make_api(fake)
+    pages = list(api.iter_toplist_pages(26, limit=300, page_size=100))
+    assert [page['offset'] for page in pages] == [0, 100, 200]
+
+    toplist = api.get_toplist_paginated(26, limit=300, page_size=100)
+    assert [song['排名'] for song in toplist['songs']] == list(range(1, 301))
+    assert [song['歌曲ID'] for song in toplist['songs']] == [song['mid'] for song in fake.songs]
+    assert 'unchanged' not in toplist
+
+
+def test_short_window_stops_early():
+    fake = FakeMusicu(130)
+    api = make_api(fake)
+    toplist = api.get_toplist_paginated(26, limit=500, page_size=50, max_workers=1)
+    assert len(toplist['songs']) == 130
+    # 第三个窗口只有30首，之后的窗口不再请求
+    assert fake.calls == [0, 50, 100]
+
+    # 并行时只在前面的页完整时补充窗口：0、50 两页完整后补充 200、250，100 不足一页后不再请求
+    fake = FakeMusicu(130, hold=(100, 6))
+    api = make_api(fake)
+    assert len(api.get_toplist_paginated(26, limit=500, page_size=50, max_workers=4)['songs']) == 130
+    assert sorted(fake.calls) == [0, 50, 100, 150, 200, 250]
+
+
+def test_overlapping_windows_are_deduplicated():
+    fake = FakeMusicu(300, shift_after_first=5)
+    api = make_api(fake)
+    toplist = api.get_toplist_paginated(26, limit=300, page_size=100)
+    ids = [song['歌曲ID'] for song in toplist['songs']]
+    assert len(ids) == len(set(ids))
+    assert [song['排名'] for song in toplist['songs']] == list(range(1, len(ids) + 1))
+
+
+def test_first_page_failure_returns_none():
+    api = make_api(FakeMusicu(0))
+    api._request_musicu = lambda data: (None, None)
+    assert api.get_toplist_paginated(26) is None
+
+
+def test_middle_page_failure_fails_whole_chart():
+    fake = FakeMusicu(300)
+    api = make_api(fake)
+    api._request_musicu = lambda data: (None, None) if data['detail']['param']['offset'] == 100 else fake(data)
+    assert api.get_toplist_paginated(26, limit=300, page_size=100) is None
+
+    pages = api.iter_toplist_pages(26, limit=300, page_size=100)
+    assert next(pages)['offset'] == 0
+    try:
+        next(pages)
+    except ToplistPageError:
+        pass
+    else:
+        raise AssertionError('中间窗口失败时应抛出 ToplistPageError')
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+限速与重试调度器的离线测试，使用本地 http.server 模拟 429/503 响应。
+
+可直接运行 `python test_rate_limit.py`，也可用 pytest 执行。
+"""
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rate_limit import RequestScheduler, RetryPolicy, TokenBucket
+from transport import Transport
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """按 server.script 中的 (状态码, 头) 顺序依次响应，用完后一律返回 200"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            status, headers = server.script.pop(0) if server.script else (200, {})
+        body = b'{"code": 0}' if status == 200 else b'busy'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(script):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.script = list(script)
+    server.hits = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def make_transport(sleeps, max_retries=3):
+    policy = RetryPolicy(max_retries=max_retries, rng=random.Random(0))
+    scheduler = RequestScheduler(policy, host_rates={}, default_rate=1000, sleep=sleeps.append)
+    return Transport(dns_cache_ttl=None, scheduler=scheduler)
+
+
+def test_retry_after_is_honored():
+    server, url = start_stub([(429, {'Retry-After': '2'}), (503, {}), (200, {})])
+    sleeps = []
+    transport = make_transport(sleeps)
+    try:
+        response = transport.session.get(url, timeout=5)
+        assert response.status_code == 200
+        assert server.hits == 3
+        assert sleeps[0] == 2.0
+        # 第二次重试没有 Retry-After，退避时间落在 [0, base*2] 内
+        assert 0 <= sleeps[1] <= 1.0
+        stats = transport.scheduler.stats()['127.0.0.1']
+        assert stats['retries'] == 2 and stats['throttled'] == 2
+        # 两次限流后速率减半两次
+        assert stats['rate'] == 250
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+def test_gives_up_after_max_retries():
+    server, url = start_stub([(502, {})] * 5)
+    sleeps = []
+    transport = make_transport(sleeps, max_retries=2)
+    try:
+        response = transport.session.get(url, timeout=5)
+        assert response.status_code == 502
+        assert server.hits == 3
+        assert len(sleeps) == 2
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+def test_retry_after_beyond_max_delay_is_not_retried():
+    server, url = start_stub([(429, {'Retry-After': '3600'})])
+    sleeps = []
+    transport = make_transport(sleeps)
+    try:
+        assert transport.session.get(url, timeout=5).status_code == 429
+        assert server.hits == 1 and sleeps == []
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+def test_token_bucket_spaces_requests():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, clock=lambda: now[0])
+    # 容量为2，前两个请求立即发送，之后每个请求间隔 0.5 秒
+    waits = [bucket.reserve() for _ in range(4)]
+    assert waits == [0.0, 0.0, 0.5, 1.0]
+    now[0] = 10.0
+    assert bucket.reserve() == 0.0
+
+
+def test_backoff_has_full_jitter_and_cap():
+    policy = RetryPolicy(base_delay=1, max_delay=8, rng=random.Random(1))
+    delays = [policy.backoff(attempt) for attempt in range(10)]
+    assert all(0 <= delay <= min(8, 2 ** attempt) for attempt, delay in enumerate(delays))
+    assert len(set(delays)) == len(delays)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
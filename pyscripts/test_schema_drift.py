@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+结构指纹与告警的离线测试：由 fixtures/qq_toplist_26.json 构造QQ音乐 GetDetail 的几种历史结构
+（data.songInfoList、data.song、data.data.song），检查识别、提取函数缓存和告警。
+
+可直接运行 `python test_schema_drift.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import tempfile
+
+import fast_json
+from qqmusic_optimized import (DETAIL_ENDPOINT, TYPED_DETAIL_FINGERPRINT, QQMusicAPI, compile_detail_extractor,
+                               detail_fingerprint)
+from schema_drift import SchemaMonitor
+from transport import Transport
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'qq_toplist_26.json')
+SONG_FINGERPRINT = 'data.song:title,songId,singerName,albumMid'
+
+
+def load_module():
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def song_layout(nested=False):
+    """改版后的结构：只有 data.song，歌手为 singerName；nested 时多嵌套一层 data"""
+    data = load_module()['data']
+    inner = {'title': data['title'], 'song': data['song']}
+    return {'code': 0, 'data': {'data': inner} if nested else inner}
+
+
+def response(module) -> bytes:
+    return json.dumps({'code': 0, 'detail': module}, ensure_ascii=False).encode('utf-8')
+
+
+def make_api():
+    alerts = []
+    monitor = SchemaMonitor(None, on_alert=alerts.append)
+    return QQMusicAPI(transport=Transport(dns_cache_ttl=None), schema_monitor=monitor), alerts
+
+
+def parse(api, module, offset=0):
+    """与客户端相同的路径：先尝试类型化解码，结构不符时退回字典"""
+    return api._parse_toplist(fast_json.decode_qq_detail(response(module))['detail'], offset)
+
+
+def test_fingerprints_of_known_layouts():
+    module = load_module()
+    assert detail_fingerprint(module) == TYPED_DETAIL_FINGERPRINT
+    assert detail_fingerprint(song_layout()) == SONG_FINGERPRINT
+    assert detail_fingerprint(song_layout(nested=True)) == 'data.data.song:title,songId,singerName,albumMid'
+    # 与提取无关的字段增减不改变指纹
+    module['data']['songInfoList'][0]['new_field'] = 1
+    assert detail_fingerprint(module) == TYPED_DETAIL_FINGERPRINT
+    assert detail_fingerprint({'code': 0, 'data': {'title': 'x', 'songInfoList': []}}) is None
+    assert detail_fingerprint({'code': 0, 'data': {'title': 'x', 'list': [1]}}) == 'unknown:list,title'
+    # 歌手字段改为字符串时无法提取
+    assert compile_detail_extractor('data.songInfoList:name,mid,singer,album{}') is None
+
+
+def test_layout_change_alerts_once_and_uses_compiled_extractor():
+    api, alerts = make_api()
+    before = parse(api, load_module())
+    assert len(before['songs']) == 100 and not alerts
+
+    data = song_layout()['data']
+    compiled = []
+    for offset in (0, 100):
+        toplist = parse(api, song_layout(), offset)
+        compiled.append(len(api.schema_monitor._extractors))
+        expected = [QQMusicAPI.html_decode(item['title']) for item in data['song']]
+        assert [song.title for song in toplist['songs']] == expected
+        first = toplist['songs'][0]
+        assert first.rank == offset + 1 and first.artist == '邓紫棋' and first.song_id == 727184843
+        assert first.album == '' and first.album_id == data['song'][0]['albumMid']
+    # 改版只告警一次，同一结构的提取函数只编译一次
+    assert [(alert.kind, alert.previous, alert.fingerprint) for alert in alerts] == [
+        ('changed', TYPED_DETAIL_FINGERPRINT, SONG_FINGERPRINT)]
+    assert compiled[0] == compiled[1]
+
+    nested = parse(api, song_layout(nested=True))
+    assert nested['title'] == data['title'] and len(nested['songs']) == 100
+    assert len(alerts) == 2
+
+
+def test_unknown_and_broken_responses_are_reported_not_degraded():
+    api, alerts = make_api()
+    unknown = {'code': 0, 'data': {'title': '榜', 'tracks': [{'name': 'x'}]}}
+    assert parse(api, unknown) is None and parse(api, unknown) is None
+    assert [alert.kind for alert in alerts] == ['unknown']
+
+    module = load_module()
+    del module['data']['songInfoList'][5]['album']
+    assert parse(api, module) is None
+    assert alerts[-1].kind == 'failed' and "'album'" in alerts[-1].detail
+
+    # 空的分页窗口和返回错误码的模块不算结构变化
+    empty = {'code': 0, 'data': {'title': '榜', 'songInfoList': []}}
+    assert parse(api, empty) == {'title': '榜', 'songs': []}
+    assert parse(api, {'code': 2000}) is None
+    assert [alert.kind for alert in alerts] == ['unknown', 'changed', 'failed']
+
+
+def test_fingerprints_persist_across_runs():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'schema_fingerprints.json')
+        first = SchemaMonitor(path, on_alert=None)
+        assert first.observe(DETAIL_ENDPOINT, TYPED_DETAIL_FINGERPRINT) is False
+
+        alerts = []
+        second = SchemaMonitor(path, on_alert=alerts.append)
+        assert second.fingerprints() == {DETAIL_ENDPOINT: TYPED_DETAIL_FINGERPRINT}
+        assert second.observe(DETAIL_ENDPOINT, SONG_FINGERPRINT) is True
+        assert alerts[0].previous == TYPED_DETAIL_FINGERPRINT
+        assert SchemaMonitor(path).fingerprints()[DETAIL_ENDPOINT] == SONG_FINGERPRINT
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+跨平台搜索服务的离线测试：各平台搜索函数由假的实现代替，记录调用次数。
+
+可直接运行 `python test_search_service.py`，也可用 pytest 执行。
+"""
+import threading
+import time
+
+from kugou_fixed import KugouAPI
+from qqmusic_optimized import QQMusicAPI
+from search_service import PLATFORMS, SearchService, merge_results
+from song_identity import SongIdentityIndex
+from song_record import SongRecord
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeSearcher:
+    """按页返回固定结果，记录每次请求的 (关键词, 页码)"""
+
+    def __init__(self, platform, pages, fail=False):
+        self.platform = platform
+        self.pages = pages
+        self.fail = fail
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, keyword, page, page_size):
+        with self._lock:
+            self.calls.append((keyword, page))
+        if self.fail:
+            return None
+        titles = self.pages.get(page, [])
+        return [SongRecord((page - 1) * page_size + i, title, artist, '', f"{self.platform}-{title}")
+                for i, (title, artist) in enumerate(titles, 1)]
+
+
+def make_service(fail=(), **kwargs):
+    searchers = {
+        'qq': FakeSearcher('qq', {1: [('晴天', '周杰伦'), ('七里香', '周杰伦')], 2: [('稻香', '周杰伦')]}),
+        'kugou': FakeSearcher('kugou', {1: [('七里香', '周杰伦'), ('晴天 (Live)', '周杰伦')]}),
+        'netease': FakeSearcher('netease', {1: [('晴天', '周杰倫')]}),
+    }
+    for platform in fail:
+        searchers[platform].fail = True
+    kwargs.setdefault('clock', FakeClock())
+    return SearchService(searchers, page_size=2, **kwargs), searchers
+
+
+def test_merge_ranks_cross_platform_matches_first():
+    results = {
+        'qq': [SongRecord(1, '孤勇者', '陈奕迅', '', 'a'), SongRecord(2, '晴天', '周杰伦', '', 'b')],
+        'netease': [SongRecord(1, '晴天', '周杰倫', '', 1), SongRecord(2, '其它', '某人', '', 2)],
+        'kugou': [SongRecord(3, '晴天 (Live)', '周杰伦', '', 'H')],
+    }
+    hits = merge_results(results, SongIdentityIndex(None))
+    # 繁简、版本标注归一化后三个平台的"晴天"合并为一条，排在单平台第一名之前
+    assert hits[0].title == '晴天' and set(hits[0].sources) == {'qq', 'netease', 'kugou'}
+    assert hits[0].sources['netease'].song_id == 1
+    assert [hit.title for hit in hits[1:]] == ['孤勇者', '其它']
+
+
+def test_cache_hits_skip_remote_calls():
+    clock = FakeClock()
+    service, searchers = make_service(clock=clock, prefetch=False)
+    try:
+        first = service.search('周杰伦')
+        assert first[0].title == '晴天' and len(first[0].sources) == 3
+        start = time.perf_counter()
+        again = service.search('  周杰伦 ')
+        assert time.perf_counter() - start < 0.01
+        assert again is first
+        assert all(len(searcher.calls) == 1 for searcher in searchers.values())
+        assert service.stats()['cache_hits'] == 1
+
+        # 过期后重新请求
+        clock.now += 301
+        service.search('周杰伦')
+        assert all(len(searcher.calls) == 2 for searcher in searchers.values())
+    finally:
+        service.close()
+
+
+def test_lru_eviction():
+    service, searchers = make_service(prefetch=False, cache_size=2)
+    try:
+        for keyword in ('a', 'b', 'a', 'c', 'a', 'b'):
+            service.search(keyword)
+        # a 一直被访问，b 在 c 写入时被淘汰，需要重新请求
+        assert [call[0] for call in searchers['qq'].calls] == ['a', 'b', 'c', 'b']
+    finally:
+        service.close()
+
+
+def test_prefetches_next_page():
+    service, searchers = make_service()
+    try:
+        service.search('周杰伦')
+        # 等待后台预取完成后，第二页直接命中缓存
+        service._prefetcher.submit(lambda: None).result()
+        assert ('周杰伦', 2) in searchers['qq'].calls
+        page2 = service.search('周杰伦', 2)
+        assert [hit.title for hit in page2] == ['稻香'] and page2[0].sources['qq'].rank == 3
+        assert searchers['qq'].calls.count(('周杰伦', 2)) == 1
+        stats = service.stats()
+        assert stats['prefetched'] >= 1 and stats['cache_hits'] + stats['joined'] >= 1
+    finally:
+        service.close()
+
+
+def test_partial_and_total_failures():
+    clock = FakeClock()
+    service, searchers = make_service(fail=['kugou'], clock=clock, prefetch=False)
+    try:
+        hits = service.search('周杰伦')
+        assert hits and all('kugou' not in hit.sources for hit in hits)
+        # 部分失败的结果只缓存 error_ttl
+        clock.now += 31
+        service.search('周杰伦')
+        assert len(searchers['qq'].calls) == 2
+    finally:
+        service.close()
+
+    service, searchers = make_service(fail=PLATFORMS, prefetch=False)
+    try:
+        assert service.search('周杰伦') == []
+        assert service.stats()['cached_pages'] == 0
+    finally:
+        service.close()
+
+
+def test_close_releases_callers_waiting_on_queued_prefetch():
+    service, searchers = make_service()
+    release = threading.Event()
+    qq = searchers['qq']
+
+    def blocking(keyword, page, page_size):
+        # A 的第二页（唯一的预取线程正在执行）一直阻塞，B 的第二页只能排队
+        if keyword == 'A' and page == 2:
+            release.wait(5)
+        return FakeSearcher.__call__(qq, keyword, page, page_size)
+    service.searchers['qq'] = blocking
+
+    service.search('A')
+    service.search('B')
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(service.search('B', 2)))
+    waiter.start()
+    while service.stats()['joined'] < 1:
+        time.sleep(0.001)
+
+    closer = threading.Thread(target=service.close)
+    closer.start()
+    waiter.join(2)
+    assert not waiter.is_alive() and results == [[]]
+    release.set()
+    closer.join(5)
+    assert not closer.is_alive() and service._inflight == {}
+    # 关闭后不再预取
+    assert service.search('A') and service.stats()['prefetched'] == 2
+
+
+def test_platform_search_parsers():
+    module = {'code': 0, 'data': {'body': {'song': {'list': [
+        {'name': '晴天', 'mid': '0039MnYb0qxYhV', 'singer': [{'name': '周杰伦'}], 'album': {'name': '叶惠美'}},
+        {'name': 'Rock &amp; Roll', 'mid': 'x', 'singer': [{'name': 'A'}, {'name': 'B'}], 'album': {}},
+    ]}}}}
+    songs = QQMusicAPI._parse_search(module, offset=20)
+    assert [(song.rank, song.title, song.artist) for song in songs] == [(21, '晴天', '周杰伦'), (22, 'Rock & Roll', 'A & B')]
+
+    song = KugouAPI._song_from_search(1, {'SongName': '<em>晴天</em>', 'SingerName': '<em>周杰伦</em>',
+                                          'AlbumName': '叶惠美', 'FileHash': 'ABC', 'Duration': 269})
+    assert song.to_dict() == {'排名': 1, '歌曲名': '晴天', '歌手': '周杰伦', '专辑': '叶惠美', 'Hash': 'ABC', '时长': 269}
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+跨平台歌曲身份索引的离线测试：各平台不同写法的同一首歌得到相同的标准ID，且标准ID在重新加载后保持不变。
+
+可直接运行 `python test_song_identity.py`，也可用 pytest 执行。
+"""
+import os
+import tempfile
+
+from song_identity import SongIdentityIndex, normalize_artists, normalize_title
+from song_record import CANONICAL_ID_FIELD
+
+
+def test_normalization_folds_platform_variants():
+    assert normalize_title('晴天（Live）') == normalize_title('晴天 [Live]') == '晴天'
+    assert normalize_title('ＬＯＶＥ feat. 某人') == 'love'
+    assert normalize_title('愛的時候') == normalize_title('爱的时候')
+    # 整个歌名都在括号里时保留原文
+    assert normalize_title('(Intro)') == '(intro)'
+    assert normalize_artists('周杰倫 & 陳奕迅') == normalize_artists('陈奕迅 / 周杰伦') == normalize_artists('周杰伦、陈奕迅')
+
+
+def test_same_song_across_platforms_shares_canonical_id():
+    index = SongIdentityIndex(path=None)
+    qq = index.annotate('qq', [{'歌曲名': '晴天', '歌手': '周杰伦', '歌曲ID': 'M1'}])
+    kugou = index.annotate('kugou', [{'歌曲名': '晴天 (Live)', '歌手': '周杰倫、某乐队', 'Hash': 'H1'}])
+    netease = index.annotate('netease', [{'歌曲名': '晴天', '歌手': '另一位歌手', '歌曲ID': 1}])
+    assert qq[0][CANONICAL_ID_FIELD] == kugou[0][CANONICAL_ID_FIELD]
+    # 同名但歌手没有交集的是另一首歌
+    assert netease[0][CANONICAL_ID_FIELD] != qq[0][CANONICAL_ID_FIELD]
+    # 合并后的歌手集合让只写合作歌手的版本也能匹配
+    assert index.resolve('netease', {'歌曲名': '晴天', '歌手': '某乐队', '歌曲ID': 2}) == qq[0][CANONICAL_ID_FIELD]
+
+
+def test_canonical_ids_survive_reload():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'song_identity.json')
+        index = SongIdentityIndex(path)
+        first = index.resolve('qq', {'歌曲名': '稻香', '歌手': '周杰伦', '歌曲ID': 'M2'})
+        index.save()
+
+        reloaded = SongIdentityIndex(path)
+        assert reloaded.resolve('qq', {'歌曲名': '改名后的歌', '歌手': '周杰伦', '歌曲ID': 'M2'}) == first
+        assert reloaded.resolve('kugou', {'歌曲名': '稻香', '歌手': '周杰伦', 'Hash': 'H2'}) == first
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+流式歌曲管线的离线测试，酷狗数据来自 fixtures/kugou_rank_8888.html。
+
+可直接运行 `python test_song_pipeline.py`，也可用 pytest 执行。
+"""
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+
+from exporters import CsvExporter
+from kugou_fixed import KugouAPI
+from qqmusic_optimized import ToplistPageError
+from song_identity import SongIdentityIndex
+from song_pipeline import (CsvSink, JsonLinesSink, Pipeline, SqliteSink, chain_sources, dedupe, enrich,
+                           kugou_source, normalize)
+from test_kugou_stream import FakeStreamResponse, load_fixture
+from transport import Transport
+
+
+def make_kugou_api() -> KugouAPI:
+    api = KugouAPI(transport=Transport(dns_cache_ttl=None))
+    api.session.get = lambda url, **kwargs: FakeStreamResponse(load_fixture())
+    return api
+
+
+def read_csv(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_csv_sink_matches_exporter():
+    api = make_kugou_api()
+    with tempfile.TemporaryDirectory() as root:
+        count = Pipeline(kugou_source(api, 8888, '酷狗TOP500榜')).pipe(normalize).run([CsvSink(root)])
+        assert count == 30
+        streamed = read_csv(os.path.join(root, 'kugou_toplists', '酷狗TOP500榜.csv'))
+
+        expected_root = os.path.join(root, 'expected')
+        CsvExporter(expected_root).export('kugou', 8888, '酷狗TOP500榜', api.get_toplist_stream(8888))
+        assert streamed == read_csv(os.path.join(expected_root, 'kugou_toplists', '酷狗TOP500榜.csv'))
+
+
+def test_records_flow_lazily():
+    api = make_kugou_api()
+    fetched = []
+    api.session.get = lambda url, **kwargs: fetched.append(url) or FakeStreamResponse(load_fixture())
+    sources = (kugou_source(api, rank_id, str(rank_id)) for rank_id in (8888, 6666))
+    stream = iter(Pipeline(chain_sources(sources)).pipe(normalize))
+
+    first = next(stream)
+    assert first['rank'] == 1 and first['platform'] == 'kugou'
+    # 第二个榜单还没有开始请求
+    assert len(fetched) == 1
+    assert sum(1 for _ in stream) == 59
+    assert len(fetched) == 2
+
+
+def test_all_sinks_receive_enriched_deduplicated_records():
+    api = make_kugou_api()
+    with tempfile.TemporaryDirectory() as root:
+        jsonl_path = os.path.join(root, 'songs.jsonl')
+        db_path = os.path.join(root, 'songs.db')
+        # 同一个榜单出现两次，去重后只保留一份
+        sources = [kugou_source(api, 8888, 'TOP500', period='2024-06-01') for _ in range(2)]
+        pipeline = (Pipeline(chain_sources(sources))
+                    .pipe(normalize)
+                    .pipe(enrich(SongIdentityIndex(path=None)))
+                    .pipe(dedupe()))
+        count = pipeline.run([CsvSink(root), JsonLinesSink(jsonl_path), SqliteSink(db_path, batch_size=7)])
+        assert count == 30
+
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        assert len(lines) == 30
+        assert all(line['canonical_id'] for line in lines)
+        assert lines[0]['rank'] == 1 and lines[0]['song_id'] and lines[0]['period'] == '2024-06-01'
+
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM chart_songs").fetchone()[0] == 30
+        conn.close()
+
+        rows = read_csv(os.path.join(root, 'kugou_toplists', 'TOP500.csv'))
+        assert rows[0][-1] == '标准ID' and len(rows) == 31
+
+
+def test_failed_source_keeps_previous_outputs():
+    api = make_kugou_api()
+    with tempfile.TemporaryDirectory() as root:
+        jsonl_path = os.path.join(root, 'songs.jsonl')
+        db_path = os.path.join(root, 'songs.db')
+
+        def sinks():
+            return [CsvSink(root), JsonLinesSink(jsonl_path), SqliteSink(db_path, batch_size=2)]
+
+        Pipeline(kugou_source(api, 8888, 'TOP500', period='2024-06-01')).pipe(normalize).run(sinks())
+        csv_path = os.path.join(root, 'kugou_toplists', 'TOP500.csv')
+        before = read_csv(csv_path)
+
+        def failing():
+            # 下一期的榜单写出3行后，后面的分页窗口失败
+            yield from itertools.islice(kugou_source(api, 8888, 'TOP500', period='2024-06-08'), 3)
+            raise ToplistPageError('窗口失败')
+
+        try:
+            Pipeline(failing()).pipe(normalize).run(sinks())
+        except ToplistPageError:
+            pass
+        else:
+            raise AssertionError('数据源的异常应继续抛出')
+
+        assert read_csv(csv_path) == before and len(before) == 31
+        assert not os.path.exists(csv_path + '.tmp')
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            assert {json.loads(line)['period'] for line in f} == {'2024-06-01'}
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT DISTINCT period FROM chart_songs").fetchall() == [('2024-06-01',)]
+        conn.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
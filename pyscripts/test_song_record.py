@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+SongRecord 与原有歌曲字典用法的兼容性测试。
+
+可直接运行 `python test_song_record.py`，也可用 pytest 执行。
+"""
+import csv
+import io
+import pickle
+
+from song_record import SongRecord, with_canonical_id
+
+
+def make_kugou_record():
+    return SongRecord(rank=3, title='悬溺 [Live]', artist='薛之谦', album='天外来物', song_id='A1B2',
+                      duration=245, id_field='Hash')
+
+
+def test_mapping_matches_legacy_dict():
+    record = make_kugou_record()
+    legacy = {'排名': 3, '歌曲名': '悬溺 [Live]', '歌手': '薛之谦', '专辑': '天外来物', 'Hash': 'A1B2', '时长': 245}
+    assert record == legacy
+    assert record.to_dict() == legacy
+    assert list(record) == list(legacy)
+    assert record['Hash'] == 'A1B2' and record.get('歌曲ID') is None
+    assert '标准ID' not in record
+
+
+def test_records_are_immutable_and_picklable():
+    record = make_kugou_record()
+    try:
+        record.rank = 1
+        assert False, "应当不可修改"
+    except AttributeError:
+        pass
+    moved = record.replace(rank=1)
+    assert moved['排名'] == 1 and record['排名'] == 3
+    assert pickle.loads(pickle.dumps(record)) == record
+
+
+def test_canonical_id_and_csv_writer():
+    record = with_canonical_id(make_kugou_record(), 'abc123')
+    assert record['标准ID'] == 'abc123'
+    assert with_canonical_id({'排名': 1}, 'x') == {'排名': 1, '标准ID': 'x'}
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=['排名', '歌曲名', '歌手', '专辑', 'Hash', '时长', '标准ID'],
+                            extrasaction='ignore')
+    writer.writerow(record)
+    assert buffer.getvalue().strip() == '3,悬溺 [Live],薛之谦,天外来物,A1B2,245,abc123'
+
+
+def test_strings_are_interned():
+    first = SongRecord(1, ''.join(['晴', '天']), ''.join(['周', '杰伦']), '叶惠美', 'm1')
+    second = SongRecord(1, ''.join(['晴', '天']), ''.join(['周', '杰伦']), '叶惠美', 'm1')
+    assert first.title is second.title and first.artist is second.artist
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+指标与追踪的离线测试：span 嵌套与标签继承、Prometheus 文本格式，
+以及经 bench_fetchers 的本地 stub 服务器完成一次网易云榜单抓取时各阶段都有记录。
+
+可直接运行 `python test_telemetry.py`，也可用 pytest 执行。
+"""
+import json
+import os
+import tempfile
+import urllib.request
+
+from bench_fetchers import StubServer, make_stub_transport
+from netease_fetcher import fetch_toplist
+from telemetry import STAGE_METRIC, Telemetry, get_telemetry, start_metrics_server
+
+
+def test_span_nesting_and_labels():
+    telemetry = Telemetry()
+    with telemetry.span('fetch_chart', platform='qq', chart=26, chart_name='热歌榜') as outer:
+        with telemetry.stage('parse') as inner:
+            assert telemetry.current_span() is inner
+        telemetry.record_stage('ttfb', 0.2, status=200)
+        telemetry.count('fetch_requests_total', status=200)
+    assert telemetry.current_span() is None
+
+    spans = {span['name']: span for span in telemetry.spans()}
+    assert set(spans) == {'fetch_chart', 'parse', 'ttfb'}
+    assert spans['parse']['parent_span_id'] == outer.span_id
+    assert spans['parse']['trace_id'] == spans['fetch_chart']['trace_id']
+    assert spans['fetch_chart']['parent_span_id'] is None
+    ttfb = spans['ttfb']
+    assert abs((ttfb['end_time_unix_nano'] - ttfb['start_time_unix_nano']) / 1e9 - 0.2) < 1e-3
+
+    # platform/chart 由父 span 继承为指标标签，chart_name 只是属性
+    assert telemetry.counter_value('fetch_requests_total', platform='qq', chart=26) == 1
+    assert telemetry.stage_summary()['ttfb'] == {'count': 1, 'sum': 0.2}
+    assert 'chart_name' not in telemetry.prometheus_text()
+
+
+def test_error_span_and_export():
+    telemetry = Telemetry(max_spans=2)
+    try:
+        with telemetry.stage('decode', platform='kugou'):
+            raise ValueError('bad json')
+    except ValueError:
+        pass
+    span = telemetry.spans()[0]
+    assert span['status'] == 'ERROR' and 'bad json' in span['attributes']['error']
+    # 出错的阶段同样计入耗时
+    assert telemetry.stage_summary()['decode']['count'] == 1
+
+    for name in ('a', 'b'):
+        with telemetry.span(name):
+            pass
+    assert [span['name'] for span in telemetry.spans()] == ['a', 'b']
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'spans.jsonl')
+        assert telemetry.export_spans(path) == 2
+        with open(path, encoding='utf-8') as f:
+            assert [json.loads(line)['name'] for line in f] == ['a', 'b']
+
+
+def test_prometheus_format():
+    telemetry = Telemetry(buckets=(0.1, 1.0))
+    with telemetry.span('fetch_chart', platform='netease', chart='say "hi"\\'):
+        telemetry.record_stage('download', 0.05)
+        telemetry.record_stage('download', 0.5)
+        telemetry.record_stage('download', 5)
+        telemetry.count('fetch_bytes_total', 1024, direction='in')
+    text = telemetry.prometheus_text()
+    labels = 'chart="say \\"hi\\"\\\\",platform="netease",stage="download"'
+    assert f'# TYPE {STAGE_METRIC} histogram' in text
+    assert f'{STAGE_METRIC}_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'{STAGE_METRIC}_bucket{{{labels},le="1.0"}} 2' in text
+    assert f'{STAGE_METRIC}_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f'{STAGE_METRIC}_sum{{{labels}}} 5.550000' in text
+    assert f'{STAGE_METRIC}_count{{{labels}}} 3' in text
+    assert '# TYPE fetch_bytes_total counter' in text
+    assert 'fetch_bytes_total{chart="say \\"hi\\"\\\\",direction="in",platform="netease"} 1024' in text
+
+    server = start_metrics_server(0, telemetry, host='127.0.0.1')
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert response.read().decode('utf-8') == text
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_records_stages():
+    telemetry = get_telemetry()
+    telemetry.reset()
+    with StubServer(latency=0) as server:
+        transport = make_stub_transport(server.base_url, pool_maxsize=2)
+        try:
+            with telemetry.span('fetch_chart', platform='netease', chart=3778678):
+                result = fetch_toplist(3778678, transport=transport)
+        finally:
+            transport.close()
+    assert result and result['songs']
+
+    summary = telemetry.stage_summary()
+    for stage in ('connect', 'ttfb', 'download', 'decode', 'parse'):
+        assert summary.get(stage, {}).get('count', 0) >= 1, stage
+    assert telemetry.counter_value('fetch_requests_total', platform='netease', chart=3778678) == 1
+    assert telemetry.counter_value('fetch_bytes_total', direction='in', platform='netease') > 0
+    assert telemetry.counter_value('fetch_bytes_total', direction='out', platform='netease') > 0
+    request = next(span for span in telemetry.spans() if span['name'] == 'http.request')
+    assert request['attributes']['status_code'] == 200 and request['attributes']['bytes_in'] > 0
+    telemetry.reset()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+共用传输层的离线测试：请求发往 bench_fetchers 的本地 stub 服务器，检查长连接复用、
+只作用于本 Transport 的DNS缓存，以及 HTTP/2 后端的超时转换（需要 httpx，未安装时跳过）。
+
+可直接运行 `python test_transport.py`，也可用 pytest 执行。
+"""
+from urllib3.connection import HTTPConnection
+
+from bench_fetchers import StubServer
+from telemetry import get_telemetry
+from transport import DnsCache, Http2Session, TimedHTTPConnection, Transport
+
+try:
+    import httpx
+except ImportError:  # 可选依赖
+    httpx = None
+
+KUGOU_PATH = '/yy/rank/home/1-8888.html'
+
+
+def dns_lookups() -> int:
+    return get_telemetry().stage_summary().get('dns', {}).get('count', 0)
+
+
+def test_pooled_connection_is_reused_and_resolved_once():
+    with StubServer(latency=0) as server:
+        port = server.httpd.server_address[1]
+        url = f"http://localhost:{port}{KUGOU_PATH}"
+        transport = Transport(pool_maxsize=2)
+        before = dns_lookups()
+        try:
+            for _ in range(5):
+                response = transport.session.get(url, timeout=5)
+                response.raise_for_status()
+            stats = transport.stats()
+        finally:
+            transport.close()
+
+    assert stats[f"http://localhost:{port}"] == {'requests': 5, 'connections': 1, 'handshakes': 0,
+                                                 'reuse_ratio': 0.8}
+    assert dns_lookups() == before + 1
+    assert list(transport.dns_cache._entries) == [('localhost', port)]
+
+
+def test_dns_cache_is_scoped_to_its_transport():
+    transport = Transport(dns_cache_ttl=300)
+    plain = Transport(dns_cache_ttl=None)
+    try:
+        assert transport.dns_cache is not None and plain.dns_cache is None
+        # 缓存只注入到该 Transport 连接池派生的连接类，全局的连接类不受影响
+        assert TimedHTTPConnection.dns_cache is None
+        assert not hasattr(HTTPConnection, 'dns_cache')
+    finally:
+        transport.close()
+        plain.close()
+
+
+def test_dns_cache_expires_after_ttl():
+    cache = DnsCache(ttl=300)
+    before = dns_lookups()
+    first = cache.resolve('localhost', 80)
+    assert cache.resolve('localhost', 80) == first
+    assert dns_lookups() == before + 1
+
+    expired = DnsCache(ttl=0)
+    expired.resolve('localhost', 80)
+    expired.resolve('localhost', 80)
+    assert dns_lookups() == before + 3
+
+
+def test_http2_session_keeps_client_timeouts():
+    if httpx is None:
+        return
+    session = Http2Session(max_connections=1, keepalive_expiry=5)
+    try:
+        # 未指定超时时使用客户端默认值，而不是关闭全部超时
+        assert session._timeout(None) is httpx.USE_CLIENT_DEFAULT
+        assert session._timeout((3, 10)) == httpx.Timeout(10, connect=3)
+        assert session._timeout(7) == 7
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+WeapiEncryptor 的离线测试：加密结果可按 weapi 算法解回原始请求体，密钥对按使用次数和存活时间轮换。
+
+可直接运行 `python test_weapi.py`，也可用 pytest 执行。
+"""
+import base64
+import json
+
+from Crypto.Cipher import AES
+
+from netease_fetcher import MODULUS, NONCE, PUBKEY, WeapiEncryptor, rsa_encrypt
+
+PAYLOAD = {'id': 3778678, 'n': 100000, 's': 8, 'csrf_token': ''}
+
+
+def aes_decrypt(text: bytes, key: bytes) -> bytes:
+    plain = AES.new(key, AES.MODE_CBC, WeapiEncryptor.IV).decrypt(base64.b64decode(text))
+    return plain[:-plain[-1]]
+
+
+def decrypt(encryptor: WeapiEncryptor, encrypted) -> dict:
+    """按 encSecKey 在密钥池中找到对应的 secret_key，解开两层AES"""
+    secret_key = next(entry[0] for entry in encryptor._pool if entry[1] == encrypted['encSecKey'])
+    return json.loads(aes_decrypt(aes_decrypt(encrypted['params'].encode('utf-8'), secret_key), NONCE))
+
+
+def test_encrypt_round_trips_and_matches_reference_rsa():
+    encryptor = WeapiEncryptor(pool_size=2)
+    for secret_key, enc_sec_key, _, _ in encryptor._pool:
+        assert enc_sec_key == rsa_encrypt(secret_key, PUBKEY, MODULUS)
+    for _ in range(3):
+        assert decrypt(encryptor, encryptor.encrypt(PAYLOAD)) == PAYLOAD
+
+
+def test_key_rotates_after_max_uses():
+    encryptor = WeapiEncryptor(pool_size=1, max_uses=2)
+    keys = [encryptor.encrypt(PAYLOAD)['encSecKey'] for _ in range(5)]
+    assert keys[0] == keys[1] != keys[2] == keys[3] != keys[4]
+
+
+def test_key_rotates_after_max_age():
+    encryptor = WeapiEncryptor(pool_size=1, max_uses=100, max_age=0)
+    keys = {encryptor.encrypt(PAYLOAD)['encSecKey'] for _ in range(3)}
+    assert len(keys) == 3
+
+    encryptor = WeapiEncryptor(pool_size=1, max_uses=100)
+    assert len({encryptor.encrypt(PAYLOAD)['encSecKey'] for _ in range(3)}) == 1
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"通过: {name}")
@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+from rate_limit import RequestScheduler, ScheduledSession
+from telemetry import get_telemetry
+
+try:
+    import brotli  # noqa: F401  urllib3 检测到 brotli 后会自动解压 br 编码
+    _BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        _BROTLI = True
+    except ImportError:
+        _BROTLI = False
+
+ACCEPT_ENCODING = 'gzip, deflate, br' if _BROTLI else 'gzip, deflate'
+
+# 长连接的TCP保活参数
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+
+# --- DNS 缓存 ---
+
+class DnsCache:
+    """
+    带TTL的DNS解析缓存，只用于所属 Transport 的连接池建连，不影响进程内其它代码的解析
+
+    解析失败不缓存；同一主机的全部地址都缓存，建连时依次尝试。
+    """
+
+    def __init__(self, ttl: float = 300, maxsize: int = 256):
+        """
+        Args:
+            ttl: 解析结果的缓存秒数
+            maxsize: 最多缓存的 (主机, 端口) 数
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+
+    def resolve(self, host: str, port: int) -> List[Tuple]:
+        """
+        解析主机，返回 socket.getaddrinfo 的结果（只包含 SOCK_STREAM 地址）
+
+        Raises:
+            socket.gaierror: 解析失败
+        """
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and cached[0] > now:
+                self._entries.move_to_end(key)
+                return cached[1]
+        start = time.perf_counter()
+        result = socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+        get_telemetry().record_stage('dns', time.perf_counter() - start, host=host)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _CachedDnsConnection:
+    """
+    连接类的混入：设置了 dns_cache 时按缓存的地址依次建连
+
+    建连时把 _dns_host 临时换成解析出的IP，TLS 的 SNI 和证书校验仍使用原主机名 (host)。
+    """
+
+    dns_cache: Optional[DnsCache] = None
+
+    def _new_conn(self):
+        if self.dns_cache is None:
+            return super()._new_conn()
+        host = self._dns_host
+        try:
+            addresses = self.dns_cache.resolve(host, self.port)
+        except socket.gaierror as e:
+            raise NewConnectionError(self, f"Failed to resolve '{host}' ({e})") from e
+        error: Optional[Exception] = None
+        try:
+            for address in addresses:
+                self._dns_host = address[4][0]
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+        finally:
+            self._dns_host = host
+        raise error or NewConnectionError(self, f"Failed to resolve '{host}' (no addresses)")
+
+
+# --- 连接建立计时 ---
+
+def _record_setup(stage: str, seconds: float):
+    """记录建连阶段，并累计到当前请求 span 上，用于从首字节时间中扣除"""
+    telemetry = get_telemetry()
+    telemetry.record_stage(stage, seconds)
+    span = telemetry.current_span()
+    if span is not None:
+        span.attributes['setup_seconds'] = span.attributes.get('setup_seconds', 0.0) + seconds
+
+
+class TimedHTTPConnection(_CachedDnsConnection, HTTPConnection):
+    """记录TCP连接耗时的连接"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _record_setup('connect', time.perf_counter() - start)
+        return sock
+
+
+class TimedHTTPSConnection(_CachedDnsConnection, HTTPSConnection):
+    """分别记录TCP连接和TLS握手耗时的连接"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        self._tcp_seconds = time.perf_counter() - start
+        _record_setup('connect', self._tcp_seconds)
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        self._tcp_seconds = 0.0
+        super().connect()
+        _record_setup('tls', time.perf_counter() - start - self._tcp_seconds)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    连接池按并发量设置大小并开启TCP保活的适配器
+
+    每个请求记录一个 http.request span：建连（connect/tls）、首字节 (ttfb)、读取响应体 (download)
+    三个阶段，以及请求数和收发字节数（见 telemetry.py）。
+    设置 dns_cache 时，只有经过这个适配器新建的连接使用该缓存解析主机。
+    """
+
+    dns_cache: Optional[DnsCache] = None
+
+    def __init__(self, *args, dns_cache: Optional[DnsCache] = None, **kwargs):
+        self.dns_cache = dns_cache
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = KEEPALIVE_SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+        pool_classes = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+        if self.dns_cache is not None:
+            # 连接类由连接池直接实例化，为本适配器派生带 dns_cache 的子类
+            pool_classes = {
+                scheme: type(pool_cls.__name__, (pool_cls,), {
+                    'ConnectionCls': type(pool_cls.ConnectionCls.__name__, (pool_cls.ConnectionCls,),
+                                          {'dns_cache': self.dns_cache}),
+                })
+                for scheme, pool_cls in pool_classes.items()
+            }
+        self.poolmanager.pool_classes_by_scheme = pool_classes
+
+    def send(self, request, stream=False, **kwargs):
+        telemetry = get_telemetry()
+        host = urlsplit(request.url).hostname or ''
+        with telemetry.span('http.request', method=request.method, host=host) as span:
+            start = time.perf_counter()
+            response = super().send(request, stream=stream, **kwargs)
+            telemetry.record_stage('ttfb', time.perf_counter() - start - span.attributes.get('setup_seconds', 0.0))
+            body = request.body or b''
+            telemetry.count('fetch_requests_total', host=host, status=response.status_code)
+            telemetry.count('fetch_bytes_total', len(body), host=host, direction='out')
+            span.set(status_code=response.status_code)
+            if not stream:
+                # 在这里读完响应体以单独计时；requests 随后读取 content 时直接使用已读取的内容
+                start = time.perf_counter()
+                content = response.content
+                telemetry.record_stage('download', time.perf_counter() - start)
+                received = response.raw.tell() if hasattr(response.raw, 'tell') else len(content)
+                telemetry.count('fetch_bytes_total', received, host=host, direction='in')
+                span.set(bytes_in=received, bytes_decoded=len(content))
+            return response
+
+
+# --- 可选的 HTTP/2 后端 ---
+
+class _Http2Response:
+    """把 httpx 的响应包装成客户端用到的 requests.Response 接口子集"""
+
+    def __init__(self, response, stream: bool = False):
+        self._response = response
+        self._stream = stream
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    @property
+    def encoding(self) -> Optional[str]:
+        return self._response.encoding
+
+    @property
+    def content(self) -> bytes:
+        if self._stream:
+            self._response.read()
+        return self._response.content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def iter_content(self, chunk_size: int = 1) -> Iterator[bytes]:
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except Exception as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class Http2Session:
+    """
+    基于 httpx 的 HTTP/2 会话，提供与 requests.Session 相同的 get/post/request 用法，
+    网络错误转换为 requests 的异常，客户端代码无需改动
+    """
+
+    def __init__(self, max_connections: int, keepalive_expiry: float):
+        import httpx
+        self._httpx = httpx
+        self.headers: Dict[str, str] = {}
+        self._client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=keepalive_expiry),
+        )
+        self.num_requests = 0
+        self._count_lock = threading.Lock()
+
+    def request(self, method: str, url: str, params=None, data=None, headers=None,
+                timeout=None, stream: bool = False, **kwargs):
+        """
+        Args:
+            timeout: 与 requests 相同的秒数或 (连接, 读取) 元组；未指定时使用客户端的默认超时，
+                而不是传给 httpx 的 None（None 会关闭全部超时）
+        """
+        merged_headers = dict(self.headers)
+        merged_headers.update(headers or {})
+        content = data.encode('utf-8') if isinstance(data, str) else None
+        form = data if isinstance(data, dict) else None
+        telemetry = get_telemetry()
+        host = urlsplit(url).hostname or ''
+        with telemetry.span('http.request', method=method, host=host, http2=True) as span:
+            try:
+                request = self._client.build_request(method, url, params=params, content=content, data=form,
+                                                     headers=merged_headers,
+                                                     timeout=self._timeout(timeout))
+                # 总是先只读响应头，分别记录首字节和读取响应体的耗时（HTTP/2 下建连耗时计入首字节）
+                start = time.perf_counter()
+                response = self._client.send(request, stream=True)
+                telemetry.record_stage('ttfb', time.perf_counter() - start)
+                if not stream:
+                    start = time.perf_counter()
+                    response.read()
+                    telemetry.record_stage('download', time.perf_counter() - start)
+                    telemetry.count('fetch_bytes_total', response.num_bytes_downloaded, host=host, direction='in')
+            except self._httpx.TimeoutException as e:
+                raise requests.exceptions.Timeout(str(e)) from e
+            except self._httpx.HTTPError as e:
+                raise requests.exceptions.ConnectionError(str(e)) from e
+            telemetry.count('fetch_requests_total', host=host, status=response.status_code)
+            telemetry.count('fetch_bytes_total', len(content or b''), host=host, direction='out')
+            span.set(status_code=response.status_code)
+        with self._count_lock:
+            self.num_requests += 1
+        return _Http2Response(response, stream=stream)
+
+    def _timeout(self, timeout):
+        """把 requests 风格的超时转换为 httpx 的超时参数"""
+        if timeout is None:
+            return self._httpx.USE_CLIENT_DEFAULT
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self._httpx.Timeout(read, connect=connect)
+        return timeout
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    def connection_count(self) -> int:
+        pool = getattr(getattr(self._client, '_transport', None), '_pool', None)
+        return len(getattr(pool, 'connections', []))
+
+    def close(self):
+        self._client.close()
+
+
+class Transport:
+    """
+    三个平台客户端共用的HTTP传输层
+
+    - 每个主机一个连接池，大小按并发量设置，连接保持长连接复用
+    - 自动协商 gzip/deflate（安装 brotli 后加上 br）
+    - 可选的DNS缓存，只作用于本实例连接池的建连（HTTP/2 后端由 httpx 自行解析）
+    - 可选 HTTP/2 多路复用（需要 httpx 和 h2，未安装时退回 HTTP/1.1）
+    - stats() 给出每个主机的请求数、新建连接数（即握手次数）和连接复用率
+    """
+
+    def __init__(self, pool_maxsize: int = 16, pool_hosts: int = 16, http2: bool = False,
+                 dns_cache_ttl: Optional[float] = 300, keepalive_expiry: float = 60,
+                 scheduler: Optional[RequestScheduler] = None):
+        """
+        Args:
+            pool_maxsize: 每个主机连接池的最大连接数，应不小于该主机的并发请求数
+            pool_hosts: 保留连接池的主机数
+            http2: 是否尝试使用 HTTP/2
+            dns_cache_ttl: 连接池建连时DNS解析结果的缓存秒数，None 表示不启用
+            keepalive_expiry: HTTP/2 后端空闲连接的保留秒数
+            scheduler: 可选的限速/重试调度器，设置后所有请求都经过它
+        """
+        self.dns_cache = DnsCache(dns_cache_ttl) if dns_cache_ttl else None
+
+        self.http2 = False
+        if http2:
+            try:
+                import h2  # noqa: F401
+                self.session = Http2Session(pool_maxsize * pool_hosts, keepalive_expiry)
+                self.http2 = True
+            except ImportError:
+                print("警告: 未安装 httpx/h2，HTTP/2 不可用，使用 HTTP/1.1 长连接")
+
+        if not self.http2:
+            self.session = requests.Session()
+            self._adapter = PooledAdapter(pool_connections=pool_hosts, pool_maxsize=pool_maxsize,
+                                          dns_cache=self.dns_cache)
+            self.session.mount('https://', self._adapter)
+            self.session.mount('http://', self._adapter)
+            self.session.headers['Connection'] = 'keep-alive'
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+        self.scheduler = scheduler
+        if scheduler is not None:
+            self.raw_session = self.session
+            self.session = ScheduledSession(self.raw_session, scheduler)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        连接池统计
+
+        Returns:
+            {主机: {'requests': 请求数, 'connections': 新建连接数, 'handshakes': TLS握手次数,
+                    'reuse_ratio': 连接复用率}}
+        """
+        if self.http2:
+            session = self.raw_session if self.scheduler is not None else self.session
+            requests_count = session.num_requests
+            connections = session.connection_count()
+            return {'*': {
+                'requests': requests_count,
+                'connections': connections,
+                'handshakes': connections,
+                'reuse_ratio': (1 - connections / requests_count) if requests_count else 0.0,
+            }}
+
+        result = {}
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            entry = result.setdefault(f"{pool.scheme}://{pool.host}:{pool.port}",
+                                      {'requests': 0, 'connections': 0, 'handshakes': 0})
+            entry['requests'] += pool.num_requests
+            entry['connections'] += pool.num_connections
+            if pool.scheme == 'https':
+                entry['handshakes'] += pool.num_connections
+        for entry in result.values():
+            entry['reuse_ratio'] = (1 - entry['connections'] / entry['requests']) if entry['requests'] else 0.0
+        return result
+
+    def print_stats(self):
+        for host, entry in self.stats().items():
+            print(f"{host}: 请求 {entry['requests']} 次，新建连接 {entry['connections']} 个，"
+                  f"TLS握手 {entry['handshakes']} 次，连接复用率 {entry['reuse_ratio']:.0%}")
+        if self.scheduler is not None:
+            for host, entry in self.scheduler.stats().items():
+                print(f"{host}: 当前速率 {entry['rate']} 次/秒，重试 {entry['retries']} 次，"
+                      f"限流 {entry['throttled']} 次，错误 {entry['errors']} 次")
+
+    def close(self):
+        self.session.close()
+
+
+_default_transport: Optional[Transport] = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport() -> Transport:
+    """进程内共享的默认 Transport（首次调用时创建）"""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = Transport(scheduler=RequestScheduler())
+        return _default_transport